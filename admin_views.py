@@ -0,0 +1,174 @@
+"""
+Flask-Admin panel: category, post and contact message views.
+
+Imported by create_app() only when ADMIN_ENABLED is set, so worker pools
+serving just the public site skip loading Flask-Admin, WTForms and
+CKEditor.
+"""
+
+from flask import g
+from flask_admin import Admin, AdminIndexView, expose
+from flask_admin.contrib.sqla import ModelView
+from flask_ckeditor import CKEditor
+from slugify import slugify
+from sqlalchemy import or_
+from sqlalchemy.orm import load_only
+
+from caching import page_cache, post_cache_tags, category_cache_tags
+from images import images
+from jobs import jobs
+from models import db, Category, ContactMessage, Post
+from readmodel import read_model
+from search import search_index
+import related
+
+
+# Custom Admin Views
+class SecureAdminIndexView(AdminIndexView):
+    """Custom admin index view with basic protection."""
+    
+    @expose('/')
+    def index(self):
+        return self.render('admin/index.html', cache_stats=page_cache.stats())
+
+
+class CategoryAdminView(ModelView):
+    """Admin view for Category model."""
+    
+    column_list = ['id', 'name', 'slug', 'emoji', 'display_order']
+    column_sortable_list = ['id', 'name', 'display_order']
+    column_searchable_list = ['name', 'slug']
+    form_columns = ['name', 'slug', 'emoji', 'display_order']
+    
+    def on_model_change(self, form, model, is_created):
+        """Auto-generate slug if not provided."""
+        if not model.slug:
+            model.slug = slugify(model.name)
+        g.stale_cache_tags = category_cache_tags(model)
+    
+    def after_model_change(self, form, model, is_created):
+        """Refresh cached pages and the search index once the save is committed."""
+        page_cache.invalidate(*g.pop('stale_cache_tags', ()))
+        search_index.index_category(model)
+        db.session.commit()
+        read_model.invalidate()
+    
+    def on_model_delete(self, model):
+        g.stale_cache_tags = category_cache_tags(model)
+    
+    def after_model_delete(self, model):
+        page_cache.invalidate(*g.pop('stale_cache_tags', ()))
+        read_model.invalidate()
+
+
+class PostAdminView(ModelView):
+    """Admin view for Post model with CKEditor support."""
+    
+    column_list = ['id', 'title', 'category_id', 'is_featured', 'is_published', 'published_date']
+    column_sortable_list = ['id', 'title', 'published_date', 'is_featured', 'is_published']
+    # Searched through the full-text index plus the slug, see _apply_search().
+    column_searchable_list = ['title', 'slug', 'excerpt', 'content']
+    column_filters = ['is_featured', 'is_published']
+    column_default_sort = ('id', True)
+    
+    # The list pages server-side and shows prev/next links only, so it never
+    # counts the whole table; content is loaded by the edit form alone.
+    page_size = 50
+    simple_list_pager = True
+    
+    form_columns = [
+        'title', 'slug', 'category_id', 'excerpt', 'content', 
+        'image_url', 'published_date',
+        'is_featured', 'is_published',
+        'meta_description', 'meta_keywords'
+    ]
+    
+    # read_time is computed from the word count when the post is saved.
+    
+    create_template = 'admin/post_create.html'
+    edit_template = 'admin/post_edit.html'
+    
+    def on_model_change(self, form, model, is_created):
+        """Auto-generate slug if not provided."""
+        if not model.slug:
+            model.slug = slugify(model.title)
+        g.stale_cache_tags = post_cache_tags(model)
+    
+    def after_model_change(self, form, model, is_created):
+        """Refresh cached pages and the search index once the save is committed.
+        
+        Related posts are recomputed in the background, as is a new image;
+        pages show the previous related posts, and the image at full size,
+        until those jobs finish.
+        """
+        search_index.index_post(model)
+        db.session.commit()
+        page_cache.invalidate(*g.pop('stale_cache_tags', ()))
+        read_model.invalidate()
+        jobs.enqueue('update_related_posts', post_id=model.id)
+        if images.is_stale(model.image_url, model.image_variants):
+            jobs.enqueue('derive_post_image', post_id=model.id)
+    
+    def on_model_delete(self, model):
+        # Committed together with the delete itself; the lists the post
+        # leaves are topped up again in the background.
+        search_index.remove_post(model)
+        g.unlinked_posts = related.unlink_post(model.id)
+        g.stale_cache_tags = post_cache_tags(model) | related.related_cache_tags(g.unlinked_posts)
+    
+    def after_model_delete(self, model):
+        page_cache.invalidate(*g.pop('stale_cache_tags', ()))
+        read_model.invalidate()
+        unlinked = g.pop('unlinked_posts', ())
+        if unlinked:
+            jobs.enqueue('refill_related_posts', post_ids=sorted(unlinked))
+    
+    def get_query(self):
+        return super().get_query().options(load_only(
+            Post.id, Post.title, Post.slug, Post.category_id, Post.is_featured, Post.is_published,
+            Post.published_date,
+        ))
+    
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        """Match posts through the full-text index instead of LIKE scans over their content.
+        
+        Slugs are short, so they are still matched with LIKE. Every match
+        is kept; the list sorts and pages through them like any other filter.
+        """
+        condition = or_(
+            search_index.match_condition(search, published_only=False),
+            Post.slug.contains(search.strip().lower(), autoescape=True),
+        )
+        query = query.filter(condition)
+        if count_query is not None:
+            count_query = count_query.filter(condition)
+        return query, count_query, joins, count_joins
+
+
+class ContactMessageAdminView(ModelView):
+    """Read-only admin view of contact form submissions."""
+    
+    can_create = False
+    can_edit = False
+    can_view_details = True
+    column_list = ['created_date', 'name', 'email', 'subject', 'status', 'attempts']
+    column_default_sort = ('created_date', True)
+    column_searchable_list = ['name', 'email']
+    column_filters = ['status', 'subject']
+
+
+def init_admin(app):
+    """Register the admin panel and the CKEditor assets it uses."""
+    CKEditor(app)
+    admin = Admin(
+        app,
+        name='Travel Clean & Legal Admin',
+        template_mode='bootstrap4',
+        index_view=SecureAdminIndexView()
+    )
+    
+    # Add admin views
+    admin.add_view(CategoryAdminView(Category, db.session, name='Categories'))
+    admin.add_view(PostAdminView(Post, db.session, name='Posts'))
+    admin.add_view(ContactMessageAdminView(ContactMessage, db.session, name='Messages'))
+    return admin
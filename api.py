@@ -0,0 +1,230 @@
+"""
+Read-only JSON content API under ``/api/v1``.
+
+- ``GET /api/v1/posts``: published posts, newest first, one keyset page
+  at a time (``?limit=``, ``?cursor=`` from ``next_cursor`` or
+  ``prev_cursor``, optional ``?category=<slug>``).
+- ``GET /api/v1/posts?slugs=a,b,c``: the named posts in the order asked
+  for, fetched with one query; unknown or unpublished slugs are listed
+  under ``missing``.
+- ``GET /api/v1/posts/<slug>``: one post, including its rendered content.
+- ``GET /api/v1/categories``: categories in display order with their
+  published post counts.
+
+``?fields=title,slug,...`` picks the fields returned. Only the columns
+behind them are selected, and rows are serialised straight from the
+result tuples without loading Post objects, so a listing of titles never
+reads a post body. Unknown fields get a 400.
+
+Responses carry an ETag built from Post.updated_date (see
+caching.conditional()), are kept in the page cache under the same tags
+as the HTML pages, and are served by asgi.py on the async path. orjson
+is used for encoding when installed.
+"""
+
+import json
+
+from flask import Response, request
+from sqlalchemy import func, select
+
+from caching import conditional, page_cache
+from database import read_replica
+from models import db, Category, Post
+from pagination import InvalidCursor, paginate
+from readmodel import read_model
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+POST_FIELDS = {
+    'id': Post.id,
+    'slug': Post.slug,
+    'title': Post.title,
+    'excerpt': Post.excerpt,
+    'image_url': Post.image_url,
+    'image_variants': Post.image_variants,
+    'read_time': Post.read_time,
+    'published_date': Post.published_date,
+    'updated_date': Post.updated_date,
+    'is_featured': Post.is_featured,
+    'category': Category.slug,
+    'category_name': Category.name,
+    'meta_description': Post.meta_description,
+    'meta_keywords': Post.meta_keywords,
+    # Posts saved before the content pipeline ran have no rendered copy yet.
+    'content': func.coalesce(Post.rendered_content, Post.content),
+    'toc': Post.toc,
+}
+CATEGORY_COLUMNS = ('category', 'category_name')
+LIST_FIELDS = ('id', 'slug', 'title', 'excerpt', 'image_url', 'read_time', 'published_date', 'updated_date',
+               'category')
+
+CATEGORY_FIELDS = {
+    'id': Category.id,
+    'slug': Category.slug,
+    'name': Category.name,
+    'emoji': Category.emoji,
+    'display_order': Category.display_order,
+    'post_count': select(func.count(Post.id)).where(
+        Post.category_id == Category.id, Post.is_published == True
+    ).correlate(Category).scalar_subquery(),
+}
+
+POST_SORT_KEY = [(Post.published_date, True), (Post.id, True)]
+
+
+class InvalidFields(ValueError):
+    """Raised for a ``fields`` parameter naming fields the resource lacks."""
+
+
+def parse_fields(value, available, default):
+    """Field names requested by a ``fields`` parameter, in the order given."""
+    if not value:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    if not names:
+        raise InvalidFields('No fields requested.')
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise InvalidFields(f'Unknown fields: {", ".join(unknown)}.')
+    return names
+
+
+def _isoformat(value):
+    # Dates are stored as naive UTC.
+    return value.isoformat() + 'Z' if value.tzinfo is None else value.isoformat()
+
+
+def serialize_rows(names, rows):
+    """``[{name: value}]`` for result ``rows`` whose first columns are ``names``."""
+    dates = [i for i, name in enumerate(names) if name.endswith('_date')]
+    items = []
+    for row in rows:
+        values = list(row[:len(names)])
+        for i in dates:
+            if values[i] is not None:
+                values[i] = _isoformat(values[i])
+        items.append(dict(zip(names, values)))
+    return items
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def error(status, message):
+    return json_response({'error': message}, status)
+
+
+def post_query(names, *extra, category=None):
+    """Published posts selecting the columns behind ``names``, then ``extra``.
+
+    Category is joined only when a category field or filter needs it.
+    """
+    query = db.session.query(*(POST_FIELDS[name] for name in names), *extra).filter(Post.is_published == True)
+    if category or any(name in CATEGORY_COLUMNS for name in names):
+        query = query.join(Category, Post.category_id == Category.id)
+    if category:
+        query = query.filter(Category.slug == category)
+    return query
+
+
+class ContentAPI:
+    """Flask extension registering the ``/api/v1`` routes."""
+
+    def __init__(self, app=None):
+        self.page_size = 24
+        self.max_items = 100
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.page_size = app.config.get('API_PAGE_SIZE', 24)
+        self.max_items = app.config.get('API_MAX_ITEMS', 100)
+
+        posts = conditional(lambda: read_model.source().content_version())(page_cache.cached('listings')(self.posts))
+        post = conditional(lambda slug: read_model.source().slug_version(slug))(page_cache.cached()(self.post))
+        categories = conditional(lambda: read_model.source().content_version())(
+            page_cache.cached('listings')(self.categories)
+        )
+        app.add_url_rule('/api/v1/posts', 'api_posts', read_replica(posts))
+        app.add_url_rule('/api/v1/posts/<slug>', 'api_post', read_replica(post))
+        app.add_url_rule('/api/v1/categories', 'api_categories', read_replica(categories))
+        app.extensions['content_api'] = self
+
+    def posts(self):
+        try:
+            names = parse_fields(request.args.get('fields'), POST_FIELDS, LIST_FIELDS)
+        except InvalidFields as e:
+            return error(400, str(e))
+        slugs = request.args.get('slugs')
+        if slugs is not None:
+            return self.batch(names, slugs)
+
+        # Parsed here rather than with type=int, which would quietly fall
+        # back to the default page size for ?limit=abc.
+        try:
+            limit = int(request.args.get('limit', self.page_size))
+        except ValueError:
+            limit = None
+        if limit is None or not 1 <= limit <= self.max_items:
+            return error(400, f'limit must be an integer between 1 and {self.max_items}.')
+        category = request.args.get('category')
+        # The sort key columns ride along after the requested ones for the cursors.
+        query = post_query(names, Post.published_date, Post.id, category=category)
+        try:
+            page = paginate(
+                query, POST_SORT_KEY, lambda row: list(row[-2:]), limit,
+                f'api:posts:{category or ""}', request.args.get('cursor'),
+            )
+        except InvalidCursor as e:
+            return error(400, str(e))
+        return json_response({
+            'posts': serialize_rows(names, page.items),
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor,
+        })
+
+    def batch(self, names, slugs):
+        slugs = list(dict.fromkeys(slug.strip() for slug in slugs.split(',') if slug.strip()))
+        if not 1 <= len(slugs) <= self.max_items:
+            return error(400, f'slugs must name between 1 and {self.max_items} posts.')
+        rows = post_query(names, Post.slug).filter(Post.slug.in_(slugs)).all()
+        found = {row[-1]: row for row in rows}
+        return json_response({
+            'posts': serialize_rows(names, [found[slug] for slug in slugs if slug in found]),
+            'missing': [slug for slug in slugs if slug not in found],
+        })
+
+    def post(self, slug):
+        try:
+            names = parse_fields(request.args.get('fields'), POST_FIELDS, POST_FIELDS)
+        except InvalidFields as e:
+            return error(400, str(e))
+        row = post_query(names, Post.category_id).filter(Post.slug == slug).first()
+        if row is None:
+            return error(404, 'Post not found.')
+        page_cache.add_tags(f'post:{slug}', f'category:{row[-1]}')
+        return json_response(serialize_rows(names, [row])[0])
+
+    def categories(self):
+        try:
+            names = parse_fields(request.args.get('fields'), CATEGORY_FIELDS, CATEGORY_FIELDS)
+        except InvalidFields as e:
+            return error(400, str(e))
+        rows = db.session.query(*(CATEGORY_FIELDS[name] for name in names)).order_by(
+            func.coalesce(Category.display_order, 0), Category.id
+        ).all()
+        return json_response({'categories': serialize_rows(names, rows)})
+
+
+content_api = ContentAPI()
@@ -3,62 +3,32 @@ Travel Clean & Legal - Flask Application
 Your Complete Guide to Relocating from Nigeria
 """
 
+import os
 from datetime import datetime, timezone
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, Response, current_app
-from flask_admin import Admin, AdminIndexView, expose
-from flask_admin.contrib.sqla import ModelView
-from flask_ckeditor import CKEditor
-from slugify import slugify
-
-from config import Config
-from models import db, Category, Post
-
-
-# Custom Admin Views
-class SecureAdminIndexView(AdminIndexView):
-    """Custom admin index view with basic protection."""
-    
-    @expose('/')
-    def index(self):
-        return self.render('admin/index.html')
 
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, Response, current_app, abort, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-class CategoryAdminView(ModelView):
-    """Admin view for Category model."""
-    
-    column_list = ['id', 'name', 'slug', 'emoji', 'display_order']
-    column_sortable_list = ['id', 'name', 'display_order']
-    column_searchable_list = ['name', 'slug']
-    form_columns = ['name', 'slug', 'emoji', 'display_order']
-    
-    def on_model_change(self, form, model, is_created):
-        """Auto-generate slug if not provided."""
-        if not model.slug:
-            model.slug = slugify(model.name)
-
-
-class PostAdminView(ModelView):
-    """Admin view for Post model with CKEditor support."""
-    
-    column_list = ['id', 'title', 'category_id', 'is_featured', 'is_published', 'published_date']
-    column_sortable_list = ['id', 'title', 'published_date', 'is_featured', 'is_published']
-    column_searchable_list = ['title', 'slug', 'excerpt']
-    column_filters = ['is_featured', 'is_published']
-    
-    form_columns = [
-        'title', 'slug', 'category_id', 'excerpt', 'content', 
-        'image_url', 'read_time', 'published_date',
-        'is_featured', 'is_published',
-        'meta_description', 'meta_keywords'
-    ]
-    
-    create_template = 'admin/post_create.html'
-    edit_template = 'admin/post_edit.html'
-    
-    def on_model_change(self, form, model, is_created):
-        """Auto-generate slug if not provided."""
-        if not model.slug:
-            model.slug = slugify(model.title)
+from api import content_api
+from assets import assets, build_assets
+from caching import page_cache, conditional
+from compression import compression
+from contact import contact_pipeline, InvalidSubmission
+from config import Config
+from database import init_database, read_replica
+from fragments import fragment_cache
+from images import images
+from jobs import jobs, SQLiteBackend
+from metrics import metrics
+from models import db, ContactMessage, Post, init_lazy_load_guard
+from pagination import InvalidCursor
+from readmodel import read_model
+from search import search_index
+import importer
+import related
+import sitemaps
+import static_export
 
 
 def create_app(config_class=Config):
@@ -67,31 +37,40 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
-    # Initialize extensions
-    db.init_app(app)
-    CKEditor(app)
+    # Behind Nginx, take the client address from X-Forwarded-For so per-IP
+    # rate limits see visitors rather than the proxy.
+    if app.config.get('TRUSTED_PROXIES'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
     
-    # Initialize Flask-Admin
-    admin = Admin(
-        app,
-        name='Travel Clean & Legal Admin',
-        template_mode='bootstrap4',
-        index_view=SecureAdminIndexView()
-    )
+    # Initialize extensions
+    init_database(app, db)
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        # Only the `flask db` commands need Alembic; web workers skip importing it.
+        from flask_migrate import Migrate
+        Migrate(app, db, render_as_batch=True)
+    metrics.init_app(app)
+    page_cache.init_app(app)
+    compression.init_app(app)
+    fragment_cache.init_app(app)
+    assets.init_app(app)
+    images.init_app(app)
+    search_index.init_app(app)
+    jobs.init_app(app)
+    contact_pipeline.init_app(app)
+    read_model.init_app(app)
+    content_api.init_app(app)
+    init_lazy_load_guard(app)
     
-    # Add admin views
-    admin.add_view(CategoryAdminView(Category, db.session, name='Categories'))
-    admin.add_view(PostAdminView(Post, db.session, name='Posts'))
+    # Admin panel (optional, see admin_views.py)
+    if app.config.get('ADMIN_ENABLED', True):
+        from admin_views import init_admin
+        init_admin(app)
     
     # Context processor to add current datetime
     @app.context_processor
     def inject_now():
         return {'now': datetime.now(timezone.utc)}
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-    
     # Routes
     
     # Serve ads.txt from root URL (required for Google AdSense)
@@ -116,58 +95,45 @@ def create_app(config_class=Config):
     
     # Serve sitemap.xml from root URL
     @app.route('/sitemap.xml')
+    @read_replica
+    @conditional(lambda: read_model.source().content_version(include_categories=False))
+    @page_cache.cached('sitemap')
     def sitemap():
-        """Generate dynamic sitemap.xml."""
-        posts = Post.query.filter_by(is_published=True).order_by(Post.published_date.desc()).all()
+        """Stream sitemap.xml, or a sitemap index once the site outgrows one file."""
         site_url = current_app.config['SITE_URL']
+        max_urls = current_app.config['SITEMAP_MAX_URLS']
+        content = read_model.source()
         
-        xml_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-    <url>
-        <loc>{site_url}/</loc>
-        <changefreq>daily</changefreq>
-        <priority>1.0</priority>
-    </url>
-    <url>
-        <loc>{site_url}/blog</loc>
-        <changefreq>daily</changefreq>
-        <priority>0.9</priority>
-    </url>
-    <url>
-        <loc>{site_url}/about</loc>
-        <changefreq>monthly</changefreq>
-        <priority>0.7</priority>
-    </url>
-    <url>
-        <loc>{site_url}/contact</loc>
-        <changefreq>monthly</changefreq>
-        <priority>0.7</priority>
-    </url>
-'''
-        for post in posts:
-            lastmod = post.published_date.strftime('%Y-%m-%d') if post.published_date else ''
-            xml_content += f'''    <url>
-        <loc>{site_url}/post/{post.slug}</loc>
-        <lastmod>{lastmod}</lastmod>
-        <changefreq>weekly</changefreq>
-        <priority>0.8</priority>
-    </url>
-'''
-        xml_content += '</urlset>'
-        
-        return Response(xml_content, mimetype='application/xml')
+        shards = sitemaps.shard_count(max_urls, content)
+        if shards == 1:
+            chunks = sitemaps.generate_urlset(site_url, 1, max_urls, content)
+        else:
+            last_modified, _ = content.content_version(include_categories=False)
+            chunks = sitemaps.generate_index(site_url, shards, last_modified)
+        return Response(stream_with_context(chunks), mimetype='application/xml')
+    
+    @app.route('/sitemap-<int:shard>.xml')
+    @read_replica
+    @conditional(lambda shard: read_model.source().content_version(include_categories=False))
+    @page_cache.cached('sitemap')
+    def sitemap_shard(shard):
+        """Stream one shard of a sitemap index."""
+        max_urls = current_app.config['SITEMAP_MAX_URLS']
+        content = read_model.source()
+        if not 1 <= shard <= sitemaps.shard_count(max_urls, content):
+            abort(404)
+        chunks = sitemaps.generate_urlset(current_app.config['SITE_URL'], shard, max_urls, content)
+        return Response(stream_with_context(chunks), mimetype='application/xml')
     
     @app.route('/')
+    @read_replica
+    @conditional(lambda: read_model.source().content_version())
+    @page_cache.cached('listings')
     def home():
         """Home page with featured and recent posts."""
-        featured_posts = Post.query.filter_by(
-            is_published=True, 
-            is_featured=True
-        ).order_by(Post.published_date.desc()).limit(6).all()
-        
-        recent_posts = Post.query.filter_by(
-            is_published=True
-        ).order_by(Post.published_date.desc()).limit(9).all()
+        content = read_model.source()
+        featured_posts = content.featured(6)
+        recent_posts = content.recent(9)
         
         return render_template(
             'index.html',
@@ -176,46 +142,68 @@ def create_app(config_class=Config):
         )
     
     @app.route('/blog')
+    @read_replica
+    @conditional(lambda: read_model.source().content_version())
+    @page_cache.cached('listings')
     def blog():
-        """Blog listing page with posts grouped by category."""
+        """Blog listing page with posts grouped by category, one keyset page at a time."""
         category_filter = request.args.get('category')
+        cursor = request.args.get('cursor')
         
-        categories = Category.query.order_by(Category.display_order).all()
-        posts_by_category = {}
+        try:
+            posts_by_category, next_cursor, prev_cursor = read_model.source().blog_page(
+                category_filter, cursor, current_app.config['BLOG_PAGE_SIZE']
+            )
+        except InvalidCursor:
+            abort(400)
         
-        for category in categories:
-            if category_filter and category.slug != category_filter:
-                continue
-            posts = Post.query.filter_by(
-                category_id=category.id,
-                is_published=True
-            ).order_by(Post.published_date.desc()).all()
-            if posts:
-                posts_by_category[category] = posts
+        def page_url(page_cursor):
+            if page_cursor is None:
+                return None
+            return url_for('blog', category=category_filter, cursor=page_cursor)
         
         return render_template(
             'blog.html',
-            posts_by_category=posts_by_category
+            posts_by_category=posts_by_category,
+            next_url=page_url(next_cursor),
+            prev_url=page_url(prev_cursor)
         )
     
     @app.route('/post/<slug>')
+    @read_replica
+    @conditional(lambda slug: read_model.source().slug_version(slug))
+    @page_cache.cached()
     def post(slug):
         """Individual blog post page."""
-        post = Post.query.filter_by(slug=slug, is_published=True).first_or_404()
-        
-        # Get related posts from the same category
-        related_posts = Post.query.filter(
-            Post.category_id == post.category_id,
-            Post.id != post.id,
-            Post.is_published == True
-        ).order_by(Post.published_date.desc()).limit(3).all()
+        content = read_model.source()
+        post = content.by_slug(slug)
+        related_posts = content.related_to(post, 3)
+        page_cache.add_tags(
+            f'post:{post.slug}', f'category:{post.category_id}',
+            *(f'post:{related_post.slug}' for related_post in related_posts)
+        )
         
         return render_template(
             'post.html',
             post=post,
+            body=post.rendered(),
             related_posts=related_posts
         )
     
+    @app.route('/search')
+    @read_replica
+    @page_cache.cached('listings')
+    def search():
+        """Full-text search over published posts, best match first."""
+        query = request.args.get('q', '').strip()[:200]
+        results = []
+        if query:
+            ranked = search_index.search(query, limit=current_app.config['SEARCH_RESULTS_LIMIT'])
+            posts = {post.id: post for post in Post.listed().filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+            results = [posts[post_id] for post_id, _ in ranked if post_id in posts]
+        
+        return render_template('search.html', query=query, results=results)
+    
     @app.route('/about')
     def about():
         """About page."""
@@ -225,17 +213,25 @@ def create_app(config_class=Config):
     def contact():
         """Contact page with form handling."""
         if request.method == 'POST':
+            # Refused before any other work, so floods stay cheap.
+            retry_after = contact_pipeline.check_rate(request.remote_addr)
+            if retry_after:
+                flash('You\'ve sent several messages in a short time. Please try again later.', 'error')
+                response = current_app.make_response((render_template('contact.html'), 429))
+                response.headers['Retry-After'] = str(int(retry_after) + 1)
+                return response
+            
             # Check honeypot field
             if request.form.get('bot-field'):
                 return redirect(url_for('contact'))
             
-            # Process form (in production, you'd send email or store in database)
-            name = request.form.get('name')
-            email = request.form.get('email')
-            subject = request.form.get('subject')
-            message = request.form.get('message')
+            # Stored now, emailed in the background (see contact.py)
+            try:
+                contact_pipeline.submit(request.form, request.remote_addr)
+            except InvalidSubmission as exc:
+                flash(str(exc), 'error')
+                return redirect(url_for('contact'))
             
-            # For now, just flash a success message
             flash('Thank you for your message! We\'ll get back to you soon.', 'success')
             return redirect(url_for('contact'))
         
@@ -251,6 +247,120 @@ def create_app(config_class=Config):
         """Terms of service page."""
         return render_template('terms.html')
     
+    # CLI commands
+    @app.cli.command('init-db')
+    def init_db():
+        """Create or upgrade the schema: run the migrations, then create the search index tables."""
+        from flask_migrate import upgrade
+        upgrade()
+        search_index.create_schema()
+        click.echo('Database schema is up to date.')
+    
+    @app.cli.command('build-sitemap')
+    @click.option('--output', default=os.path.join(app.instance_path, 'sitemap'), show_default=True,
+                  help='Directory to write sitemap files to.')
+    @click.option('--gzip', 'compress', is_flag=True, help='Also write precompressed .gz copies.')
+    def build_sitemap(output, compress):
+        """Write sitemap.xml (and shards) to disk for the web server to serve."""
+        written = sitemaps.write_sitemaps(
+            app.config['SITE_URL'], output, app.config['SITEMAP_MAX_URLS'], compress
+        )
+        for path in written:
+            click.echo(path)
+    
+    @app.cli.command('assets-build')
+    def assets_build():
+        """Minify, fingerprint and precompress the static folder into static/dist."""
+        manifest = build_assets(app.static_folder, log=click.echo)
+        # Cached pages link the previous build's file names.
+        page_cache.clear()
+        click.echo(f'Built {len(manifest)} assets.')
+    
+    @app.cli.command('images-derive')
+    @click.option('--all', 'derive_all', is_flag=True, help='Redo posts whose derivatives are current too.')
+    @click.option('--workers', type=int, default=None, help='Resize processes (default: CPU count).')
+    def images_derive(derive_all, workers):
+        """Resize post images into responsive AVIF/WebP/JPEG derivatives in static/derived."""
+        if not images.formats:
+            raise click.ClickException('Deriving images needs Pillow (pip install Pillow).')
+        derived, failed = images.derive_all(derive_all, workers, log=click.echo)
+        page_cache.clear()
+        read_model.invalidate()
+        click.echo(f'Derived images for {derived} posts ({failed} failed).')
+    
+    @app.cli.command('export-static')
+    @click.option('--output', default=os.path.join(app.instance_path, 'static-site'), show_default=True,
+                  help='Directory to write the site to.')
+    @click.option('--workers', type=int, default=None, help='Render processes (default: CPU count).')
+    @click.option('--incremental', is_flag=True, help='Only re-render pages whose content changed.')
+    def export_static(output, workers, incremental):
+        """Render every public page to a directory servable by Nginx or a CDN."""
+        summary = static_export.export_site(app, output, workers, incremental, log=click.echo)
+        if summary['failed']:
+            raise SystemExit(1)
+    
+    @app.cli.command('import-posts')
+    @click.argument('posts_dir', type=click.Path(exists=True, file_okay=False))
+    @click.option('--workers', type=int, default=None, help='Parse processes (default: CPU count).')
+    @click.option('--batch-size', type=int, default=500, show_default=True, help='Rows per transaction.')
+    @click.option('--force', is_flag=True,
+                  help='Overwrite posts from their files even when no earlier import was recorded for them.')
+    def import_posts(posts_dir, workers, batch_size, force):
+        """Import or refresh posts from a directory of article HTML files."""
+        # seed_data imports this module, so it can only be loaded here.
+        from seed_data import FEATURED_CATEGORIES, POST_CATEGORY_MAP
+        
+        summary = importer.import_posts(posts_dir, POST_CATEGORY_MAP, 'planning', FEATURED_CATEGORIES,
+                               workers=workers, batch_size=batch_size, force=force, log=click.echo)
+        if summary['failed']:
+            raise SystemExit(1)
+    
+    @app.cli.command('render-content')
+    @click.option('--all', 'render_all', is_flag=True, help='Re-render posts whose stored render is current too.')
+    def render_content(render_all):
+        """Run the content pipeline over posts with a missing or stale render."""
+        count = Post.backfill_renders(render_all)
+        page_cache.clear()
+        read_model.invalidate()
+        click.echo(f'Rendered {count} posts.')
+    
+    @app.cli.command('search-reindex')
+    def search_reindex():
+        """Rebuild the full-text search index from the posts table."""
+        count = search_index.rebuild()
+        click.echo(f'Indexed {count} posts ({search_index.backend.name}).')
+    
+    @app.cli.command('related-rebuild')
+    def related_rebuild():
+        """Recompute the related posts of every published post."""
+        count, seconds = related.rebuild(app.config['RELATED_POSTS_K'])
+        page_cache.clear()
+        read_model.invalidate()
+        click.echo(f'Computed related posts for {count} posts in {seconds:.1f}s.')
+    
+    @app.cli.command('jobs-worker')
+    @click.option('--once', is_flag=True, help='Exit when no job is due instead of polling.')
+    @click.option('--poll', type=float, default=1.0, show_default=True, help='Seconds between queue polls.')
+    def jobs_worker(once, poll):
+        """Run background jobs from the SQLite queue (JOBS_BACKEND=sqlite)."""
+        if not isinstance(jobs.backend, SQLiteBackend):
+            raise click.ClickException('jobs-worker needs JOBS_BACKEND=sqlite; the thread backend runs jobs in the web workers.')
+        jobs.backend.work(app, once=once, poll_interval=poll, log=click.echo)
+    
+    @app.cli.command('contact-retry')
+    def contact_retry():
+        """Queue delivery again for contact messages that are pending or failed."""
+        if not app.config.get('MAIL_SERVER'):
+            raise click.ClickException('MAIL_SERVER is not configured.')
+        messages = ContactMessage.query.filter(ContactMessage.status.in_(['pending', 'failed'])).all()
+        for message in messages:
+            message.status = 'pending'
+        db.session.commit()
+        for message in messages:
+            jobs.enqueue('send_contact_message', message_id=message.id)
+        # With the thread backend the command exits once the jobs have run.
+        click.echo(f'Queued {len(messages)} messages.')
+    
     # Error handlers
     @app.errorhandler(404)
     def page_not_found(e):
@@ -266,9 +376,5 @@ def create_app(config_class=Config):
     return app
 
 
-# Create the application instance
-app = create_app()
-
-
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
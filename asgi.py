@@ -0,0 +1,17 @@
+"""
+ASGI entry point: the public read routes on async database access.
+Usage: uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+
+Needs uvicorn and the async driver for the database (aiosqlite or
+asyncpg); see asgi_bridge.py.
+"""
+
+from app import create_app
+from asgi_bridge import ASGIBridge
+from metrics import metrics
+from readmodel import read_model
+
+flask_app = create_app()
+metrics.share(flask_app)
+read_model.warm(flask_app)
+app = ASGIBridge(flask_app)
@@ -0,0 +1,171 @@
+"""
+ASGI front for the Flask app, with async database access on the public
+read routes.
+
+ASGIBridge serves GET and HEAD requests for the endpoints in
+ASYNC_ENDPOINTS (the home page, the blog listing, posts, the sitemaps,
+robots.txt, ads.txt and the JSON API) on the event loop. The Flask app
+runs unchanged in a greenlet (SQLAlchemy's greenlet_spawn), and the
+request's reads go through the async engine from
+database.create_async_engine(). While a
+query waits on the database the greenlet yields to the event loop, so
+one worker keeps many such requests in flight at once. The views,
+decorators, page cache, compression and templates are the ones gunicorn
+runs, so the responses, ETags included, are the same byte for byte.
+
+Rendering still holds the event loop; only the time spent waiting on the
+database is shared. With the read model warm (readmodel.py) these routes
+rarely query at all.
+
+Everything else (the admin, the contact form, search, static files and
+images) goes to the same app on a pool of ``ASGI_THREADS`` threads, as a
+sync worker would run it.
+
+The ``ASGI_*`` settings are in config.py; asgi.py is the entry point.
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.util import await_only, greenlet_spawn
+from werkzeug.exceptions import HTTPException
+
+from database import ASYNC_ENGINE_KEY, create_async_engine
+
+
+ASYNC_ENDPOINTS = frozenset({
+    'home', 'blog', 'post', 'sitemap', 'sitemap_shard', 'robots_txt', 'ads_txt',
+    'api_posts', 'api_post', 'api_categories',
+})
+
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP ``scope`` and request ``body``."""
+    # WSGI carries the raw path as latin-1 text.
+    path = scope['path'].encode('utf-8').decode('latin-1')
+    root_path = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path,
+        'PATH_INFO': path[len(root_path):] if path.startswith(root_path) else path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _response_start(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+def run_wsgi(app, environ, send):
+    """Call the WSGI ``app`` and pass its response to ``send`` as ASGI messages.
+
+    ``send`` is a plain callable taking one message; the response start is
+    held back until the first body chunk so an error page can replace it.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and started and started[0] is None:
+            raise exc_info[1].with_traceback(exc_info[2])
+        started[:] = [_response_start(status, headers)]
+
+    iterable = app(environ, start_response)
+    try:
+        for chunk in iterable:
+            if not chunk:
+                continue
+            if started[0] is not None:
+                send(started[0])
+                started[0] = None
+            send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
+    if started[0] is not None:
+        send(started[0])
+    send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+class ASGIBridge:
+    """ASGI application serving a Flask app, async on the public read routes."""
+
+    def __init__(self, app):
+        self.app = app
+        self.engine = create_async_engine(app)
+        self.executor = ThreadPoolExecutor(app.config.get('ASGI_THREADS', 8), thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope type: {scope["type"]!r}')
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        environ = build_environ(scope, bytes(body))
+
+        if self.is_async(environ):
+            environ[ASYNC_ENGINE_KEY] = self.engine.sync_engine
+            await greenlet_spawn(run_wsgi, self.app, environ, lambda message: await_only(send(message)))
+        else:
+            loop = asyncio.get_running_loop()
+
+            def send_from_thread(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            await loop.run_in_executor(self.executor, run_wsgi, self.app, environ, send_from_thread)
+
+    def is_async(self, environ):
+        """Whether the request is for one of ASYNC_ENDPOINTS."""
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return False
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False
+        return endpoint in ASYNC_ENDPOINTS
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
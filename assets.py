@@ -0,0 +1,206 @@
+"""
+Static asset pipeline.
+
+``flask assets-build`` copies every file in the static folder to
+``static/dist`` under a content-hashed name (``css/styles.3f9a1c0b.css``),
+minifying CSS on the way and writing ``.gz`` and, when the ``brotli``
+package is installed, ``.br`` siblings. A manifest maps logical names to
+hashed ones.
+
+Templates link assets with ``asset_url('css/styles.css')``. Once a build
+exists that resolves to the hashed file, served from /static/dist with a
+one-year immutable Cache-Control and the precompressed variant the client
+accepts; without a build it falls back to the plain /static URL, so
+development needs no build step.
+
+With ``INLINE_CRITICAL_CSS`` the rules above the ``critical:end`` marker
+in styles.css are inlined into every page and the full stylesheet is
+loaded without blocking rendering.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from flask import abort, request, send_file, url_for
+from markupsafe import Markup
+from werkzeug.security import safe_join
+
+
+OUTPUT_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Served at fixed, well-known URLs; never fingerprinted.
+UNHASHED = {'robots.txt', 'ads.txt'}
+
+STYLESHEET = 'css/styles.css'
+CRITICAL_MARKER = '/* critical:end'
+
+# Hashed files never change, so clients may keep them for a year.
+IMMUTABLE_MAX_AGE = 31536000
+
+# Don't bother precompressing tiny files.
+MIN_COMPRESS_SIZE = 256
+
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.DOTALL)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css):
+    """Drop comments and insignificant whitespace; strings are left alone."""
+    out = []
+    code = []
+    position = 0
+    for match in CSS_TOKEN_RE.finditer(css):
+        code.append(css[position:match.start()])
+        if match.group(1):
+            out.append(_squeeze(''.join(code)))
+            out.append(match.group(1))
+            code = []
+        position = match.end()
+    code.append(css[position:])
+    out.append(_squeeze(''.join(code)))
+    return ''.join(out).replace(';}', '}').strip()
+
+
+def _squeeze(css):
+    css = CSS_SPACE_RE.sub(' ', css)
+    css = CSS_PUNCTUATION_RE.sub(r'\1', css)
+    # A space after ':' is never needed; one before it may be (".a :hover").
+    return css.replace(': ', ':')
+
+
+def write_compressed(directory, relative_path, body):
+    """Write ``body`` plus precompressed siblings; return bytes written."""
+    path = os.path.join(directory, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(body)
+    written = len(body)
+    if len(body) >= MIN_COMPRESS_SIZE:
+        packed = gzip.compress(body, compresslevel=9, mtime=0)
+        with open(path + '.gz', 'wb') as f:
+            f.write(packed)
+        written += len(packed)
+        if brotli is not None:
+            packed = brotli.compress(body, quality=11)
+            with open(path + '.br', 'wb') as f:
+                f.write(packed)
+            written += len(packed)
+    return written
+
+
+def build_assets(static_folder, log=print):
+    """Fingerprint the static folder into ``<static_folder>/dist``; returns the manifest.
+
+    Files from earlier builds are kept so pages rendered (or cached)
+    before a deploy can still load the assets they link to.
+    """
+    output = os.path.join(static_folder, OUTPUT_DIR)
+    manifest = {}
+    for root, dirs, names in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [name for name in dirs if name != OUTPUT_DIR]
+        dirs.sort()
+        for name in sorted(names):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            if logical in UNHASHED:
+                continue
+            with open(source, 'rb') as f:
+                body = f.read()
+            if name.endswith('.css'):
+                body = minify_css(body.decode('utf-8')).encode('utf-8')
+            stem, ext = os.path.splitext(logical)
+            hashed = f'{stem}.{hashlib.sha256(body).hexdigest()[:10]}{ext}'
+            write_compressed(output, hashed, body)
+            manifest[logical] = hashed
+            log(f'  {logical} -> {OUTPUT_DIR}/{hashed} ({len(body) / 1024:.1f} KiB)')
+
+    with open(os.path.join(output, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    """Flask extension resolving fingerprinted asset URLs and serving them."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.build_id = ''
+        self.critical_css = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.output = os.path.join(app.static_folder, OUTPUT_DIR)
+        self.reload()
+        self.critical_css = None
+        if app.config.get('INLINE_CRITICAL_CSS'):
+            self.critical_css = self._critical_css(app.static_folder)
+
+        app.add_url_rule(f'{app.static_url_path}/{OUTPUT_DIR}/<path:filename>', 'asset', self.serve)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_template_global(self.inline_critical_css, 'inline_critical_css')
+        app.extensions['assets'] = self
+
+    def reload(self):
+        """(Re)read the manifest written by build_assets(), if there is one."""
+        try:
+            with open(os.path.join(self.output, MANIFEST_NAME), 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            self.manifest, self.build_id = {}, ''
+            return
+        self.manifest = json.loads(raw)
+        self.build_id = hashlib.sha1(raw).hexdigest()
+
+    @staticmethod
+    def _critical_css(static_folder):
+        with open(os.path.join(static_folder, STYLESHEET), encoding='utf-8') as f:
+            css = f.read()
+        head, marker, _ = css.partition(CRITICAL_MARKER)
+        return minify_css(head) if marker else None
+
+    def asset_url(self, filename):
+        """URL of the fingerprinted build of ``filename``, or its plain static URL."""
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('asset', filename=hashed)
+
+    def inline_critical_css(self):
+        """Contents for an inline <style> block, or None when disabled."""
+        return Markup(self.critical_css) if self.critical_css else None
+
+    def serve(self, filename):
+        """Send a hashed asset, precompressed when the client accepts it."""
+        path = safe_join(self.output, filename)
+        if path is None or filename == MANIFEST_NAME or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+                response = send_file(path + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
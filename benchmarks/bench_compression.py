@@ -0,0 +1,119 @@
+"""
+Response compression benchmark.
+
+Builds a throwaway SQLite database of synthetic long-form guides and
+requests the public pages through the WSGI stack in three setups:
+
+- identity: no compression, no page cache (the previous behaviour);
+- on the fly: CompressionMiddleware compressing every response;
+- cached: page cache on, so hits send the stored compressed variant.
+
+Reports bytes on the wire and process CPU time per request for each
+setup and encoding.
+
+Usage: python benchmarks/bench_compression.py [--posts 200] [--repeat 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from models import db, Category, Post
+from seed_data import CATEGORIES
+
+
+URLS = ['/', '/blog', '/post/bench-guide-7', '/sitemap.xml']
+
+WORDS = (
+    'visa application requirements proof of funds sponsorship licence employer '
+    'salary threshold english test ielts biometrics embassy appointment documents '
+    'bank statement tuberculosis certificate accommodation dependants healthcare '
+    'surcharge processing time refusal appeal settlement citizenship nigeria lagos'
+).split()
+
+
+def synthetic_guide(i, category_ids, rng):
+    sections = []
+    for n in range(12):
+        paragraphs = ''.join(
+            '<p>' + ' '.join(rng.choices(WORDS, k=90)).capitalize() + '.</p>\n' for _ in range(3)
+        )
+        sections.append(f'<h2>Step {n + 1}: {" ".join(rng.choices(WORDS, k=4)).title()}</h2>\n{paragraphs}')
+    return Post(
+        title=f'Guide {i}: {" ".join(rng.choices(WORDS, k=5)).title()}',
+        slug=f'bench-guide-{i}',
+        excerpt=' '.join(rng.choices(WORDS, k=30)),
+        content=''.join(sections),
+        category_id=rng.choice(category_ids),
+        is_published=True,
+        is_featured=i % 7 == 0,
+    )
+
+
+def build_app(database_path, compress, cache):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database_path
+        PAGE_CACHE_BACKEND = 'lru' if cache else None
+        COMPRESS_ENABLED = compress
+
+    return create_app(BenchConfig)
+
+
+def measure(app, url, accept_encoding, repeat):
+    """(bytes in the last response, mean CPU ms per request)."""
+    client = app.test_client()
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    client.get(url, headers=headers)  # warm up (and fill the cache)
+    size = 0
+    started = time.process_time()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+        size = len(response.get_data())
+    return size, (time.process_time() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, 'bench.db')
+        app = build_app(database_path, compress=False, cache=False)
+        with app.app_context():
+            db.create_all()
+            db.session.execute(Category.__table__.insert(), CATEGORIES)
+            category_ids = [category.id for category in Category.query.all()]
+            db.session.add_all(synthetic_guide(i, category_ids, rng) for i in range(args.posts))
+            db.session.commit()
+
+        setups = [
+            ('identity', False, False, ['']),
+            ('on the fly', True, False, ['gzip', 'br']),
+            ('cached', True, True, ['', 'gzip', 'br']),
+        ]
+        print(f'{"url":<22} {"setup":<11} {"encoding":<9} {"bytes":>8} {"cpu ms/req":>11}')
+        results = []
+        for name, compress, cache, encodings in setups:
+            # Measure each app right after creating it: extensions are
+            # module-level singletons configured by the latest create_app().
+            app = build_app(database_path, compress, cache)
+            for url in URLS:
+                for encoding in encodings:
+                    size, cpu = measure(app, url, encoding, args.repeat)
+                    results.append((url, name, encoding or 'identity', size, cpu))
+        for url, name, encoding, size, cpu in sorted(results, key=lambda row: URLS.index(row[0])):
+            print(f'{url:<22} {name:<11} {encoding:<9} {size:>8} {cpu:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
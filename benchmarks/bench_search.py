@@ -0,0 +1,116 @@
+"""
+Search latency benchmark.
+
+Builds throwaway SQLite databases of synthetic posts at increasing sizes
+and times the same queries against each search backend, plus the old
+LIKE-based admin search for reference. Indexed backends should stay
+roughly flat as the post count grows, since each query topic appears in
+a fixed number of posts; the LIKE scan grows linearly.
+
+Usage: python benchmarks/bench_search.py [--sizes 1000,5000,20000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_
+
+from app import create_app
+from config import Config
+from models import db, Category, Post
+from search import search_index
+from seed_data import CATEGORIES
+
+
+QUERIES = ['skilled worker visa', 'ielts preparation', 'nursing abroad', 'proof of funds', 'canada express entry']
+
+# Each query phrase appears in this many posts whatever the corpus size, like
+# a specific guide topic; everything else is Zipf-distributed filler text.
+POSTS_PER_TOPIC = 25
+FILLER = [f'w{i}' for i in range(5000)]
+FILLER_WEIGHTS = [1 / (rank + 1) for rank in range(len(FILLER))]
+
+
+def synthetic_posts(count, category_ids, rng):
+    stride = max(1, count // POSTS_PER_TOPIC)
+    for i in range(count):
+        words = rng.choices(FILLER, FILLER_WEIGHTS, k=400)
+        topics = [query for n, query in enumerate(QUERIES) if (i + n) % stride == 0]
+        yield {
+            'title': ' '.join(rng.choices(FILLER, FILLER_WEIGHTS, k=6) + topics[:1]).title() + f' {i}',
+            'slug': f'bench-post-{i}',
+            'excerpt': ' '.join(words[:30]),
+            'content': '<p>' + ' '.join(words + topics) + '</p>',
+            'meta_keywords': ', '.join(topics),
+            'category_id': rng.choice(category_ids),
+            'is_published': True,
+        }
+
+
+def build_app(database_path, backend):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database_path
+        PAGE_CACHE_BACKEND = None
+        SEARCH_BACKEND = backend
+
+    return create_app(BenchConfig)
+
+
+def time_queries(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            started = time.perf_counter()
+            run(query)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def like_search(query):
+    filters = [
+        or_(Post.title.ilike(f'%{term}%'), Post.excerpt.ilike(f'%{term}%'), Post.content.ilike(f'%{term}%'))
+        for term in query.split()
+    ]
+    return Post.query.with_entities(Post.id).filter(*filters).limit(30).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='1000,5000,20000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f'{"posts":>8} {"sqlite-fts5 ms":>15} {"memory-bm25 ms":>15} {"LIKE scan ms":>13}')
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_path = os.path.join(tmp, 'bench.db')
+            app = build_app(database_path, 'sqlite')
+            with app.app_context():
+                db.create_all()
+                search_index.create_schema()
+                db.session.execute(Category.__table__.insert(), CATEGORIES)
+                category_ids = [category.id for category in Category.query.all()]
+                db.session.execute(Post.__table__.insert(), list(synthetic_posts(size, category_ids, rng)))
+                db.session.commit()
+                search_index.rebuild()
+                fts = time_queries(lambda q: search_index.search(q), args.repeat)
+                like = time_queries(like_search, args.repeat)
+
+            app = build_app(database_path, 'memory')
+            with app.app_context():
+                search_index.search('warm up')
+                memory = time_queries(lambda q: search_index.search(q), args.repeat)
+
+        print(f'{size:>8} {fts:>15.2f} {memory:>15.2f} {like:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Worker startup benchmark.
+
+Starts fresh interpreters the way a gunicorn worker boots without
+``--preload`` and times, in each one, importing ``app``, building the app
+with create_app() and serving the first request for ``/``. Cases run with
+the admin panel loaded (the default) and with ``ADMIN_ENABLED=0``. One
+extra run per case under ``python -X importtime`` lists the slowest
+imports.
+
+``--max-import-ms`` sets a budget for the median import time (``import
+app``) of the default case; the script exits with status 1 when it is
+exceeded, so CI can fail the build. Results are written as JSON (see
+report.py) for compare.py: ``p50_ms`` is the median time to the first
+response.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--max-import-ms 600] [--output results/startup.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen
+import report
+
+
+# Runs in the child interpreter, from the repository root.
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get('/').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'status': status,
+}))
+"""
+
+CASES = {
+    'startup': {'ADMIN_ENABLED': '1'},
+    'startup_no_admin': {'ADMIN_ENABLED': '0'},
+}
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def child_env(database_path, settings):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.abspath(database_path),
+        'METRICS_ENABLED': '0',
+        **settings,
+    })
+    return env
+
+
+def run_once(env):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=report.ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env, limit):
+    """``[(cumulative_ms, module), ...]`` for the top-level imports of ``app``."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=report.ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    # Children are printed before their parent: collect the three-space
+    # rows until the one-space row for ``app`` closes its subtree.
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3))
+        if depth == 3:
+            rows.append((int(match.group(2)) / 1000, match.group(4)))
+        elif depth == 1:
+            if match.group(4) == 'app':
+                break
+            rows = []
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list per case')
+    parser.add_argument('--max-import-ms', type=float, help='Fail if the median import exceeds this')
+    parser.add_argument('--output', default=os.path.join(report.ROOT, 'benchmarks', 'results', 'startup.json'))
+    args = parser.parse_args()
+
+    database_path = datagen.ensure(args.posts, args.seed)
+    results = {}
+    for case, settings in CASES.items():
+        env = child_env(database_path, settings)
+        run_once(env)  # Warm the OS file cache and write bytecode.
+        runs = [run_once(env) for _ in range(args.runs)]
+        if any(run['status'] != 200 for run in runs):
+            print(f'{case}: / returned {runs[0]["status"]}')
+            return 1
+        totals = sorted(run['import_ms'] + run['create_app_ms'] + run['first_request_ms'] for run in runs)
+        results[case] = {
+            'runs': args.runs,
+            'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+            'create_app_ms': round(statistics.median(run['create_app_ms'] for run in runs), 1),
+            'first_request_ms': round(statistics.median(run['first_request_ms'] for run in runs), 1),
+            'p50_ms': round(statistics.median(totals), 1),
+            'p99_ms': round(report.percentile(totals, 0.99), 1),
+        }
+        row = results[case]
+        print(f'{case:<17} import {row["import_ms"]:>7.1f} ms  create_app {row["create_app_ms"]:>6.1f} ms  '
+              f'first request {row["first_request_ms"]:>6.1f} ms  total p50 {row["p50_ms"]:>7.1f} ms')
+        for cumulative, module in slowest_imports(env, args.top):
+            print(f'    {cumulative:>8.1f} ms  {module}')
+
+    report.save(args.output, report.metadata('startup', posts=args.posts, runs=args.runs), results)
+    print(f'Results written to {args.output}')
+
+    if args.max_import_ms is not None and results['startup']['import_ms'] > args.max_import_ms:
+        print(f'Import time {results["startup"]["import_ms"]} ms is over the {args.max_import_ms:g} ms budget.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Listing template benchmark.
+
+Renders the blog listing (blog.html) with 10, 100 and 1000 post cards from
+a generated database (see datagen.py), timing render_template() alone: the
+posts come from a read model snapshot built up front, so no SQL is
+measured. Each size runs with the card fragment cache off, cold (emptied
+before every render) and warm (the steady state of a worker). A last pair
+of cases times the first render of the home page in a fresh app, the
+work a new gunicorn worker does, with and without the Jinja bytecode
+cache.
+
+Results are written as JSON (see report.py) for compare.py.
+
+Usage: python benchmarks/bench_templates.py [--posts 1000] [--repeat 50] [--output results/templates.json]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template
+
+from readmodel import read_model
+import datagen
+import report
+
+
+SIZES = (10, 100, 1000)
+
+
+def render_blog(app, posts_by_category):
+    with app.test_request_context('/blog'):
+        return render_template('blog.html', posts_by_category=posts_by_category, prev_url=None, next_url=None)
+
+
+def run_listing(app, size, repeat, clear):
+    with app.app_context():
+        posts_by_category, _, _ = read_model.load().blog_page(per_page=size)
+    cache = app.extensions.get('fragment_cache')
+    render_blog(app, posts_by_category)  # Compile the templates (and fill the cache).
+    latencies = []
+    for _ in range(repeat):
+        if clear and cache is not None:
+            cache.clear()
+        started = time.perf_counter()
+        render_blog(app, posts_by_category)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return report.summarize(latencies)
+
+
+def first_render(database, bytecode_dir, repeat):
+    """Summary of the first home page render in ``repeat`` fresh apps."""
+    latencies = []
+    for _ in range(repeat):
+        app = datagen.build_app(database, PAGE_CACHE_BACKEND=None, JINJA_BYTECODE_CACHE_DIR=bytecode_dir)
+        read_model.warm(app)
+        client = app.test_client()
+        started = time.perf_counter()
+        client.get('/').get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return report.summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results', 'templates.json'))
+    args = parser.parse_args()
+
+    database = datagen.ensure(args.posts, args.seed)
+    results = {}
+    print(f'{"case":<28} {"p50 ms":>8} {"p99 ms":>8}')
+
+    modes = {'nocache': (0, False), 'cold': (None, True), 'warm': (None, False)}
+    for mode, (max_entries, clear) in modes.items():
+        settings = {'PAGE_CACHE_BACKEND': None}
+        if max_entries is not None:
+            settings['FRAGMENT_CACHE_MAX_ENTRIES'] = max_entries
+        app = datagen.build_app(database, **settings)
+        for size in SIZES:
+            key = f'blog_{size}/{mode}'
+            result = results[key] = run_listing(app, size, args.repeat, clear)
+            print(f'{key:<28} {result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}')
+
+    bytecode_dir = tempfile.mkdtemp(prefix='bench-bytecode-')
+    try:
+        for key, directory in (('first_render/no_bytecode', None), ('first_render/bytecode', bytecode_dir)):
+            if directory:
+                first_render(database, directory, 1)  # Write the bytecode.
+            result = results[key] = first_render(database, directory, max(3, args.repeat // 10))
+            print(f'{key:<28} {result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}')
+    finally:
+        shutil.rmtree(bytecode_dir, ignore_errors=True)
+
+    meta = report.metadata('templates', posts=args.posts, seed=args.seed, repeat=args.repeat)
+    report.save(args.output, meta, results)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
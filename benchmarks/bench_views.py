@@ -0,0 +1,130 @@
+"""
+Public view microbenchmarks.
+
+Requests every public route in process through the Flask test client
+against a generated database (see datagen.py), with the page cache off
+(every request runs the view) and on (steady-state hits). For each case
+it reports p50/p99 latency and, from the Server-Timing header added by
+metrics.py, the SQL queries, SQL time and template time per request.
+The read model (readmodel.py) is built first, as wsgi.py does;
+``--no-read-model`` serves every view from SQL instead.
+
+Results are written as JSON (see report.py) for compare.py.
+
+Usage: python benchmarks/bench_views.py [--posts 1000] [--repeat 200] [--no-read-model] [--output results/views.json]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Post
+from readmodel import read_model
+import datagen
+import report
+
+
+SERVER_TIMING_RE = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) queries")?')
+NEXT_CURSOR_RE = re.compile(r'href="(/blog\?cursor=[^"]+)"')
+
+# Post pages are spread over this many slugs so cache-off runs don't just
+# measure one row staying hot in SQLite's page cache.
+POST_SAMPLE = 50
+
+
+def server_timing(header):
+    """``(queries, db_ms, template_ms)`` parsed from a Server-Timing header."""
+    queries, timings = 0, {}
+    for name, duration, count in SERVER_TIMING_RE.findall(header or ''):
+        timings[name] = float(duration)
+        if count:
+            queries = int(count)
+    return queries, timings.get('db', 0.0), timings.get('tpl', 0.0)
+
+
+def cases(app, client):
+    """``{case: [url, ...]}``; each case cycles through its URLs."""
+    with app.app_context():
+        slugs = [slug for (slug,) in Post.query.with_entities(Post.slug)
+                 .filter_by(is_published=True).order_by(Post.id).limit(POST_SAMPLE)]
+        category = Post.query.filter_by(is_published=True).first().category.slug
+    page = client.get('/blog').get_data(as_text=True)
+    match = NEXT_CURSOR_RE.search(page)
+    next_page = match.group(1).replace('&amp;', '&') if match else '/blog'
+
+    return {
+        'home': ['/'],
+        'blog': ['/blog'],
+        'blog_page_2': [next_page],
+        'blog_category': [f'/blog?category={category}'],
+        'post': [f'/post/{slug}' for slug in slugs],
+        'search': ['/search?q=skilled+worker+visa', '/search?q=ielts+test', '/search?q=proof+of+funds'],
+        'sitemap': ['/sitemap.xml'],
+        'about': ['/about'],
+        'not_found': ['/post/does-not-exist'],
+    }
+
+
+def run_case(client, urls, repeat):
+    for url in urls:  # warm up (and fill the cache)
+        client.get(url)
+    latencies, queries, db_ms, template_ms = [], [], [], []
+    for i in range(repeat):
+        started = time.perf_counter()
+        response = client.get(urls[i % len(urls)])
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        count, db, template = server_timing(response.headers.get('Server-Timing'))
+        queries.append(count)
+        db_ms.append(db)
+        template_ms.append(template)
+    result = report.summarize(latencies)
+    result.update(
+        queries=statistics.median(queries),
+        db_ms=round(statistics.median(db_ms), 3),
+        template_ms=round(statistics.median(template_ms), 3),
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--only', help='Comma-separated case names to run')
+    parser.add_argument('--no-read-model', action='store_true', help='Serve every view from SQL (see readmodel.py)')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results', 'views.json'))
+    args = parser.parse_args()
+
+    database = datagen.ensure(args.posts, args.seed)
+    results = {}
+    print(f'{"case":<28} {"p50 ms":>8} {"p99 ms":>8} {"queries":>8} {"db ms":>7} {"tpl ms":>7}')
+    for cache in ('nocache', 'cache'):
+        # Measure each app right after creating it: extensions are
+        # module-level singletons configured by the latest create_app().
+        app = datagen.build_app(database, PAGE_CACHE_BACKEND='lru' if cache == 'cache' else None,
+                                READ_MODEL_ENABLED=not args.no_read_model)
+        read_model.warm(app)
+        client = app.test_client()
+        for name, urls in cases(app, client).items():
+            if args.only and name not in args.only.split(','):
+                continue
+            key = f'{name}/{cache}'
+            result = results[key] = run_case(client, urls, args.repeat)
+            print(f'{key:<28} {result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f} {result["queries"]:>8g} '
+                  f'{result["db_ms"]:>7.2f} {result["template_ms"]:>7.2f}')
+
+    meta = report.metadata('views', posts=args.posts, seed=args.seed, repeat=args.repeat,
+                           read_model=not args.no_read_model)
+    report.save(args.output, meta, results)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare a benchmark results file against a baseline.
+
+Checks every case present in both files (written by bench_views.py or
+loadtest.py) and flags regressions:
+
+- latency (p50/p99) more than ``--threshold`` slower, ignoring changes
+  smaller than ``--min-ms`` which are within timer noise;
+- throughput (rps) more than ``--threshold`` lower;
+- any increase in queries per request, failed responses or errors.
+
+Exits with status 1 when anything regressed, so CI can fail the build.
+Only compare results from the same machine and suite settings; the
+baseline's meta block is printed next to the current one to make
+mismatches obvious.
+
+Usage: python benchmarks/compare.py baseline.json results/views.json [--threshold 0.15]
+"""
+
+import argparse
+import sys
+
+import report
+
+
+LATENCY = ('p50_ms', 'p99_ms')
+COUNTS = ('queries', 'failed', 'errors')
+
+
+def regressions(baseline, current, threshold, min_ms):
+    """``[(case, metric, old, new), ...]`` for every regressed metric."""
+    found = []
+    for case in sorted(set(baseline) & set(current)):
+        old, new = baseline[case], current[case]
+        for metric in LATENCY:
+            if metric in old and metric in new:
+                if new[metric] - old[metric] > max(min_ms, old[metric] * threshold):
+                    found.append((case, metric, old[metric], new[metric]))
+        if 'rps' in old and 'rps' in new and new['rps'] < old['rps'] * (1 - threshold):
+            found.append((case, 'rps', old['rps'], new['rps']))
+        for metric in COUNTS:
+            if metric in old and metric in new and new[metric] > old[metric]:
+                found.append((case, metric, old[metric], new[metric]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Allowed relative slowdown (default 0.15)')
+    parser.add_argument('--min-ms', type=float, default=0.5, help='Ignore latency changes below this (default 0.5)')
+    args = parser.parse_args()
+
+    baseline, current = report.load(args.baseline), report.load(args.current)
+    for label, data in (('baseline', baseline), ('current', current)):
+        meta = data['meta']
+        print(f'{label:<9} {meta.get("suite")} commit={meta.get("commit")} created={meta.get("created")} '
+              f'posts={meta.get("posts")} cpus={meta.get("cpus")}')
+
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f'Not in current results: {", ".join(missing)}')
+
+    found = regressions(baseline['results'], current['results'], args.threshold, args.min_ms)
+    if not found:
+        print('No regressions.')
+        return 0
+    print(f'{"case":<28} {"metric":<8} {"baseline":>10} {"current":>10}')
+    for case, metric, old, new in found:
+        print(f'{case:<28} {metric:<8} {old:>10g} {new:>10g}')
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
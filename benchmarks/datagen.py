@@ -0,0 +1,196 @@
+"""
+Synthetic benchmark database generator.
+
+Fills a SQLite database with the real ``seed_data.CATEGORIES`` and N
+posts built from a long-form guide template (h2 sections, paragraphs,
+a featured image), with the same shape of data the site serves:
+published dates spread over years, every seventh post featured and a
+few drafts. The output only depends on ``--posts`` and ``--seed``, so
+runs on different machines or commits benchmark the same data.
+
+Bodies are drawn from a fixed pool of variants that are rendered once
+each, and rows are bulk inserted, so 100k posts take seconds rather than
+a content-pipeline run per post. The search index and (optionally)
+related posts are rebuilt so every view runs its normal queries.
+
+Usage: python benchmarks/datagen.py --posts 10000 [--seed 42] [--output PATH]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+from models import db, Category, Post
+from search import search_index
+from seed_data import CATEGORIES
+import rendering
+import related
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Distinct bodies; each is rendered once and shared by every post using it.
+BODY_VARIANTS = 64
+
+DRAFT_EVERY = 50
+FEATURED_EVERY = 7
+
+WORDS = (
+    'visa application requirements proof of funds sponsorship licence employer '
+    'salary threshold english test ielts biometrics embassy appointment documents '
+    'bank statement tuberculosis certificate accommodation dependants healthcare '
+    'surcharge processing time refusal appeal settlement citizenship nigeria lagos '
+    'abuja permit residence study work family spouse partner points assessment '
+    'credential nursing registration council degree transcript tuition scholarship'
+).split()
+
+POST_TEMPLATE = """<p>{intro}</p>
+<img src="{image}" alt="{title}">
+{sections}
+<h2>Final Thoughts</h2>
+<p>{outro}</p>
+"""
+
+SECTION_TEMPLATE = """<h2>{heading}</h2>
+<p>{paragraph}</p>
+<ul><li>{item}</li><li>{item2}</li><li>{item3}</li></ul>
+<p>{paragraph2}</p>
+"""
+
+
+def default_path(count, seed=42):
+    return os.path.join(DATA_DIR, f'posts-{count}-seed{seed}.db')
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def _body(rng, title, sections):
+    return POST_TEMPLATE.format(
+        intro=_sentence(rng, 60),
+        image='/static/images/favicon.svg',
+        title=title,
+        sections=''.join(
+            SECTION_TEMPLATE.format(
+                heading=' '.join(rng.choices(WORDS, k=4)).title(),
+                paragraph=' '.join(_sentence(rng, 25) for _ in range(4)),
+                item=_sentence(rng, 8), item2=_sentence(rng, 8), item3=_sentence(rng, 8),
+                paragraph2=' '.join(_sentence(rng, 25) for _ in range(3)),
+            )
+            for _ in range(sections)
+        ),
+        outro=_sentence(rng, 40),
+    )
+
+
+def synthetic_posts(count, category_ids, seed=42):
+    """Row dicts for ``count`` posts, including their stored renders."""
+    rng = random.Random(seed)
+    bodies = []
+    for n in range(BODY_VARIANTS):
+        content = _body(rng, f'Variant {n}', sections=rng.randint(4, 12))
+        html, toc, read_time = rendering.render_content(content)
+        bodies.append({
+            'content': content,
+            'rendered_content': html,
+            'toc': toc,
+            'read_time': read_time,
+            'rendered_key': rendering.content_key(content),
+        })
+
+    newest = datetime(2025, 1, 1)
+    for i in range(count):
+        published = newest - timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+        yield {
+            'title': f'{" ".join(rng.choices(WORDS, k=5)).title()} Guide {i}',
+            'slug': f'bench-post-{i}',
+            'excerpt': _sentence(rng, 30),
+            'image_url': '/static/images/favicon.svg',
+            'category_id': rng.choice(category_ids),
+            'published_date': published,
+            'updated_date': published,
+            'is_featured': i % FEATURED_EVERY == 0,
+            'is_published': i % DRAFT_EVERY != DRAFT_EVERY - 1,
+            'meta_description': _sentence(rng, 20),
+            'meta_keywords': ', '.join(rng.choices(WORDS, k=4)),
+            **bodies[rng.randrange(BODY_VARIANTS)],
+        }
+
+
+def build_app(database_path, **settings):
+    """App bound to ``database_path`` with benchmark-friendly settings."""
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(database_path)
+        METRICS_DIR = None
+        # Nothing edits benchmark databases while they are served.
+        READ_MODEL_VERSION_FILE = None
+
+    for name, value in settings.items():
+        setattr(BenchConfig, name, value)
+    return create_app(BenchConfig)
+
+
+def generate(path, count, seed=42, with_related=True, batch_size=5000, log=print):
+    """Create a fresh database of ``count`` posts at ``path``."""
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    app = build_app(path, PAGE_CACHE_BACKEND=None)
+    with app.app_context():
+        db.create_all()
+        search_index.create_schema()
+        db.session.execute(Category.__table__.insert(), CATEGORIES)
+        category_ids = [category.id for category in Category.query.order_by(Category.id)]
+        batch = []
+        for row in synthetic_posts(count, category_ids, seed):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.session.execute(Post.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(Post.__table__.insert(), batch)
+        db.session.commit()
+        log(f'  {count} posts inserted ({time.perf_counter() - started:.1f}s)')
+
+        search_index.rebuild()
+        log(f'  search index built ({time.perf_counter() - started:.1f}s)')
+        if with_related:
+            related.rebuild(app.config['RELATED_POSTS_K'])
+            log(f'  related posts built ({time.perf_counter() - started:.1f}s)')
+    return path
+
+
+def ensure(count, seed=42, path=None, log=print):
+    """Path of a generated database of ``count`` posts, creating it if missing."""
+    path = path or default_path(count, seed)
+    if not os.path.exists(path):
+        log(f'Generating {count} posts into {path}')
+        generate(path, count, seed, log=log)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Database path (default benchmarks/data/posts-<n>-seed<seed>.db)')
+    parser.add_argument('--no-related', action='store_true', help='Skip the related-posts rebuild')
+    args = parser.parse_args()
+
+    path = args.output or default_path(args.posts, args.seed)
+    generate(path, args.posts, args.seed, with_related=not args.no_related)
+    print(f'Wrote {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+HTTP load test against gunicorn or uvicorn on localhost.
+
+Starts ``gunicorn wsgi:app`` (or, with ``--server uvicorn``, ``uvicorn
+asgi:app``) on a free local port against a generated database (see
+datagen.py), or targets an already running server with ``--url``, then
+keeps ``--concurrency`` client threads requesting a
+weighted mix of public URLs for ``--duration`` seconds. Reports
+throughput and p50/p99 latency overall and per URL, plus non-2xx/3xx
+responses and connection errors. ``--set NAME=VALUE`` passes settings to
+the server through its environment, e.g. ``--set READ_MODEL_ENABLED=0
+--set PAGE_CACHE_BACKEND=`` to make every request query the database.
+
+Threads spend most of their time waiting on sockets, so one client
+process can saturate a few gunicorn workers; for larger runs point a
+dedicated tool at ``--url`` instead.
+
+Results are written as JSON (see report.py) for compare.py.
+
+Usage: python benchmarks/loadtest.py [--server gunicorn|uvicorn] [--posts 1000] [--workers 4]
+       [--concurrency 16] [--duration 20] [--set NAME=VALUE ...]
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import datagen
+import report
+
+
+# (path, weight): roughly the shape of real traffic, dominated by posts.
+MIX = [
+    ('/', 20),
+    ('/blog', 10),
+    ('/post/bench-post-{n}', 55),
+    ('/search?q=skilled+worker+visa', 5),
+    ('/sitemap.xml', 2),
+    ('/about', 3),
+    ('/post/does-not-exist', 5),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, workers, port):
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--no-access-log']
+    return [sys.executable, '-m', 'gunicorn', 'wsgi:app', '-b', f'127.0.0.1:{port}', '-w', str(workers)]
+
+
+def start_server(server, database, workers, port, log_path, settings):
+    env = dict(
+        os.environ,
+        DATABASE_URL='sqlite:///' + os.path.abspath(database),
+        METRICS_DIR=os.path.join(os.path.dirname(log_path), 'metrics'),
+        READ_MODEL_VERSION_FILE=os.path.join(os.path.dirname(log_path), 'content_version'),
+        **settings,
+    )
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        server_command(server, workers, port),
+        cwd=report.ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    log.close()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'{server} exited with {process.returncode}; see {log_path}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'{server} did not start listening within 30s; see {log_path}')
+
+
+def stop(server):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def client(base_url, paths, deadline, seed, samples, errors):
+    """One connection's request loop; appends ``(path, status, ms)`` to samples."""
+    rng = random.Random(seed)
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    choices, weights = zip(*paths)
+    local = []
+    while time.monotonic() < deadline:
+        path = rng.choices(choices, weights)[0]
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'Accept-Encoding': 'gzip, br'})
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(f'{path}: {exc!r}')
+            connection.close()
+            continue
+        local.append((path, response.status, (time.perf_counter() - started) * 1000))
+        if response.will_close:
+            connection.close()
+    connection.close()
+    samples.extend(local)
+
+
+def run(base_url, posts, concurrency, duration, seed):
+    # Post traffic is spread over a fixed sample of posts so the page cache
+    # sees a realistic mix of hits and misses.
+    paths = []
+    for path, weight in MIX:
+        if '{n}' in path:
+            sample = random.Random(seed).sample(range(posts), min(posts, 200))
+            paths += [(path.format(n=n), weight / len(sample)) for n in sample]
+        else:
+            paths.append((path, weight))
+
+    samples, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(base_url, paths, deadline, seed + i, samples, errors))
+        for i in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return samples, errors, elapsed
+
+
+def summarize(samples, errors, elapsed):
+    results = {}
+    groups = {'all': samples}
+    for path, status, ms in samples:
+        if path.startswith('/post/bench-post-'):
+            name = 'post'
+        elif path == '/post/does-not-exist':
+            name = 'not_found'
+        else:
+            name = path.split('?')[0]
+        groups.setdefault(name, []).append((path, status, ms))
+    for name, group in groups.items():
+        result = report.summarize([ms for _, _, ms in group])
+        result['rps'] = round(len(group) / elapsed, 1)
+        result['failed'] = sum(1 for _, status, _ in group if status >= 400 and status != 404)
+        results[name] = result
+    results['all']['errors'] = len(errors)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='Target a running server instead of starting one')
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn'), default='gunicorn')
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='Server setting passed through the environment; may be repeated')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results', 'loadtest.json'))
+    args = parser.parse_args()
+    settings = dict(setting.partition('=')[::2] for setting in args.set)
+
+    server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        base_url = args.url
+        if base_url is None:
+            database = datagen.ensure(args.posts, args.seed)
+            port = free_port()
+            server = start_server(args.server, database, args.workers, port,
+                                  os.path.join(tmp, f'{args.server}.log'), settings)
+            base_url = f'http://127.0.0.1:{port}'
+        try:
+            samples, errors, elapsed = run(base_url, args.posts, args.concurrency, args.duration, args.seed)
+        finally:
+            if server is not None:
+                stop(server)
+
+    if not samples:
+        raise SystemExit(f'No successful requests; first errors: {errors[:3]}')
+    results = summarize(samples, errors, elapsed)
+    print(f'{"url":<16} {"requests":>9} {"rps":>8} {"p50 ms":>8} {"p99 ms":>8} {"failed":>7}')
+    for name, result in sorted(results.items(), key=lambda item: -item[1]['requests']):
+        print(f'{name:<16} {result["requests"]:>9} {result["rps"]:>8.1f} {result["p50_ms"]:>8.2f} '
+              f'{result["p99_ms"]:>8.2f} {result["failed"]:>7}')
+    if errors:
+        print(f'{len(errors)} connection errors, e.g. {errors[0]}')
+
+    meta = report.metadata(
+        'loadtest', url=args.url, server=None if args.url else args.server, settings=settings,
+        posts=args.posts, seed=args.seed, workers=args.workers, concurrency=args.concurrency,
+        duration=args.duration,
+    )
+    report.save(args.output, meta, results)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
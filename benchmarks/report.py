@@ -0,0 +1,72 @@
+"""
+Shared result format for bench_views.py and loadtest.py.
+
+A results file is JSON::
+
+    {"meta": {"suite": ..., "commit": ..., "python": ..., ...},
+     "results": {"<case>": {"p50_ms": ..., "p99_ms": ..., "queries": ..., ...}}}
+
+compare.py diffs two of these case by case, so keep metric names stable.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    index = max(0, min(len(sorted_samples) - 1, round(fraction * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples_ms):
+    """Latency summary of per-request timings in milliseconds."""
+    samples = sorted(samples_ms)
+    return {
+        'requests': len(samples),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(suite, **settings):
+    return {
+        'suite': suite,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'argv': sys.argv[1:],
+        **settings,
+    }
+
+
+def save(path, meta, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,426 @@
+"""
+Full-page response cache for the public, read-only routes.
+
+Pages are keyed by path and query string and tagged with the content
+they were built from (``listings``, ``sitemap``, ``post:<slug>``,
+``category:<id>``). Saving a post or category in the admin bumps the
+matching tags, which makes every entry built from the old content stale.
+
+Tag versions are kept in files under ``PAGE_CACHE_DIR/tags`` for both
+backends, so an invalidation in one gunicorn worker, or in a CLI command,
+reaches the pages every other worker holds in memory. clear() bumps
+ALL_TAG, which every page carries, for the same reason.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, g, request, session
+from werkzeug.wrappers import Response
+
+from compression import compression, negotiate
+
+
+# Tag of every cached page, bumped by PageCache.clear().
+ALL_TAG = '*'
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class TagFiles:
+    """Tag versions in one file per tag, shared by every process on the host."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, tag):
+        return os.path.join(self.directory, hashlib.sha1(tag.encode('utf-8')).hexdigest())
+
+    def versions(self, tags):
+        versions = {}
+        for tag in tags:
+            try:
+                with open(self._path(tag), 'r') as f:
+                    versions[tag] = f.read()
+            except OSError:
+                versions[tag] = ''
+        return versions
+
+    def bump(self, tag):
+        _write_atomic(self._path(tag), uuid.uuid4().hex.encode('ascii'))
+
+
+class LRUBackend:
+    """In-process cache bounded to ``max_entries``, evicting least recently used.
+
+    With ``tags_dir`` the tag versions live in TagFiles there, so other
+    processes can invalidate this one's entries; without it they stay in
+    memory, which only suits a single process.
+    """
+
+    def __init__(self, max_entries=512, tags_dir=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._tag_files = TagFiles(tags_dir) if tags_dir else None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        if self._tag_files is not None:
+            return self._tag_files.versions(tags)
+        with self._lock:
+            return {tag: self._tags.get(tag, '') for tag in tags}
+
+    def bump_tag(self, tag):
+        if self._tag_files is not None:
+            self._tag_files.bump(tag)
+            return
+        with self._lock:
+            self._tags[tag] = uuid.uuid4().hex
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend:
+    """Cache shared by every worker on the host through a directory.
+
+    Entries are pickled to one file per key and tag versions kept in
+    TagFiles; both are replaced atomically. Reads touch the entry's mtime
+    so eviction past ``max_entries`` drops the least recently used files.
+    """
+
+    EVICT_EVERY = 64
+
+    def __init__(self, directory, max_entries=2048):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        self._tag_files = TagFiles(os.path.join(directory, 'tags'))
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.page')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry
+
+    def set(self, key, entry):
+        _write_atomic(self._path(key), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict()
+
+    def _evict(self):
+        pages = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.page'):
+                try:
+                    pages.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        if len(pages) <= self.max_entries:
+            return
+        pages.sort()
+        for _, path in pages[:len(pages) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def tag_versions(self, tags):
+        return self._tag_files.versions(tags)
+
+    def bump_tag(self, tag):
+        self._tag_files.bump(tag)
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.page'):
+                os.remove(entry.path)
+
+
+class PageCache:
+    """Flask extension caching rendered GET responses by path and query string."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.repeat_after = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('PAGE_CACHE_BACKEND')
+        max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 512)
+        if backend == 'lru':
+            self.backend = LRUBackend(max_entries, os.path.join(app.config['PAGE_CACHE_DIR'], 'tags'))
+        elif backend == 'filesystem':
+            self.backend = FileSystemBackend(app.config['PAGE_CACHE_DIR'], max_entries)
+        elif backend:
+            raise ValueError(f'Unknown PAGE_CACHE_BACKEND: {backend!r}')
+        else:
+            self.backend = None
+        # Pages rendered from a lagging read replica may reflect the old
+        # content; invalidating again once the replica has caught up drops them.
+        self.repeat_after = None
+        if app.config.get('DATABASE_REPLICA_URL'):
+            self.repeat_after = app.config.get('DATABASE_REPLICA_MAX_LAG', 5)
+        app.extensions['page_cache'] = self
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """Hit/miss counters for this worker process."""
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def add_tags(self, *tags):
+        """Tag the page being rendered with content only known inside the view."""
+        g.setdefault('page_cache_tags', set()).update(tags)
+
+    def invalidate(self, *tags):
+        """Mark every cached page built from any of ``tags`` as stale."""
+        if self.backend is None:
+            return
+        self._bump(tags)
+        self._repeat_later(self._bump, tags)
+
+    def clear(self):
+        """Drop every cached page, in this process and (through ALL_TAG) all others."""
+        if self.backend is not None:
+            self.backend.clear()
+            self._bump([ALL_TAG])
+            self._repeat_later(self._bump, [ALL_TAG])
+
+    def _bump(self, tags):
+        for tag in set(tags):
+            self.backend.bump_tag(tag)
+
+    def _repeat_later(self, func, *args):
+        if self.repeat_after:
+            # Not a daemon, so a CLI command waits for it before exiting.
+            threading.Timer(self.repeat_after, func, args).start()
+
+    def _cacheable_request(self):
+        if self.backend is None or request.method not in ('GET', 'HEAD'):
+            return False
+        # Pending flash messages are rendered into the page for one visitor only.
+        return '_flashes' not in session
+
+    def _store(self, key, entry, body, mimetype):
+        # Compressed once here so hits never recompress (see compression.py).
+        entry['body'] = body
+        entry['encoded'] = compression.encode_variants(body, mimetype)
+        self.backend.set(key, entry)
+    
+    def _store_stream(self, key, entry, chunks, mimetype):
+        body = []
+        for chunk in chunks:
+            body.append(chunk)
+            yield chunk
+        self._store(key, entry, b''.join(body), mimetype)
+    
+    def _respond(self, entry, cache_status):
+        """Response for a stored entry, in the encoding the client prefers."""
+        encoded = entry.get('encoded') or {}
+        encoding = negotiate(request.headers.get('Accept-Encoding')) if encoded else None
+        response = Response(encoded.get(encoding, entry['body']), status=entry['status'], headers=entry['headers'])
+        if encoded:
+            response.vary.add('Accept-Encoding')
+        if encoding in encoded:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['X-Cache'] = cache_status
+        return response
+
+    def cached(self, *tags):
+        """Cache the decorated view's response, tagged with ``tags``."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self._cacheable_request():
+                    return view(*args, **kwargs)
+
+                key = request.path + '?' + request.query_string.decode('latin-1')
+                entry = self.backend.get(key)
+                if entry is not None and self.backend.tag_versions(entry['tags']) == entry['tags']:
+                    self._count(True)
+                    return self._respond(entry, 'HIT')
+                self._count(False)
+
+                # Read tag versions before rendering so an edit committed
+                # mid-render leaves the stored entry already stale.
+                page_tags = self.backend.tag_versions((*tags, ALL_TAG))
+                g.page_cache_tags = set()
+                response = current_app.make_response(view(*args, **kwargs))
+                page_tags.update(self.backend.tag_versions(g.pop('page_cache_tags') - page_tags.keys()))
+
+                if response.status_code == 200 and 'Set-Cookie' not in response.headers:
+                    entry = {
+                        'status': response.status_code,
+                        'headers': list(response.headers.items()),
+                        'tags': page_tags,
+                    }
+                    if response.is_streamed:
+                        # Keep streaming to the client and store the body
+                        # once the last chunk has gone out.
+                        response.response = self._store_stream(
+                            key, entry, response.iter_encoded(), response.mimetype
+                        )
+                    else:
+                        self._store(key, entry, response.get_data(), response.mimetype)
+                        return self._respond(entry, 'MISS')
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+page_cache = PageCache()
+
+
+def template_build_id():
+    """Hash of the templates and asset build, so a deploy that changes markup changes ETags."""
+    app = current_app._get_current_object()
+    build_id = app.extensions.get('etag_build_id')
+    if build_id is None:
+        digest = hashlib.sha1()
+        if 'assets' in app.extensions:
+            # Pages link fingerprinted asset names from the current build.
+            digest.update(app.extensions['assets'].build_id.encode('ascii'))
+        template_dir = os.path.join(app.root_path, app.template_folder)
+        for root, dirs, names in os.walk(template_dir):
+            dirs.sort()
+            for name in sorted(names):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(f.read())
+        build_id = app.extensions['etag_build_id'] = digest.hexdigest()
+    return build_id
+
+
+def _not_modified(etag, last_modified):
+    # If-None-Match takes precedence; If-Modified-Since is only consulted
+    # when the client sent no entity tags (RFC 9110, section 13.2.2).
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(version):
+    """Send ETag/Last-Modified and answer conditional GETs with 304.
+    
+    ``version`` is called with the view's arguments and returns
+    ``(last_modified, version)`` from a cheap query, or None to let the
+    view run normally (e.g. to produce a 404). A matching validator
+    short-circuits before the view renders anything.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            result = version(*args, **kwargs)
+            if result is None:
+                return view(*args, **kwargs)
+
+            last_modified, token = result
+            if last_modified is not None:
+                if last_modified.tzinfo is None:
+                    last_modified = last_modified.replace(tzinfo=timezone.utc)
+                last_modified = last_modified.replace(microsecond=0)
+            etag = hashlib.sha1(
+                f'{request.full_path}|{token}|{template_build_id()}'.encode('utf-8')
+            ).hexdigest()
+
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            # Weak, since the same page is sent in several content encodings.
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Let browsers keep the copy but revalidate it on every use.
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def post_cache_tags(post):
+    """Tags covering every cached page that shows ``post``.
+
+    Includes the previous slug and category when the edit changed them, so
+    the old URL and the old category's related-posts blocks drop out too.
+    """
+    from sqlalchemy import inspect
+
+    state = inspect(post)
+    slugs = {post.slug, *state.attrs.slug.history.deleted}
+    category_ids = {post.category_id, *state.attrs.category_id.history.deleted}
+    tags = {'listings', 'sitemap'}
+    tags.update(f'post:{slug}' for slug in slugs if slug)
+    tags.update(f'category:{category_id}' for category_id in category_ids if category_id)
+    return tags
+
+
+def category_cache_tags(category):
+    """Tags covering every cached page that shows ``category``."""
+    return {'listings', f'category:{category.id}'}
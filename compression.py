@@ -0,0 +1,194 @@
+"""
+Response compression.
+
+CompressionMiddleware wraps ``app.wsgi_app`` and compresses text responses
+with brotli (when the ``brotli`` package is installed) or gzip, whichever
+the client's ``Accept-Encoding`` prefers. Small bodies, non-text types
+and responses that already carry a ``Content-Encoding`` (precompressed
+assets, cached pages) pass through untouched. Streamed responses without
+a Content-Length, such as the sitemap, are compressed chunk by chunk.
+
+The page cache stores compressed variants next to each cached body (see
+Compression.encode_variants()), so a cache hit never recompresses.
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/xml', 'application/json', 'application/javascript',
+    'application/rss+xml', 'image/svg+xml',
+)
+
+
+def _supported():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Best supported encoding acceptable to the client, or None."""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best, best_quality = None, 0
+    for encoding in _supported():
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.split(';')[0].strip().startswith(COMPRESSIBLE_TYPES)
+
+
+class _Stream:
+    """Incremental encoder with the same interface for gzip and brotli."""
+
+    def __init__(self, encoding, level, br_level):
+        if encoding == 'br':
+            self._encoder = brotli.Compressor(quality=br_level)
+            self.compress, self.finish = self._encoder.process, self._encoder.finish
+        else:
+            # wbits=31 writes a gzip header and trailer.
+            self._encoder = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self.compress, self.finish = self._encoder.compress, self._encoder.flush
+
+
+class Compression:
+    """Flask extension installing CompressionMiddleware with the app's settings."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.level = 6
+        self.br_level = 5
+        self.min_size = 500
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.level = app.config.get('COMPRESS_LEVEL', 6)
+        self.br_level = app.config.get('COMPRESS_BR_LEVEL', 5)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        if self.enabled:
+            app.wsgi_app = CompressionMiddleware(app.wsgi_app, self)
+        app.extensions['compression'] = self
+
+    def compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.br_level)
+        return gzip.compress(body, compresslevel=self.level, mtime=0)
+
+    def stream(self, encoding):
+        return _Stream(encoding, self.level, self.br_level)
+
+    def encode_variants(self, body, mimetype):
+        """``{encoding: bytes}`` for every supported encoding worth sending."""
+        if not self.enabled or len(body) < self.min_size or not is_compressible(mimetype):
+            return {}
+        return {encoding: self.compress(body, encoding) for encoding in _supported()}
+
+
+class CompressionMiddleware:
+    """WSGI middleware compressing eligible responses on the fly."""
+
+    def __init__(self, app, settings):
+        self.app = app
+        self.settings = settings
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = []
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        status, headers, exc_info = captured
+        headers = Headers(headers)
+
+        if not self._eligible(status, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            if written:
+                return _prepend(written, app_iter)
+            return app_iter
+
+        headers['Vary'] = _add_vary(headers.get('Vary', ''))
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # The compressed bytes differ from the identity representation.
+            headers['ETag'] = 'W/' + etag
+        headers['Content-Encoding'] = encoding
+
+        length = headers.get('Content-Length', type=int)
+        if length is not None:
+            body = b''.join(written) + b''.join(app_iter)
+            _close(app_iter)
+            body = self.settings.compress(body, encoding)
+            headers['Content-Length'] = str(len(body))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return [body]
+
+        headers.remove('Content-Length')
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return self._stream(_prepend(written, app_iter), encoding)
+
+    def _eligible(self, status, headers):
+        if not status.startswith('200') or 'Content-Encoding' in headers:
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        if not is_compressible(headers.get('Content-Type')):
+            return False
+        length = headers.get('Content-Length', type=int)
+        return length is None or length >= self.settings.min_size
+
+    def _stream(self, chunks, encoding):
+        encoder = self.settings.stream(encoding)
+        try:
+            for chunk in chunks:
+                data = encoder.compress(chunk)
+                if data:
+                    yield data
+            yield encoder.finish()
+        finally:
+            _close(chunks)
+
+
+def _add_vary(value):
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if not any(field.lower() == 'accept-encoding' for field in fields):
+        fields.append('Accept-Encoding')
+    return ', '.join(fields)
+
+
+def _prepend(written, app_iter):
+    yield from written
+    try:
+        yield from app_iter
+    finally:
+        _close(app_iter)
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+compression = Compression()
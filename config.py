@@ -13,6 +13,138 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'instance', 'site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Engine tuning (see database.py): 'auto' picks the SQLite or Postgres
+    # profile from the URL, 'none' keeps SQLAlchemy's defaults.
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'auto')
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 32 * 1024))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Postgres pool, per gunicorn worker: a sync worker holds one connection
+    # at a time, so keep workers * (size + overflow) below max_connections.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 2))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 3))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 10000))
+    
+    # Optional read replica for the public read-only routes; the admin and
+    # all writes stay on the primary.
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', 5))
+    
+    # ASGI entry point (asgi.py): the public read routes query through
+    # ASYNC_DATABASE_URL, by default the replica or primary URL on its
+    # async driver; other requests run on ASGI_THREADS threads per worker.
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+    
+    # Page cache: 'lru' (pages per worker), 'filesystem' (pages shared by
+    # all workers on the host) or empty to disable. Either way the tag
+    # versions that invalidate pages live in PAGE_CACHE_DIR/tags, shared
+    # by every worker and CLI command on the host.
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'lru')
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR') or os.path.join(basedir, 'instance', 'page_cache')
+    
+    # Response compression (brotli when installed, else gzip) for text
+    # responses of at least COMPRESS_MIN_SIZE bytes.
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL', 5))
+    COMPRESS_MIN_SIZE = 500
+    
+    # In-memory read model of the published content (see readmodel.py).
+    # Workers rebuild it when READ_MODEL_VERSION_FILE changes; past
+    # READ_MODEL_MAX_POSTS published posts every request uses SQL instead.
+    READ_MODEL_ENABLED = os.environ.get('READ_MODEL_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    READ_MODEL_MAX_POSTS = int(os.environ.get('READ_MODEL_MAX_POSTS', 2000))
+    READ_MODEL_VERSION_FILE = os.environ.get('READ_MODEL_VERSION_FILE') or \
+        os.path.join(basedir, 'instance', 'content_version')
+    
+    # Posts per /blog page (keyset paginated).
+    BLOG_PAGE_SIZE = int(os.environ.get('BLOG_PAGE_SIZE', 24))
+    
+    # JSON content API (api.py): default page size, and the most posts a
+    # page (?limit=) or a batch fetch (?slugs=) may ask for.
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 24))
+    API_MAX_ITEMS = int(os.environ.get('API_MAX_ITEMS', 100))
+    
+    # Full-text search: 'auto' picks SQLite FTS5 or Postgres tsvector from
+    # the database URL; 'memory' forces the pure-Python BM25 index.
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+    SEARCH_RESULTS_LIMIT = 30
+    
+    # Related posts: neighbours precomputed per post by `flask
+    # related-rebuild` and kept current by jobs queued on admin saves. More are stored
+    # than shown so an unpublished neighbour leaves spares behind.
+    RELATED_POSTS_K = int(os.environ.get('RELATED_POSTS_K', 6))
+    
+    # Sitemap: URLs per file before /sitemap.xml becomes an index of
+    # /sitemap-<n>.xml shards (the protocol limit is 50,000).
+    SITEMAP_MAX_URLS = int(os.environ.get('SITEMAP_MAX_URLS', 50000))
+    
+    # Inline the critical part of styles.css into every page and load the
+    # rest without blocking rendering (see assets.py).
+    INLINE_CRITICAL_CSS = os.environ.get('INLINE_CRITICAL_CSS', '').lower() in ('1', 'true', 'yes')
+    
+    # Responsive post images (see images.py; needs Pillow): derivatives at
+    # IMAGE_WIDTHS pixels in each of IMAGE_FORMATS, plus an on-demand
+    # resize cache in IMAGE_CACHE_DIR capped at IMAGE_CACHE_MAX_MB.
+    IMAGE_WIDTHS = [int(width) for width in os.environ.get('IMAGE_WIDTHS', '320,640,960,1280').split(',')]
+    IMAGE_FORMATS = os.environ.get('IMAGE_FORMATS', 'avif,webp,jpeg').split(',')
+    IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR') or os.path.join(basedir, 'instance', 'image_cache')
+    IMAGE_CACHE_MAX_MB = int(os.environ.get('IMAGE_CACHE_MAX_MB', 256))
+    
+    # Template caching (see fragments.py): rendered {% cache %} fragments
+    # such as post cards, per worker, and compiled templates on disk so new
+    # workers skip compiling them. 0 / empty disables either.
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 4096))
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', os.path.join(basedir, 'instance', 'jinja_cache'))
+    
+    # Instrumentation: Server-Timing headers and Prometheus metrics at
+    # /metrics. Each server worker writes its counters to METRICS_DIR so a
+    # scrape sees the whole pool; queries over SLOW_QUERY_MS are logged.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(basedir, 'instance', 'metrics')
+    # /metrics answers these client addresses or networks (loopback by
+    # default) and requests sending `Authorization: Bearer <METRICS_TOKEN>`.
+    METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    
+    # Contact form: submissions are stored, then emailed to CONTACT_EMAIL in
+    # the background when MAIL_SERVER is set (see contact.py and jobs.py).
+    MAIL_SERVER = os.environ.get('MAIL_SERVER')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '1').lower() in ('1', 'true', 'yes')
+    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL', '').lower() in ('1', 'true', 'yes')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_TIMEOUT = 10
+    # 0 turns the contact form rate limit off.
+    CONTACT_RATE_LIMIT_PER_HOUR = int(os.environ.get('CONTACT_RATE_LIMIT_PER_HOUR', 5))
+    CONTACT_RATE_LIMIT_BURST = int(os.environ.get('CONTACT_RATE_LIMIT_BURST', 3))
+    
+    # Background jobs: 'thread' runs them in the web workers, 'sqlite' queues
+    # them durably in JOBS_DB_PATH for `flask jobs-worker`.
+    JOBS_BACKEND = os.environ.get('JOBS_BACKEND', 'thread')
+    JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH') or os.path.join(basedir, 'instance', 'jobs.db')
+    JOBS_THREADS = 2
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_BACKOFF_SECONDS = int(os.environ.get('JOBS_BACKOFF_SECONDS', 30))
+    JOBS_LEASE_SECONDS = 300
+    
+    # Number of reverse proxies in front of the app (1 behind Nginx), so
+    # request.remote_addr is the visitor's address; 0 trusts no headers.
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    
+    # Serve the /admin panel from this process. Public-only worker pools can
+    # set ADMIN_ENABLED=0 to skip loading Flask-Admin entirely.
+    ADMIN_ENABLED = os.environ.get('ADMIN_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    
     # CKEditor
     CKEDITOR_SERVE_LOCAL = True
     CKEDITOR_HEIGHT = 400
@@ -0,0 +1,148 @@
+"""
+Contact form pipeline.
+
+A submission is rate limited per client IP, validated, stored as a
+ContactMessage and, when ``MAIL_SERVER`` is configured, handed to the job
+queue (see jobs.py) for delivery to ``CONTACT_EMAIL``. The request
+returns as soon as the row is committed, so the SMTP round trip never
+runs inside a web worker. Without a mail server messages are only
+stored, for reading in the admin panel.
+
+For local testing any SMTP sink works, e.g.
+``python -m aiosmtpd -n -l localhost:8025`` with ``MAIL_SERVER=localhost``,
+``MAIL_PORT=8025`` and ``MAIL_USE_TLS=0``.
+"""
+
+import re
+import smtplib
+from email.message import EmailMessage
+from email.utils import formataddr
+
+from flask import current_app
+
+from jobs import jobs
+from models import db, ContactMessage, utc_now
+from ratelimit import TokenBucket
+
+
+# Form <select> values and the labels used in the notification subject.
+SUBJECTS = {
+    'question': 'Question about a guide',
+    'suggestion': 'Content suggestion',
+    'feedback': 'General feedback',
+    'correction': 'Report an error',
+    'story': 'Share my Japa story',
+    'partnership': 'Partnership inquiry',
+    'other': 'Other',
+}
+
+MAX_MESSAGE_LENGTH = 5000
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class InvalidSubmission(ValueError):
+    """Raised for a submission that can't be stored; the message is shown to the visitor."""
+
+
+def _single_line(value, limit):
+    # Header-safe: no CR/LF from the form ever reaches an email header.
+    return ' '.join((value or '').split())[:limit]
+
+
+class ContactPipeline:
+    """Flask extension holding the per-IP rate limiter (None when disabled)."""
+
+    def __init__(self, app=None):
+        self.limiter = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        per_hour = app.config.get('CONTACT_RATE_LIMIT_PER_HOUR', 5)
+        self.limiter = None
+        if per_hour > 0:
+            self.limiter = TokenBucket(per_hour / 3600, app.config.get('CONTACT_RATE_LIMIT_BURST', 3))
+        app.extensions['contact'] = self
+
+    def check_rate(self, ip_address):
+        """0 if ``ip_address`` may submit now, else seconds to wait."""
+        if self.limiter is None:
+            return 0
+        return self.limiter.consume(ip_address or 'unknown')
+
+    def submit(self, form, ip_address):
+        """Store a submission and queue its delivery; returns the ContactMessage."""
+        name = _single_line(form.get('name'), 100)
+        email = _single_line(form.get('email'), 254)
+        message = (form.get('message') or '').strip()
+        if not name or not message:
+            raise InvalidSubmission('Please fill in your name and message.')
+        if not EMAIL_RE.match(email):
+            raise InvalidSubmission('Please enter a valid email address.')
+        if len(message) > MAX_MESSAGE_LENGTH:
+            raise InvalidSubmission(f'Please keep your message under {MAX_MESSAGE_LENGTH} characters.')
+        subject = form.get('subject')
+
+        deliver = bool(current_app.config.get('MAIL_SERVER'))
+        submission = ContactMessage(
+            name=name,
+            email=email,
+            subject=subject if subject in SUBJECTS else 'other',
+            message=message,
+            ip_address=ip_address,
+            status='pending' if deliver else 'stored',
+        )
+        db.session.add(submission)
+        db.session.commit()
+        if deliver:
+            jobs.enqueue('send_contact_message', message_id=submission.id)
+        return submission
+
+
+def build_email(submission, config):
+    email = EmailMessage()
+    email['Subject'] = f'[{config["SITE_NAME"]}] {SUBJECTS.get(submission.subject, "Other")}: {submission.name}'
+    email['From'] = config.get('MAIL_DEFAULT_SENDER') or config['CONTACT_EMAIL']
+    email['To'] = config['CONTACT_EMAIL']
+    email['Reply-To'] = formataddr((submission.name, submission.email))
+    email.set_content(
+        f'{submission.message}\n\n'
+        f'--\n{submission.name} <{submission.email}>\n'
+        f'Sent {submission.created_date:%Y-%m-%d %H:%M} UTC from {submission.ip_address or "unknown"}\n'
+    )
+    return email
+
+
+def send_email(email, config):
+    """Deliver through ``MAIL_SERVER``, with SSL/STARTTLS and login when configured."""
+    smtp_class = smtplib.SMTP_SSL if config.get('MAIL_USE_SSL') else smtplib.SMTP
+    with smtp_class(config['MAIL_SERVER'], config.get('MAIL_PORT', 25), timeout=config.get('MAIL_TIMEOUT', 10)) as smtp:
+        if config.get('MAIL_USE_TLS') and not config.get('MAIL_USE_SSL'):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        smtp.send_message(email)
+
+
+@jobs.task('send_contact_message')
+def send_contact_message(message_id, attempt, final):
+    """Email one stored submission; raising makes the queue retry it."""
+    submission = db.session.get(ContactMessage, message_id)
+    if submission is None or submission.status == 'sent':
+        return
+    submission.attempts = attempt
+    try:
+        send_email(build_email(submission, current_app.config), current_app.config)
+    except Exception as exc:
+        submission.status = 'failed' if final else 'pending'
+        submission.last_error = f'{type(exc).__name__}: {exc}'
+        db.session.commit()
+        raise
+    submission.status = 'sent'
+    submission.sent_date = utc_now()
+    submission.last_error = None
+    db.session.commit()
+
+
+contact_pipeline = ContactPipeline()
@@ -0,0 +1,236 @@
+"""
+Database engine profiles and read-replica routing.
+
+init_database() tunes the engine for the database behind
+``SQLALCHEMY_DATABASE_URI`` before handing the app to Flask-SQLAlchemy:
+
+- SQLite: WAL journal (readers no longer block on the admin writer, or it
+  on them), ``synchronous=NORMAL``, a memory map, a larger page cache and
+  a busy timeout, set on every new connection;
+- Postgres: a per-worker pool sized by ``DB_POOL_SIZE`` and
+  ``DB_MAX_OVERFLOW``, pre-ping, connection recycling and a server-side
+  statement timeout.
+
+``DATABASE_PROFILE`` picks the profile (``auto`` decides from the URL;
+``none`` keeps SQLAlchemy's defaults). Options set explicitly in
+``SQLALCHEMY_ENGINE_OPTIONS`` win over the profile.
+
+With ``DATABASE_REPLICA_URL`` set, views decorated with @read_replica run
+their reads against the replica; writes, flushes and every other request
+(the admin included) use the primary. Page cache invalidations are
+repeated after ``DATABASE_REPLICA_MAX_LAG`` seconds (see
+PageCache.invalidate()) so a page rendered from a lagging replica does
+not stay cached.
+
+Engines are disposed in forked children, which makes ``gunicorn
+--preload`` (and the process pools of the importer and static export)
+safe: no connection is ever shared between processes.
+
+create_async_engine() builds the engine the ASGI entry point (asgi.py)
+reads through, on the async driver for the same database (``aiosqlite``
+or ``asyncpg``) and with the same profile. Requests carrying it in their
+environ under ASYNC_ENGINE_KEY send their reads to it instead of the
+primary or replica.
+"""
+
+import os
+import weakref
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.selectable import Join
+
+
+REPLICA_BIND = 'replica'
+ASYNC_ENGINE_KEY = 'travelcleanandlegal.async_engine'
+
+# Async driver for each backend, for create_async_engine().
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+# Every engine init_database() created, for _dispose_after_fork().
+_engines = weakref.WeakSet()
+
+
+def engine_profile(app):
+    """``'sqlite'``, ``'postgres'`` or None for the configured database."""
+    profile = app.config.get('DATABASE_PROFILE', 'auto')
+    if profile == 'auto':
+        backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+        return {'sqlite': 'sqlite', 'postgresql': 'postgres'}.get(backend)
+    if profile in ('sqlite', 'postgres'):
+        return profile
+    if profile in ('none', '', None):
+        return None
+    raise ValueError(f'Unknown DATABASE_PROFILE: {profile!r}')
+
+
+def engine_options(profile, config):
+    """``create_engine()`` keyword arguments for ``profile``."""
+    if profile != 'postgres':
+        return {}
+    options = {
+        'pool_size': config.get('DB_POOL_SIZE', 2),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 3),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+    timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+    if timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={int(timeout)}'}
+    return options
+
+
+def sqlite_pragmas(config, url):
+    """PRAGMA statements run on every new SQLite connection."""
+    pragmas = [f'PRAGMA busy_timeout = {int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))}']
+    if make_url(url).database not in (None, '', ':memory:'):
+        # WAL needs a file; in-memory databases keep their own journal.
+        pragmas.append(f'PRAGMA journal_mode = {config.get("SQLITE_JOURNAL_MODE", "WAL")}')
+    pragmas += [
+        f'PRAGMA synchronous = {config.get("SQLITE_SYNCHRONOUS", "NORMAL")}',
+        f'PRAGMA mmap_size = {int(config.get("SQLITE_MMAP_SIZE", 0))}',
+        # Negative sizes are in KiB rather than pages.
+        f'PRAGMA cache_size = -{int(config.get("SQLITE_CACHE_SIZE_KB", 2000))}',
+    ]
+    return pragmas
+
+
+def _apply_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def init_database(app, db):
+    """Apply the engine profile and replica bind, then initialise ``db``."""
+    profile = engine_profile(app)
+    options = {**engine_options(profile, app.config), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_url, **options}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _engines.add(engine)
+            if profile == 'sqlite' and engine.dialect.name == 'sqlite':
+                _apply_pragmas(engine, sqlite_pragmas(app.config, engine.url))
+    app.extensions['database_profile'] = profile
+
+
+def async_url(url):
+    """``url`` on the async driver of its backend."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for {backend!r} databases')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def create_async_engine(app):
+    """AsyncEngine for the public read routes.
+
+    It points at ``ASYNC_DATABASE_URL`` when set, else at the replica or
+    the primary with the driver swapped, tuned like the sync engines.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine as create
+
+    url = app.config.get('ASYNC_DATABASE_URL') or async_url(
+        app.config.get('DATABASE_REPLICA_URL') or app.config['SQLALCHEMY_DATABASE_URI']
+    )
+    profile = engine_profile(app)
+    options = engine_options(profile, app.config)
+    if 'connect_args' in options:
+        # asyncpg takes server settings rather than a libpq options string.
+        timeout = str(int(app.config['DB_STATEMENT_TIMEOUT_MS']))
+        options['connect_args'] = {'server_settings': {'statement_timeout': timeout}}
+    engine = create(url, **options)
+    _engines.add(engine.sync_engine)
+    if profile == 'sqlite' and engine.dialect.name == 'sqlite':
+        _apply_pragmas(engine.sync_engine, sqlite_pragmas(app.config, engine.url))
+    return engine
+
+
+def _dispose_after_fork():
+    # Connections opened before a fork (gunicorn --preload, process pools)
+    # belong to the parent; the child starts with empty pools rather than
+    # sharing its sockets or SQLite handles. close=False leaves them open
+    # for the parent.
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def read_replica(view):
+    """Let ``view``'s reads go to the replica when one is configured.
+
+    Put it directly under ``@app.route`` so validators and cache lookups
+    read from the replica too.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class DrivingJoin(Join):
+    """Inner join that SQLite runs with its left side as the outer loop.
+
+    SQLite never reorders the tables of a ``CROSS JOIN``, so a listing
+    ordered by the left table's index and then the right's (the blog
+    listing: categories, then their posts) streams rows in order instead
+    of sorting all of them, a plan the planner will not pick without
+    ANALYZE statistics. Other databases get a plain ``JOIN``.
+    """
+
+    inherit_cache = True
+
+
+@compiles(DrivingJoin, 'sqlite')
+def _compile_driving_join(join, compiler, **kw):
+    kw['asfrom'] = True
+    return (
+        f'{compiler.process(join.left, **kw)} CROSS JOIN {compiler.process(join.right, **kw)}'
+        f' ON {compiler.process(join.onclause, **kw)}'
+    )
+
+
+def _is_read(clause):
+    if clause is None or getattr(clause, 'is_select', False):
+        return True
+    return isinstance(clause, TextClause) and clause.text.lstrip()[:6].upper() == 'SELECT'
+
+
+class RoutingSession(Session):
+    """Session sending @read_replica reads to the replica bind.
+
+    Reads of requests served by asgi.py go to their async engine instead.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and _is_read(clause):
+            engine = request.environ.get(ASYNC_ENGINE_KEY)
+            if engine is None and g.get('read_replica'):
+                engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,104 @@
+"""
+Template fragment and bytecode caching.
+
+A ``{% cache %}`` block renders its body once per distinct key and reuses
+the markup afterwards:
+
+    {% cache 'card:blog', post_card_key(post) %}{{ post_card(post) }}{% endcache %}
+
+The key is every value after the tag, so it has to cover whatever the
+body shows that can change, and any arguments that vary between calls.
+post_card_key() does that for post cards (templates/partials/post_card.html).
+Stale keys are never invalidated; they age out of the per-worker LRU
+(``FRAGMENT_CACHE_MAX_ENTRIES``, where 0 disables caching).
+
+Wrap the macro call rather than the macro body. On a hit the block then
+costs one dictionary lookup, where calling a Jinja macro costs more than
+rendering a small card.
+
+Compiled templates are also kept on disk in ``JINJA_BYTECODE_CACHE_DIR``,
+so a new gunicorn worker loads base.html and friends without compiling
+them again.
+"""
+
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from caching import LRUBackend
+
+
+def post_card_key(post):
+    """Cache key parts of everything a post card shows.
+
+    Besides updated_date this covers the category, and the read time and
+    image that `flask render-content` and `flask images-derive` rewrite
+    without touching updated_date.
+    """
+    variants = post.image_variants
+    return (post.id, post.updated_date, post.category.updated_date, post.read_time,
+            post.image_url, variants['key'] if variants else None)
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja ``{% cache name, key... %}...{% endcache %}`` tag."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [nodes.List(parts, lineno=lineno)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = tuple(parts)
+        try:
+            markup = cache.get(key)
+        except TypeError:  # Unhashable parts (dicts, lists).
+            key = repr(key)
+            markup = cache.get(key)
+        if markup is None:
+            markup = caller()
+            cache.set(key, markup)
+        return markup
+
+
+class FragmentCache:
+    """Flask extension wiring the fragment and bytecode caches into app.jinja_env."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        max_entries = app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 4096)
+        self.backend = LRUBackend(max_entries) if max_entries else None
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self.backend
+        app.add_template_global(post_card_key, 'post_card_key')
+
+        directory = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+        app.extensions['fragment_cache'] = self
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,18 @@
+"""
+Gunicorn settings picked up automatically from the working directory.
+
+Only lifecycle hooks live here; bind address and worker count stay on
+the command line (see README).
+"""
+
+import glob
+import os
+
+from config import Config
+
+
+def on_starting(server):
+    """Start every deploy with fresh counters (see metrics.py)."""
+    if Config.METRICS_ENABLED and Config.METRICS_DIR:
+        for path in glob.glob(os.path.join(Config.METRICS_DIR, 'metrics-*.json')):
+            os.remove(path)
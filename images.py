@@ -0,0 +1,409 @@
+"""
+Responsive post images.
+
+Each post's ``image_url`` (a /static path or a remote URL) is resized to
+``IMAGE_WIDTHS`` in each of ``IMAGE_FORMATS`` (AVIF, WebP and JPEG by
+default, minus any this Pillow build cannot write). Derivatives are named
+after the SHA-256 of the source bytes (``<key>-<width>w.<ext>``), written
+to ``static/derived`` and served with a one-year immutable Cache-Control.
+A post records what was made in ``Post.image_variants``:
+
+    {"source": image_url, "key": "3f9a...", "width": 1280, "height": 800,
+     "widths": [320, 640, 960, 1280], "formats": ["avif", "webp", "jpeg"]}
+
+Templates render post images with ``post_image(post, sizes)``, which
+emits a <picture> with AVIF/WebP sources, a JPEG <img> and the intrinsic
+width/height, or a plain <img> of ``image_url`` while no derivatives
+exist.
+
+Admin saves that change ``image_url`` queue the ``derive_post_image`` job
+(see jobs.py). ``flask images-derive`` backfills every post in a process
+pool. ``/images/<width>/<path>`` resizes /static images on demand into a
+size-bounded disk cache, in the best format the client accepts.
+
+Needs Pillow; without it nothing is derived and ``post_image`` keeps
+emitting plain <img> tags.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = ImageOps = None
+
+from flask import abort, current_app, redirect, request, send_file, url_for
+from markupsafe import Markup, escape
+from sqlalchemy import update
+from werkzeug.security import safe_join
+
+from caching import page_cache, post_cache_tags
+from jobs import jobs
+from models import db, Post
+from readmodel import read_model
+
+
+OUTPUT_DIR = 'derived'
+
+# Output formats, best first: (Pillow format, extension, MIME type, save options).
+FORMATS = {
+    'avif': ('AVIF', 'avif', 'image/avif', {'quality': 50, 'speed': 6}),
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 75, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+# Derivative names never change meaning, so clients may keep them for a year.
+IMMUTABLE_MAX_AGE = 31536000
+
+# On-demand resizes follow their source, which can be replaced in place.
+RESIZED_MAX_AGE = 86400
+
+# Vector images are served as they are.
+VECTOR_EXTENSIONS = ('.svg', '.svgz')
+
+# Sources larger than this are not downloaded or decoded.
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT = 15
+
+
+class ImageError(ValueError):
+    """Raised for a source image that can't be read or decoded."""
+
+
+def supported_formats(formats):
+    """The names in ``formats`` this Pillow build can write, in FORMATS order."""
+    if Image is None:
+        return []
+    Image.init()
+    return [name for name in FORMATS if name in formats and FORMATS[name][0] in Image.SAVE]
+
+
+def derivative_name(key, width, fmt):
+    return f'{key}-{width}w.{FORMATS[fmt][1]}'
+
+
+def read_source(image_url, static_folder):
+    """Bytes of a /static/ image or a remote http(s) image."""
+    if image_url.startswith('/static/'):
+        path = safe_join(static_folder, image_url[len('/static/'):].split('?')[0])
+        if path is None or not os.path.isfile(path):
+            raise ImageError(f'No such static image: {image_url}')
+        if os.path.getsize(path) > MAX_SOURCE_BYTES:
+            raise ImageError(f'Image is too large: {image_url}')
+        with open(path, 'rb') as f:
+            return f.read()
+    if image_url.startswith(('http://', 'https://')):
+        req = urllib.request.Request(image_url, headers={'User-Agent': 'travelcleanandlegal-images'})
+        try:
+            with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as response:
+                data = response.read(MAX_SOURCE_BYTES + 1)
+        except OSError as e:
+            raise ImageError(f'Could not fetch {image_url}: {e}') from e
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ImageError(f'Image is too large: {image_url}')
+        return data
+    raise ImageError(f'Unsupported image URL: {image_url!r}')
+
+
+def _open(data, largest=None):
+    """Decode ``data`` upright; JPEGs are decoded at a reduced scale when ``largest`` allows."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        if largest and image.format == 'JPEG':
+            image.draft('RGB', (largest, largest * image.height // max(1, image.width)))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ImageError(f'Could not decode image: {e}') from e
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+def _resize(image, width):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+
+def _encode(image, fmt):
+    pil_format, _, _, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    out = io.BytesIO()
+    image.save(out, pil_format, **options)
+    return out.getvalue()
+
+
+def _write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def derive(data, output_dir, widths, formats):
+    """Write the derivatives of the image ``data``; returns its variants dict.
+
+    Widths above the original are dropped (the original width is used
+    instead) and files that already exist are not written again.
+    """
+    key = hashlib.sha256(data).hexdigest()[:16]
+    image = _open(data, max(widths))
+    targets = sorted({min(width, image.width) for width in widths})
+    os.makedirs(output_dir, exist_ok=True)
+    # Largest first, so each smaller size is resampled from the one before.
+    resized = image
+    for width in reversed(targets):
+        resized = _resize(resized, width)
+        for fmt in formats:
+            path = os.path.join(output_dir, derivative_name(key, width, fmt))
+            if not os.path.exists(path):
+                _write(path, _encode(resized, fmt))
+    return {
+        'key': key,
+        'width': targets[-1],
+        'height': max(1, round(image.height * targets[-1] / image.width)),
+        'widths': targets,
+        'formats': list(formats),
+    }
+
+
+def _derive_job(job):
+    # Runs in a worker process of derive_all().
+    post_id, image_url, static_folder, output_dir, widths, formats = job
+    try:
+        variants = derive(read_source(image_url, static_folder), output_dir, widths, formats)
+    except ImageError as e:
+        return post_id, None, str(e)
+    variants['source'] = image_url
+    return post_id, variants, None
+
+
+class ResponsiveImages:
+    """Flask extension deriving, serving and linking responsive post images."""
+
+    # Writes to the on-demand cache between two size checks.
+    EVICT_EVERY = 64
+
+    def __init__(self, app=None):
+        self.widths = []
+        self.formats = []
+        self.output = None
+        self.cache_dir = None
+        self.cache_max_bytes = 0
+        self._writes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.widths = sorted(app.config.get('IMAGE_WIDTHS', [320, 640, 960, 1280]))
+        self.formats = supported_formats(app.config.get('IMAGE_FORMATS', list(FORMATS)))
+        self.output = os.path.join(app.static_folder, OUTPUT_DIR)
+        self.cache_dir = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'image_cache')
+        self.cache_max_bytes = app.config.get('IMAGE_CACHE_MAX_MB', 256) * 1024 * 1024
+
+        app.add_url_rule(f'{app.static_url_path}/{OUTPUT_DIR}/<path:filename>', 'derived_image', self.serve)
+        app.add_url_rule('/images/<int:width>/<path:filename>', 'resized_image', self.resized)
+        app.add_template_global(self.post_image, 'post_image')
+        app.extensions['images'] = self
+
+    # Derivation
+
+    def is_stale(self, image_url, variants):
+        """True when ``image_url`` has no derivatives, or ones made from another image or format list."""
+        if not image_url or not self.formats or image_url.split('?')[0].lower().endswith(VECTOR_EXTENSIONS):
+            return False
+        variants = variants or {}
+        return variants.get('source') != image_url or variants.get('formats') != self.formats
+
+    def derive_post(self, image_url):
+        """Variants dict for ``image_url``, deriving whatever is missing."""
+        data = read_source(image_url, current_app.static_folder)
+        variants = derive(data, self.output, self.widths, self.formats)
+        variants['source'] = image_url
+        return variants
+
+    def derive_all(self, derive_all=False, workers=None, batch_size=100, log=print):
+        """Derive images for every post that needs them, in a process pool.
+
+        Results are stored with primary-key UPDATEs that keep updated_date,
+        like Post.backfill_renders(). Returns ``(derived, failed)`` counts.
+        """
+        rows = db.session.query(Post.id, Post.image_url, Post.image_variants, Post.updated_date).all()
+        updated_dates = {}
+        pending = []
+        for post_id, image_url, variants, updated_date in rows:
+            if image_url and (derive_all or self.is_stale(image_url, variants)):
+                updated_dates[post_id] = updated_date
+                pending.append((post_id, image_url, current_app.static_folder, self.output, self.widths, self.formats))
+        if not pending:
+            return 0, 0
+
+        derived = failed = 0
+        batch = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for post_id, variants, error in pool.map(_derive_job, pending, chunksize=4):
+                if error:
+                    failed += 1
+                    log(f'  post {post_id}: {error}')
+                    continue
+                batch.append({'id': post_id, 'image_variants': variants, 'updated_date': updated_dates[post_id]})
+                if len(batch) >= batch_size:
+                    derived += self._store(batch)
+                    batch = []
+        derived += self._store(batch)
+        return derived, failed
+
+    @staticmethod
+    def _store(batch):
+        if batch:
+            db.session.execute(update(Post), batch)
+            db.session.commit()
+        return len(batch)
+
+    # Serving
+
+    def serve(self, filename):
+        """Send a derivative; its name is content-addressed, so it never changes."""
+        path = safe_join(self.output, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = send_file(path, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def _negotiate(self):
+        # Only formats the client names outright: browsers without AVIF
+        # support still send image/*.
+        accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+        for fmt in self.formats:
+            if fmt == 'jpeg' or FORMATS[fmt][2] in accepted:
+                return fmt
+        return self.formats[-1]
+
+    def resized(self, width, filename):
+        """``/static/<filename>`` at ``width`` pixels, in the best format the client accepts.
+
+        Only the configured widths are served, so the cache holds a bounded
+        number of files per source.
+        """
+        source = safe_join(current_app.static_folder, filename)
+        if width not in self.widths or source is None or filename.startswith(OUTPUT_DIR + '/') \
+                or not os.path.isfile(source):
+            abort(404)
+        if not self.formats:
+            return redirect(url_for('static', filename=filename))
+
+        fmt = self._negotiate()
+        stat = os.stat(source)
+        digest = hashlib.sha1(f'{filename}:{stat.st_mtime_ns}:{stat.st_size}'.encode('utf-8')).hexdigest()
+        name = f'{digest}-{width}w.{FORMATS[fmt][1]}'
+        path = os.path.join(self.cache_dir, name)
+        # Opened before sending: another worker's eviction may remove the file.
+        try:
+            body = open(path, 'rb')
+            os.utime(path)
+        except FileNotFoundError:
+            with open(source, 'rb') as f:
+                data = f.read(MAX_SOURCE_BYTES + 1)
+            if len(data) > MAX_SOURCE_BYTES:
+                abort(404)
+            try:
+                image = _open(data, width)
+            except ImageError:
+                abort(404)
+            data = _encode(_resize(image, width), fmt)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _write(path, data)
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+            body = io.BytesIO(data)
+
+        response = send_file(body, mimetype=FORMATS[fmt][2], max_age=RESIZED_MAX_AGE, etag=name)
+        response.cache_control.public = True
+        response.vary.add('Accept')
+        return response
+
+    def _evict(self):
+        """Drop the least recently used resizes until the cache fits its budget."""
+        files, total = [], 0
+        for entry in os.scandir(self.cache_dir):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    # Templates
+
+    def post_image(self, post, sizes='100vw', **attrs):
+        """<picture> of ``post``'s image derivatives, or a plain <img> without them.
+
+        Extra keyword arguments become attributes of the <img> (``class``,
+        ``loading``, ...).
+        """
+        variants = post.image_variants
+        alt = escape(post.title)
+        extra = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items() if value is not None)
+        if not variants or variants.get('source') != post.image_url:
+            return Markup(f'<img src="{escape(post.image_url)}" alt="{alt}"{extra}>')
+
+        def srcset(fmt):
+            return ', '.join(
+                f'{self._url(variants["key"], width, fmt)} {width}w' for width in variants['widths']
+            )
+
+        html = ['<picture>']
+        for fmt in variants['formats']:
+            if fmt != 'jpeg':
+                html.append(f'<source type="{FORMATS[fmt][2]}" srcset="{srcset(fmt)}" sizes="{escape(sizes)}">')
+        if 'jpeg' in variants['formats']:
+            src = self._url(variants['key'], variants['width'], 'jpeg')
+            img_srcset = f' srcset="{srcset("jpeg")}" sizes="{escape(sizes)}"'
+        else:
+            src, img_srcset = escape(post.image_url), ''
+        html.append(f'<img src="{src}"{img_srcset} width="{variants["width"]}" height="{variants["height"]}" '
+                    f'alt="{alt}"{extra}>')
+        html.append('</picture>')
+        return Markup(''.join(html))
+
+    def _url(self, key, width, fmt):
+        return f'{current_app.static_url_path}/{OUTPUT_DIR}/{derivative_name(key, width, fmt)}'
+
+
+@jobs.task('derive_post_image')
+def derive_post_image(post_id, attempt, final):
+    """Derive one post's image after an admin save; raising makes the queue retry it."""
+    post = db.session.get(Post, post_id)
+    if post is None or not images.is_stale(post.image_url, post.image_variants):
+        return
+    variants = images.derive_post(post.image_url)
+    db.session.execute(update(Post), [{'id': post.id, 'image_variants': variants, 'updated_date': post.updated_date}])
+    db.session.commit()
+    db.session.refresh(post)
+    page_cache.invalidate(*post_cache_tags(post))
+    read_model.invalidate()
+
+
+images = ResponsiveImages()
@@ -0,0 +1,248 @@
+"""
+Bulk import of posts from static HTML files.
+
+Files are hashed, parsed (with lxml when it is installed, otherwise
+BeautifulSoup's built-in parser) and run through the content pipeline in
+a process pool. Existing posts and
+categories are read once up front, and rows are written with executemany
+INSERTs and primary-key UPDATEs committed in batches. Each post records
+the SHA-256 of its source file, so re-running an import skips files that
+have not changed. A post with no recorded hash (created in the admin, or
+before hashes were stored) is not overwritten: its file's hash is
+recorded and the post left as it is, unless the import is forced.
+
+Bulk writes bypass the admin hooks, so the importer reindexes the
+changed posts for search, refreshes related posts (incrementally for a
+handful of changes, otherwise with a full rebuild) and clears the page
+cache itself.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from bs4 import BeautifulSoup
+from flask import current_app
+from sqlalchemy import insert, update
+
+from caching import page_cache
+from models import db, Category, Post
+from readmodel import read_model
+from search import search_index
+import related
+import rendering
+
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:  # pragma: no cover - optional dependency
+    PARSER = 'html.parser'
+
+
+DEFAULT_EXCERPT = 'Guide for Nigerians relocating abroad.'
+DEFAULT_CONTENT = '<p>Content coming soon.</p>'
+
+# Above this many changed posts a full related-posts rebuild is cheaper
+# than updating them one at a time.
+RELATED_INCREMENTAL_LIMIT = 20
+
+# Fields refreshed when a changed file is re-imported. Publishing state,
+# featuring and the publication date belong to the admin and are kept.
+IMPORTED_FIELDS = [
+    'title', 'excerpt', 'content', 'image_url', 'read_time',
+    'meta_description', 'meta_keywords', 'source_hash',
+    'rendered_content', 'toc', 'rendered_key',
+]
+
+
+def extract_post(markup, slug):
+    """Extract post fields from the markup of one exported article page."""
+    soup = BeautifulSoup(markup, PARSER)
+
+    # Extract title
+    title_tag = soup.find('h1', class_='article__title')
+    title = title_tag.get_text(strip=True) if title_tag else ''
+
+    # Extract meta description
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    excerpt = meta_desc.get('content', '') if meta_desc else ''
+
+    # Extract meta keywords
+    meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
+    keywords = meta_keywords.get('content', '') if meta_keywords else ''
+
+    # Extract featured image
+    featured_img = soup.find('img', class_='article__featured-image')
+    image_url = featured_img.get('src', '') if featured_img else ''
+
+    # Extract article content (inner HTML)
+    content_div = soup.find('div', class_='article__content')
+    content = ''.join(str(child) for child in content_div.children) if content_div else ''
+
+    return {
+        'title': title[:200],
+        'slug': slug,
+        'excerpt': excerpt[:500] or DEFAULT_EXCERPT,
+        'content': content or DEFAULT_CONTENT,
+        'image_url': image_url[:500],
+        'meta_description': excerpt[:300],
+        'meta_keywords': keywords[:300],
+    }
+
+
+def _slug_of(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _parse(job):
+    """Worker: ``(path, stored_hash, adopt)`` -> ``(path, digest, fields or None, error)``.
+
+    Returns None fields when the file's hash matches ``stored_hash``, or
+    when ``adopt`` is set and only the hash is to be recorded.
+    """
+    path, stored_hash, adopt = job
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if adopt or digest == stored_hash:
+            return path, digest, None, None
+        fields = extract_post(raw.decode('utf-8'), _slug_of(path))
+        # Bulk writes skip the ORM save hook, so render here, in the pool.
+        rendered = rendering.render_content(fields['content'])
+        fields.update(
+            source_hash=digest,
+            rendered_content=rendered.html,
+            toc=rendered.toc,
+            read_time=rendered.read_time,
+            rendered_key=rendering.content_key(fields['content']),
+        )
+        return path, digest, fields, None
+    except Exception as e:
+        return path, None, None, f'{type(e).__name__}: {e}'
+
+
+def _flush(inserts, updates, adopted):
+    """Write one batch in its own transaction; returns rows written."""
+    if inserts:
+        db.session.execute(insert(Post), inserts)
+    if updates:
+        db.session.execute(update(Post), updates)
+    if adopted:
+        db.session.execute(update(Post), adopted)
+    db.session.commit()
+    return len(inserts) + len(updates) + len(adopted)
+
+
+def import_posts(posts_dir, category_map, default_category, featured_categories=(),
+                 workers=None, batch_size=500, force=False, log=print):
+    """Import every ``*.html`` file in ``posts_dir``; returns a summary dict.
+
+    ``category_map`` maps post slugs to category slugs, falling back to
+    ``default_category``. New posts in ``featured_categories`` are featured
+    while fewer than six posts have been created, as the original seed did.
+    Existing posts without a recorded source hash only get the hash
+    recorded; ``force`` re-imports every file over its post instead.
+    """
+    started = time.perf_counter()
+    paths = sorted(
+        os.path.join(posts_dir, name) for name in os.listdir(posts_dir) if name.endswith('.html')
+    )
+
+    # Everything the import needs to know about the database, in two queries.
+    existing = {slug: (post_id, source_hash, updated_date) for post_id, slug, source_hash, updated_date in
+                db.session.query(Post.id, Post.slug, Post.source_hash, Post.updated_date)}
+    categories = dict(db.session.query(Category.slug, Category.id))
+    fallback_category_id = categories.get(default_category) or min(categories.values())
+
+    jobs = []
+    for path in paths:
+        post = existing.get(_slug_of(path))
+        if post is None or force:
+            jobs.append((path, None, False))
+        else:
+            jobs.append((path, post[1], post[1] is None))
+    now = datetime.now(timezone.utc)
+    inserts, updates, adopted, errors, changed_slugs = [], [], [], [], []
+    summary = {'files': len(paths), 'unchanged': 0, 'adopted': 0, 'created': 0, 'updated': 0, 'failed': 0}
+    rows_written = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, digest, fields, error in pool.map(_parse, jobs, chunksize=16):
+            if error:
+                errors.append(path)
+                log(f'  Error processing {os.path.basename(path)}: {error}')
+                continue
+            if fields is None:
+                post_id, stored_hash, updated_date = existing[_slug_of(path)]
+                if stored_hash is None:
+                    # Keeps updated_date, so pages and caches see no change.
+                    adopted.append({'id': post_id, 'source_hash': digest, 'updated_date': updated_date})
+                    summary['adopted'] += 1
+                else:
+                    summary['unchanged'] += 1
+                continue
+
+            changed_slugs.append(fields['slug'])
+            post_id = existing.get(fields['slug'], (None, None, None))[0]
+            if post_id is None:
+                category_slug = category_map.get(fields['slug'], default_category)
+                fields.update(
+                    category_id=categories.get(category_slug, fallback_category_id),
+                    is_featured=category_slug in featured_categories and summary['created'] < 6,
+                    is_published=True,
+                    published_date=now,
+                    updated_date=now,
+                )
+                inserts.append(fields)
+                summary['created'] += 1
+            else:
+                row = {field: fields[field] for field in IMPORTED_FIELDS}
+                row.update(id=post_id, updated_date=now)
+                updates.append(row)
+                summary['updated'] += 1
+
+            if len(inserts) + len(updates) >= batch_size:
+                rows_written += _flush(inserts, updates, adopted)
+                inserts, updates, adopted = [], [], []
+
+    rows_written += _flush(inserts, updates, adopted)
+
+    elapsed = time.perf_counter() - started
+    summary.update(failed=len(errors), rows=rows_written, seconds=elapsed)
+    log(
+        f'Imported {summary["files"]} files in {elapsed:.2f}s: {summary["created"]} created, '
+        f'{summary["updated"]} updated, {summary["unchanged"]} unchanged, {summary["adopted"]} hashes recorded, '
+        f'{summary["failed"]} failed '
+        f'({summary["files"] / elapsed:.0f} files/s, {rows_written / elapsed:.0f} rows/s, parser: {PARSER}).'
+    )
+
+    if changed_slugs:
+        _refresh_derived(changed_slugs, log)
+    return summary
+
+
+def _refresh_derived(slugs, log):
+    """Bring search, related posts and the page cache up to date with ``slugs``."""
+    post_ids = [
+        post_id for start in range(0, len(slugs), 500)
+        for (post_id,) in db.session.query(Post.id).filter(Post.slug.in_(slugs[start:start + 500]))
+    ]
+    search_index.index_posts(post_ids)
+    db.session.commit()
+    log(f'Reindexed {len(post_ids)} posts for search.')
+
+    k = current_app.config['RELATED_POSTS_K']
+    if len(post_ids) > RELATED_INCREMENTAL_LIMIT:
+        count, seconds = related.rebuild(k)
+        log(f'Computed related posts for {count} posts in {seconds:.1f}s.')
+    else:
+        for post_id in post_ids:
+            related.update_post(post_id, k)
+        db.session.commit()
+        log(f'Updated related posts around {len(post_ids)} posts.')
+
+    page_cache.clear()
+    read_model.invalidate()
@@ -0,0 +1,232 @@
+"""
+Background jobs.
+
+Work that would otherwise block a gunicorn worker (sending email) is
+registered as a task and enqueued by name with JSON-serialisable keyword
+arguments:
+
+    @jobs.task('send_contact_message')
+    def send_contact_message(message_id, attempt, final): ...
+
+    jobs.enqueue('send_contact_message', message_id=42)
+
+Tasks run inside an app context and are retried with exponential backoff
+(``JOBS_BACKOFF_SECONDS`` doubling per attempt) up to
+``JOBS_MAX_ATTEMPTS`` times. ``JOBS_BACKEND`` picks where they run:
+
+- ``thread`` (default): a small thread pool inside each web worker. No
+  extra process to run, but jobs in flight (or waiting for a retry) are
+  lost if the worker dies. A retry waits on a timer, not in the pool;
+- ``sqlite``: jobs are written to a SQLite queue (``JOBS_DB_PATH``) and
+  run by ``flask jobs-worker``, a separate process. Queued jobs survive
+  restarts, and a job whose worker died is picked up again once its
+  lease (``JOBS_LEASE_SECONDS``) expires.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from flask import current_app
+
+
+# Longest wait between two attempts, however many have failed.
+MAX_BACKOFF = 3600
+
+
+def backoff(attempts, base):
+    """Seconds to wait after the ``attempts``-th failed attempt."""
+    return min(MAX_BACKOFF, base * 2 ** (attempts - 1))
+
+
+class ThreadBackend:
+    """Runs jobs on a thread pool in the web worker itself."""
+
+    def __init__(self, queue, threads):
+        self.queue = queue
+        self.threads = threads
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # Created lazily, and again after a fork: threads don't survive one.
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='jobs')
+                self._pid = os.getpid()
+            return self._pool
+
+    def enqueue(self, name, kwargs):
+        self._submit(current_app._get_current_object(), name, kwargs, 1)
+
+    def _submit(self, app, name, kwargs, attempt):
+        self._executor().submit(self._run, app, name, kwargs, attempt)
+
+    def _run(self, app, name, kwargs, attempt):
+        error = self.queue.run(app, name, kwargs, attempt)
+        if error is not None and attempt < self.queue.max_attempts:
+            # Resubmitted when the backoff is over, so a failing job doesn't
+            # hold one of the pool's few threads while it waits.
+            timer = threading.Timer(
+                backoff(attempt, self.queue.backoff_base), self._submit, (app, name, kwargs, attempt + 1)
+            )
+            timer.daemon = True
+            timer.start()
+
+
+class SQLiteBackend:
+    """Durable queue in a SQLite file, drained by ``flask jobs-worker``."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS job (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            kwargs TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_at REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_job_ready ON job (status, run_at);
+    """
+
+    def __init__(self, queue, path, lease):
+        self.queue = queue
+        self.path = path
+        self.lease = lease
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return closing(conn)
+
+    def enqueue(self, name, kwargs):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO job (name, kwargs, run_at, created_at) VALUES (?, ?, ?, ?)',
+                (name, json.dumps(kwargs), now, now),
+            )
+
+    def claim(self, worker_id):
+        """Lease the next due job: ``(id, name, kwargs, attempts)`` or None."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT id, name, kwargs, attempts FROM job "
+                "WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until < ?) "
+                "ORDER BY run_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE job SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ? "
+                "WHERE id = ?",
+                (worker_id, now + self.lease, row[0]),
+            )
+            conn.execute('COMMIT')
+        job_id, name, kwargs, attempts = row
+        return job_id, name, json.loads(kwargs), attempts + 1
+
+    def finish(self, job_id, attempts, error):
+        with self._connect() as conn:
+            if error is None:
+                conn.execute('DELETE FROM job WHERE id = ?', (job_id,))
+            elif attempts >= self.queue.max_attempts:
+                conn.execute(
+                    "UPDATE job SET status = 'dead', locked_by = NULL, last_error = ? WHERE id = ?",
+                    (error, job_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE job SET status = 'queued', locked_by = NULL, run_at = ?, last_error = ? WHERE id = ?",
+                    (time.time() + backoff(attempts, self.queue.backoff_base), error, job_id),
+                )
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM job GROUP BY status').fetchall())
+
+    def work(self, app, once=False, poll_interval=1.0, log=print):
+        """Run due jobs until interrupted (or until the queue is empty with ``once``)."""
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        while True:
+            job = self.claim(worker_id)
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            job_id, name, kwargs, attempts = job
+            error = self.queue.run(app, name, kwargs, attempts)
+            self.finish(job_id, attempts, error)
+            log(f'{name} #{job_id} attempt {attempts}: {"ok" if error is None else error}')
+
+
+class JobQueue:
+    """Flask extension holding the task registry and the configured backend."""
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self.backend = None
+        self.max_attempts = 5
+        self.backoff_base = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_attempts = app.config.get('JOBS_MAX_ATTEMPTS', 5)
+        self.backoff_base = app.config.get('JOBS_BACKOFF_SECONDS', 30)
+        backend = app.config.get('JOBS_BACKEND', 'thread')
+        if backend == 'thread':
+            self.backend = ThreadBackend(self, app.config.get('JOBS_THREADS', 2))
+        elif backend == 'sqlite':
+            self.backend = SQLiteBackend(self, app.config['JOBS_DB_PATH'], app.config.get('JOBS_LEASE_SECONDS', 300))
+        else:
+            raise ValueError(f'Unknown JOBS_BACKEND: {backend!r}')
+        app.extensions['jobs'] = self
+
+    def task(self, name):
+        """Register the decorated function as task ``name``."""
+        def decorator(func):
+            self.tasks[name] = func
+            return func
+        return decorator
+
+    def enqueue(self, name, **kwargs):
+        if name not in self.tasks:
+            raise KeyError(f'Unknown task: {name!r}')
+        self.backend.enqueue(name, kwargs)
+
+    def run(self, app, name, kwargs, attempt):
+        """Run one attempt of a task; returns None on success or the error text.
+
+        Tasks also receive ``attempt`` (1-based) and ``final`` (no retry
+        follows), so they can record a permanent failure.
+        """
+        with app.app_context():
+            try:
+                self.tasks[name](**kwargs, attempt=attempt, final=attempt >= self.max_attempts)
+            except Exception as exc:
+                app.logger.warning('Job %s attempt %d failed: %s', name, attempt, exc)
+                return f'{type(exc).__name__}: {exc}'
+        return None
+
+
+jobs = JobQueue()
@@ -0,0 +1,318 @@
+"""
+Request instrumentation and the Prometheus ``/metrics`` endpoint.
+
+Per request this records latency (as a histogram per endpoint), the
+number and total time of SQL queries, and template render time, and
+sends them back in a ``Server-Timing`` header. Queries slower than
+``SLOW_QUERY_MS`` are logged with their SQL.
+
+Each process keeps its own counters. Server processes (wsgi.py and
+asgi.py call Metrics.share()) also write them to one JSON file per worker
+lifetime in ``METRICS_DIR``, at most once per FLUSH_INTERVAL, and
+``/metrics`` sums every file, so the totals cover all workers no matter
+which one answers the scrape. CLI commands, their worker pools and
+benchmarks build the app without share() and keep their counters in
+memory. When a server process starts, share() drops the files of
+processes no longer running (an earlier run, or workers that were
+replaced), which Prometheus reads as a counter reset; gunicorn.conf.py
+also empties the directory when the master starts.
+
+``/metrics`` answers clients in ``METRICS_ALLOWED_IPS`` and requests
+carrying ``Authorization: Bearer <METRICS_TOKEN>``; anyone else gets a 404.
+"""
+
+import atexit
+import glob
+import hmac
+import ipaddress
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_app_context, has_request_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Time to produce a response, by endpoint.', LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', 'SQL queries issued per request, by endpoint.', QUERY_COUNT_BUCKETS),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in SQL queries, by endpoint.', None),
+    'template_render_duration_seconds_total': ('counter', 'Time spent rendering templates, by endpoint.', None),
+    'db_slow_queries_total': ('counter', 'Queries slower than SLOW_QUERY_MS, by endpoint.', None),
+}
+
+# Seconds between writes of this process's counters to METRICS_DIR.
+FLUSH_INTERVAL = 1.0
+
+FILE_RE = re.compile(r'metrics-(\d+)-\d+\.json$')
+
+
+class Registry:
+    """Counters and histograms of one process, keyed by ``(name, labels)``."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.values = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def inc(self, name, labels, amount=1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self.lock:
+            # Per-bucket counts plus sum and count, like a Prometheus histogram.
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, [list(pair) for pair in labels], value if isinstance(value, float) else list(value)]
+                    for (name, labels), value in self.values.items()]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """This process's registry; a forked worker starts from empty counters."""
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.pid != os.getpid():
+            _registry = Registry()
+        return _registry
+
+
+def _merge(entries, totals):
+    for name, labels, value in entries:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if isinstance(value, list):
+            current = totals.get(key)
+            totals[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = totals.get(key, 0.0) + value
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus(totals):
+    """Prometheus text exposition format (0.0.4) of merged totals."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in totals.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'histogram':
+                for bound, count in zip(buckets, value):
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {count}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Flask extension wiring the request, SQL and template hooks."""
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.allowed_networks = []
+        self.token = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.allowed_networks = [
+            ipaddress.ip_network(address.strip(), strict=False)
+            for address in app.config.get('METRICS_ALLOWED_IPS', ()) if address.strip()
+        ]
+        self.token = app.config.get('METRICS_TOKEN') or None
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._start_render, app, weak=False)
+        template_rendered.connect(self._finish_render, app, weak=False)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['metrics'] = self
+
+    # Hooks
+
+    def _start_request(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'db': 0.0, 'render': 0.0, 'slow': 0}
+
+    def _start_render(self, sender, template, context, **extra):
+        if 'metrics' in g:
+            g.metrics['render_start'] = time.perf_counter()
+
+    def _finish_render(self, sender, template, context, **extra):
+        stats = g.get('metrics')
+        if stats and 'render_start' in stats:
+            stats['render'] += time.perf_counter() - stats.pop('render_start')
+
+    def _finish_request(self, response):
+        stats = g.pop('metrics', None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        total = time.perf_counter() - stats['start']
+        endpoint = request.endpoint or 'unmatched'
+
+        reg = registry()
+        reg.inc('http_requests_total', {
+            'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code),
+        })
+        labels = {'endpoint': endpoint}
+        reg.observe('http_request_duration_seconds', labels, total)
+        reg.observe('db_queries_per_request', labels, stats['queries'])
+        reg.inc('db_query_duration_seconds_total', labels, stats['db'])
+        reg.inc('template_render_duration_seconds_total', labels, stats['render'])
+        if stats['slow']:
+            reg.inc('db_slow_queries_total', labels, stats['slow'])
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats["db"] * 1000:.1f};desc="{stats["queries"]} queries", '
+            f'tpl;dur={stats["render"] * 1000:.1f}, total;dur={total * 1000:.1f}'
+        )
+        if self.directory and time.time() - reg.flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+        return response
+
+    # Cross-process aggregation
+
+    def share(self, app):
+        """Write this server's counters to METRICS_DIR so ``/metrics`` covers every worker.
+
+        Called by the server entry points only. Files left by processes
+        that are no longer running (an earlier run, or workers that were
+        replaced) are removed first.
+        """
+        directory = app.config.get('METRICS_DIR')
+        if 'metrics' not in app.extensions or not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            match = FILE_RE.search(path)
+            if match and not _running(int(match.group(1))):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        if self.directory is None:
+            atexit.register(self.flush)
+        self.directory = directory
+
+    def _path(self, reg):
+        return os.path.join(self.directory, f'metrics-{reg.pid}-{int(reg.started * 1000)}.json')
+
+    def flush(self):
+        """Write this process's counters to METRICS_DIR."""
+        reg = registry()
+        if not self.directory or not reg.values:
+            return
+        reg.flushed_at = time.time()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(reg.snapshot(), f)
+        os.replace(tmp_path, self._path(reg))
+
+    def collect(self):
+        """Totals across every worker (or just this process without METRICS_DIR)."""
+        totals = {}
+        if not self.directory:
+            _merge(registry().snapshot(), totals)
+            return totals
+        self.flush()
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    _merge(json.load(f), totals)
+            except (OSError, ValueError):
+                continue
+        return totals
+
+    def allowed(self):
+        """Whether the current request may read ``/metrics``."""
+        if self.token:
+            scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), self.token.encode()):
+                return True
+        try:
+            address = ipaddress.ip_address(request.remote_addr or '')
+        except ValueError:
+            return False
+        return any(address in network for network in self.allowed_networks)
+
+    def metrics_view(self):
+        """Prometheus scrape endpoint."""
+        if not self.allowed():
+            abort(404)
+        return Response(render_prometheus(self.collect()), mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    elapsed = time.perf_counter() - started
+    if not has_app_context() or 'metrics' not in current_app.extensions:
+        return
+
+    slow = elapsed * 1000 >= current_app.config.get('SLOW_QUERY_MS', 100)
+    if slow:
+        where = request.path if has_request_context() else 'outside a request'
+        current_app.logger.warning('Slow query (%.1f ms, %s): %s', elapsed * 1000, where, statement)
+    stats = g.get('metrics') if has_request_context() else None
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db'] += elapsed
+        stats['slow'] += slow
@@ -0,0 +1,62 @@
+"""initial schema
+
+Revision ID: 3f1c2a9d8b10
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created before migrations existed (via db.create_all())
+    # already have these tables, so only create what is missing.
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'category' not in existing:
+        op.create_table(
+            'category',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('slug', sa.String(length=100), nullable=False),
+            sa.Column('emoji', sa.String(length=10), nullable=True),
+            sa.Column('display_order', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name'),
+            sa.UniqueConstraint('slug')
+        )
+
+    if 'post' not in existing:
+        op.create_table(
+            'post',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('slug', sa.String(length=200), nullable=False),
+            sa.Column('excerpt', sa.Text(), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('image_url', sa.String(length=500), nullable=True),
+            sa.Column('read_time', sa.String(length=20), nullable=True),
+            sa.Column('published_date', sa.DateTime(), nullable=True),
+            sa.Column('updated_date', sa.DateTime(), nullable=True),
+            sa.Column('is_featured', sa.Boolean(), nullable=True),
+            sa.Column('is_published', sa.Boolean(), nullable=True),
+            sa.Column('category_id', sa.Integer(), nullable=False),
+            sa.Column('meta_description', sa.String(length=300), nullable=True),
+            sa.Column('meta_keywords', sa.String(length=300), nullable=True),
+            sa.ForeignKeyConstraint(['category_id'], ['category.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('slug')
+        )
+
+
+def downgrade():
+    op.drop_table('post')
+    op.drop_table('category')
@@ -0,0 +1,40 @@
+"""precomputed related posts
+
+Revision ID: 5d7a0c3e9f12
+Revises: e91a3b6c2d47
+Create Date: 2026-10-17 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7a0c3e9f12'
+down_revision = 'e91a3b6c2d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The table is filled by `flask related-rebuild`; only the schema lives here.
+    inspector = sa.inspect(op.get_bind())
+    if 'related_post' in inspector.get_table_names():
+        return
+
+    op.create_table(
+        'related_post',
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('related_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['related_id'], ['post.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('post_id', 'rank'),
+    )
+    op.create_index('ix_related_post_related_id', 'related_post', ['related_id'])
+
+
+def downgrade():
+    op.drop_index('ix_related_post_related_id', table_name='related_post')
+    op.drop_table('related_post')
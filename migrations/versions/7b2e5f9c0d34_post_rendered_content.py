@@ -0,0 +1,36 @@
+"""stored output of the post content pipeline
+
+Revision ID: 7b2e5f9c0d34
+Revises: a3f6d18e4b57
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e5f9c0d34'
+down_revision = 'a3f6d18e4b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing posts are rendered by `flask render-content`; until then
+    # post() renders them on the fly.
+    existing = {col['name'] for col in sa.inspect(op.get_bind()).get_columns('post')}
+    with op.batch_alter_table('post') as batch_op:
+        if 'rendered_content' not in existing:
+            batch_op.add_column(sa.Column('rendered_content', sa.Text(), nullable=True))
+        if 'toc' not in existing:
+            batch_op.add_column(sa.Column('toc', sa.JSON(), nullable=True))
+        if 'rendered_key' not in existing:
+            batch_op.add_column(sa.Column('rendered_key', sa.String(length=40), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('rendered_key')
+        batch_op.drop_column('toc')
+        batch_op.drop_column('rendered_content')
@@ -0,0 +1,35 @@
+"""composite indexes for published post listings
+
+Revision ID: 8c4e7b21d5a3
+Revises: 3f1c2a9d8b10
+Create Date: 2026-10-17 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e7b21d5a3'
+down_revision = '3f1c2a9d8b10'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = {
+    'ix_post_published_date': ['is_published', 'published_date'],
+    'ix_post_featured_date': ['is_published', 'is_featured', 'published_date'],
+    'ix_post_category_date': ['category_id', 'is_published', 'published_date'],
+}
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('post')}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'post', columns)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name='post')
@@ -0,0 +1,28 @@
+"""post source_hash for idempotent imports
+
+Revision ID: a3f6d18e4b57
+Revises: 5d7a0c3e9f12
+Create Date: 2026-10-17 09:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f6d18e4b57'
+down_revision = '5d7a0c3e9f12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'source_hash' not in {col['name'] for col in inspector.get_columns('post')}:
+        with op.batch_alter_table('post') as batch_op:
+            batch_op.add_column(sa.Column('source_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('source_hash')
@@ -0,0 +1,46 @@
+"""contact form submissions
+
+Revision ID: c4d8e1f7a935
+Revises: 7b2e5f9c0d34
+Create Date: 2026-10-17 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e1f7a935'
+down_revision = '7b2e5f9c0d34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'contact_message' in inspector.get_table_names():
+        return
+
+    op.create_table(
+        'contact_message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=254), nullable=False),
+        sa.Column('subject', sa.String(length=50), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('created_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('sent_date', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_contact_message_created_date', 'contact_message', ['created_date'])
+    op.create_index('ix_contact_message_status', 'contact_message', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_contact_message_status', table_name='contact_message')
+    op.drop_index('ix_contact_message_created_date', table_name='contact_message')
+    op.drop_table('contact_message')
@@ -0,0 +1,34 @@
+"""category updated_date and content version index
+
+Revision ID: c52d9e4a7f06
+Revises: 8c4e7b21d5a3
+Create Date: 2026-10-17 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d9e4a7f06'
+down_revision = '8c4e7b21d5a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'updated_date' not in {col['name'] for col in inspector.get_columns('category')}:
+        with op.batch_alter_table('category') as batch_op:
+            batch_op.add_column(sa.Column('updated_date', sa.DateTime(), nullable=True))
+        op.execute(sa.text('UPDATE category SET updated_date = CURRENT_TIMESTAMP'))
+
+    if 'ix_post_published_updated' not in {ix['name'] for ix in inspector.get_indexes('post')}:
+        op.create_index('ix_post_published_updated', 'post', ['is_published', 'updated_date'])
+
+
+def downgrade():
+    op.drop_index('ix_post_published_updated', table_name='post')
+    with op.batch_alter_table('category') as batch_op:
+        batch_op.drop_column('updated_date')
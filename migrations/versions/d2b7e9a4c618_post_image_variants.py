@@ -0,0 +1,28 @@
+"""post image_variants for responsive images
+
+Revision ID: d2b7e9a4c618
+Revises: c4d8e1f7a935
+Create Date: 2026-10-17 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b7e9a4c618'
+down_revision = 'c4d8e1f7a935'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'image_variants' not in {col['name'] for col in inspector.get_columns('post')}:
+        with op.batch_alter_table('post') as batch_op:
+            batch_op.add_column(sa.Column('image_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('image_variants')
@@ -0,0 +1,39 @@
+"""full-text search index for posts
+
+Revision ID: e91a3b6c2d47
+Revises: c52d9e4a7f06
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91a3b6c2d47'
+down_revision = 'c52d9e4a7f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The table is filled by `flask search-reindex`; only the schema lives here.
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5('
+            'title, excerpt, content, keywords, category, is_published UNINDEXED, '
+            "tokenize='porter unicode61')"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            'CREATE TABLE IF NOT EXISTS post_search ('
+            'post_id INTEGER PRIMARY KEY REFERENCES post (id) ON DELETE CASCADE, '
+            'is_published BOOLEAN NOT NULL, '
+            'document TSVECTOR NOT NULL)'
+        )
+        op.execute('CREATE INDEX IF NOT EXISTS ix_post_search_document ON post_search USING GIN (document)')
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS post_search')
@@ -0,0 +1,26 @@
+"""category index matching the blog listing order
+
+Revision ID: f3a8c5d1e270
+Revises: d2b7e9a4c618
+Create Date: 2026-10-17 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c5d1e270'
+down_revision = 'd2b7e9a4c618'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('category')}
+    if 'ix_category_listing_order' not in existing:
+        op.create_index('ix_category_listing_order', 'category', [sa.text('coalesce(display_order, 0)'), 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_category_listing_order', table_name='category')
@@ -1,7 +1,14 @@
 from datetime import datetime, timezone
+from flask import before_render_template, current_app, g, has_app_context, template_rendered
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, literal_column, select, update
+from sqlalchemy.orm import Session, aliased, contains_eager, joinedload, load_only
 
-db = SQLAlchemy()
+from database import DrivingJoin, RoutingSession
+from pagination import paginate
+import rendering
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 def utc_now():
@@ -17,12 +24,25 @@ class Category(db.Model):
     slug = db.Column(db.String(100), nullable=False, unique=True)
     emoji = db.Column(db.String(10), default='')
     display_order = db.Column(db.Integer, default=0)
+    updated_date = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
     
     # Relationship
-    posts = db.relationship('Post', backref='category', lazy='dynamic')
+    posts = db.relationship('Post', back_populates='category', lazy='dynamic')
     
     def __repr__(self):
         return f'<Category {self.name}>'
+    
+    @classmethod
+    def listing_order(cls):
+        """Sort expression of categories on the blog listing.
+        
+        The literal 0 (rather than a bound parameter) lets SQLite match it
+        to ix_category_listing_order.
+        """
+        return func.coalesce(cls.display_order, literal_column('0'))
+
+
+db.Index('ix_category_listing_order', Category.listing_order(), Category.id)
 
 
 class Post(db.Model):
@@ -34,6 +54,8 @@ class Post(db.Model):
     excerpt = db.Column(db.Text, nullable=False)
     content = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(500), default='')
+    # Responsive derivatives of image_url (see images.py); NULL until made.
+    image_variants = db.Column(db.JSON)
     read_time = db.Column(db.String(20), default='5 min read')
     published_date = db.Column(db.DateTime, default=utc_now)
     updated_date = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
@@ -42,11 +64,32 @@ class Post(db.Model):
     
     # Foreign Key
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    category = db.relationship('Category', back_populates='posts')
     
     # Meta fields for SEO
     meta_description = db.Column(db.String(300), default='')
     meta_keywords = db.Column(db.String(300), default='')
     
+    # SHA-256 of the HTML file a post was imported from (see importer.py);
+    # NULL for posts written in the admin.
+    source_hash = db.Column(db.String(64))
+    
+    # Output of the content pipeline (rendering.py), redone on save when
+    # rendered_key no longer matches the content and pipeline version.
+    rendered_content = db.Column(db.Text)
+    toc = db.Column(db.JSON)
+    rendered_key = db.Column(db.String(40))
+    
+    # Composite indexes matching the public listing queries: every one
+    # filters on is_published and orders by published_date DESC.
+    __table_args__ = (
+        db.Index('ix_post_published_date', 'is_published', 'published_date'),
+        db.Index('ix_post_featured_date', 'is_published', 'is_featured', 'published_date'),
+        db.Index('ix_post_category_date', 'category_id', 'is_published', 'published_date'),
+        # Covers the content_version() aggregates used for conditional GETs.
+        db.Index('ix_post_published_updated', 'is_published', 'updated_date'),
+    )
+    
     def __repr__(self):
         return f'<Post {self.title}>'
     
@@ -54,3 +97,310 @@ class Post(db.Model):
     def formatted_date(self):
         """Return formatted publication date."""
         return self.published_date.strftime('%B %d, %Y')
+    
+    def refresh_rendered(self):
+        """Run the content pipeline if the content changed since the last run."""
+        key = rendering.content_key(self.content)
+        if self.rendered_key != key:
+            result = rendering.render_content(self.content)
+            self.rendered_content, self.toc, self.read_time = result
+            self.rendered_key = key
+    
+    @classmethod
+    def backfill_renders(cls, render_all=False, batch_size=200):
+        """Store fresh renders for posts saved before the current pipeline.
+        
+        Written with primary-key UPDATEs that keep updated_date, so a
+        pipeline change does not look like a content edit to sitemaps and
+        validators. Returns the number of posts rendered.
+        """
+        rows = db.session.query(cls.id, cls.content, cls.rendered_key, cls.updated_date).all()
+        batch, count = [], 0
+        for i, (post_id, content, rendered_key, updated_date) in enumerate(rows, 1):
+            key = rendering.content_key(content)
+            if rendered_key != key or render_all:
+                html, toc, read_time = rendering.render_content(content)
+                batch.append({
+                    'id': post_id, 'rendered_content': html, 'toc': toc, 'read_time': read_time,
+                    'rendered_key': key, 'updated_date': updated_date,
+                })
+            if batch and (len(batch) >= batch_size or i == len(rows)):
+                db.session.execute(update(cls), batch)
+                db.session.commit()
+                count += len(batch)
+                batch = []
+        return count
+    
+    def rendered(self):
+        """RenderedContent to serve: the stored render, or a fresh one if it is stale.
+        
+        Stale renders (posts saved before a pipeline change and not yet
+        backfilled by ``flask render-content``) are rendered in memory
+        without writing to the database from a GET.
+        """
+        if self.rendered_key == rendering.content_key(self.content):
+            return rendering.RenderedContent(self.rendered_content, self.toc or [], self.read_time)
+        return rendering.render_content(self.content)
+    
+    # Published-post listings. Every page that renders post cards reads
+    # post.category, so these always load the category in the same query.
+    # Listings load only the columns a card shows: content and its render
+    # run to tens of KB per guide and are read by the post page alone.
+    
+    @classmethod
+    def card_columns(cls):
+        """Loader option restricting a query to the columns post cards use."""
+        return load_only(
+            cls.id, cls.title, cls.slug, cls.excerpt, cls.image_url, cls.image_variants, cls.read_time,
+            cls.published_date, cls.updated_date, cls.is_featured, cls.category_id,
+        )
+    
+    @classmethod
+    def published(cls):
+        """Query for published posts with their category eager-loaded."""
+        return cls.query.options(joinedload(cls.category)).filter(cls.is_published == True)
+    
+    @classmethod
+    def listed(cls):
+        """published(), loading only the card columns."""
+        return cls.published().options(cls.card_columns())
+    
+    @classmethod
+    def featured(cls, limit):
+        """Newest published featured posts."""
+        return cls.listed().filter(cls.is_featured == True).order_by(
+            cls.published_date.desc()
+        ).limit(limit).all()
+    
+    @classmethod
+    def recent(cls, limit):
+        """Newest published posts."""
+        return cls.listed().order_by(cls.published_date.desc()).limit(limit).all()
+    
+    @classmethod
+    def related_to(cls, post, limit):
+        """Published posts most similar to ``post``.
+        
+        Reads the neighbours precomputed by related.py with one indexed
+        lookup; falls back to the newest posts from the same category when
+        none have been computed yet.
+        """
+        related = cls.listed().join(RelatedPost, RelatedPost.related_id == cls.id).filter(
+            RelatedPost.post_id == post.id
+        ).order_by(RelatedPost.rank).limit(limit).all()
+        if related:
+            return related
+        return cls.listed().filter(
+            cls.category_id == post.category_id,
+            cls.id != post.id
+        ).order_by(cls.published_date.desc()).limit(limit).all()
+    
+    @classmethod
+    def by_slug(cls, slug):
+        """Published post by slug, or 404."""
+        return cls.published().filter(cls.slug == slug).first_or_404()
+    
+    @classmethod
+    def blog_page(cls, category_slug=None, cursor=None, per_page=24):
+        """One keyset page of the blog listing, grouped by category.
+        
+        Without a category filter posts are ordered by category display
+        order, then newest first; with one, simply newest first. Returns
+        ``(posts_by_category, next_cursor, prev_cursor)`` where the mapping
+        is an ordered ``{Category: [Post, ...]}`` dict. Raises
+        pagination.InvalidCursor for a bad cursor.
+        """
+        if category_slug:
+            query = cls.query.join(cls.category).filter(Category.slug == category_slug)
+            sort_key = [(cls.published_date, True), (cls.id, True)]
+            key_of = lambda post: [post.published_date, post.id]
+            scope = f'blog:{category_slug}'
+        else:
+            # Categories drive the join, in ix_category_listing_order
+            # order, so each one's posts come newest first from
+            # ix_post_category_date and nothing is sorted.
+            query = cls.query.select_from(
+                DrivingJoin(Category.__table__, cls.__table__, Category.id == cls.category_id)
+            )
+            sort_key = [
+                (Category.listing_order(), False),
+                (Category.id, False),
+                (cls.published_date, True),
+                (cls.id, True),
+            ]
+            key_of = lambda post: [post.category.display_order or 0, post.category_id, post.published_date, post.id]
+            scope = 'blog'
+        query = query.options(contains_eager(cls.category), cls.card_columns()).filter(cls.is_published == True)
+        
+        page = paginate(query, sort_key, key_of, per_page, scope, cursor)
+        
+        posts_by_category = {}
+        for post in page.items:
+            posts_by_category.setdefault(post.category, []).append(post)
+        return posts_by_category, page.next_cursor, page.prev_cursor
+    
+    @classmethod
+    def published_count(cls):
+        """Number of published posts."""
+        return db.session.query(func.count(cls.id)).filter(cls.is_published == True).scalar()
+    
+    @classmethod
+    def sitemap_rows(cls, offset=0, limit=None, batch_size=1000):
+        """Stream ``(slug, published_date, updated_date)`` of published posts.
+        
+        Only the three columns are selected and rows are fetched in batches,
+        so no Post objects are built. Ordered by id for stable sitemap shards.
+        """
+        query = db.session.query(cls.slug, cls.published_date, cls.updated_date).filter(
+            cls.is_published == True
+        ).order_by(cls.id).offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.yield_per(batch_size)
+    
+    # Content versions for HTTP validators. These only read timestamps and
+    # counts so a conditional GET can be answered without loading posts.
+    
+    @classmethod
+    def content_version(cls, include_categories=True):
+        """``(last_modified, version)`` of everything the listing pages show.
+        
+        The version changes when any published post is edited, published,
+        unpublished or deleted, and (optionally) when a category changes.
+        """
+        last_post, post_count = db.session.query(
+            func.max(cls.updated_date), func.count(cls.id)
+        ).filter(cls.is_published == True).one()
+        parts = [last_post, post_count]
+        if include_categories:
+            last_category, category_count = db.session.query(
+                func.max(Category.updated_date), func.count(Category.id)
+            ).one()
+            parts += [last_category, category_count]
+        
+        timestamps = [part for part in parts if isinstance(part, datetime)]
+        last_modified = max(timestamps, key=_as_utc) if timestamps else None
+        return last_modified, ':'.join(str(part) for part in parts)
+    
+    @classmethod
+    def slug_version(cls, slug):
+        """``(last_modified, version)`` of a published post page, or None.
+        
+        Covers the post, its category and the posts in its related block.
+        """
+        neighbour = aliased(cls)
+        
+        def related(column):
+            return select(column).select_from(RelatedPost).join(
+                neighbour, RelatedPost.related_id == neighbour.id
+            ).where(RelatedPost.post_id == cls.id).correlate(cls).scalar_subquery()
+        
+        # The checksum changes when the related list is recomputed with
+        # different posts or in a different order.
+        row = db.session.query(
+            cls.id, cls.updated_date, Category.updated_date,
+            related(func.max(neighbour.updated_date)),
+            related(func.sum(RelatedPost.related_id * (RelatedPost.rank + 1)))
+        ).join(cls.category).filter(cls.slug == slug, cls.is_published == True).first()
+        if row is None:
+            return None
+        post_id, post_updated, category_updated, related_updated, related_checksum = row
+        timestamps = [ts for ts in (post_updated, category_updated, related_updated) if ts is not None]
+        last_modified = max(timestamps, key=_as_utc) if timestamps else None
+        return last_modified, f'{post_id}:{post_updated}:{category_updated}:{related_updated}:{related_checksum}'
+
+
+class RelatedPost(db.Model):
+    """Precomputed content-similarity neighbours of a post (see related.py)."""
+    
+    __tablename__ = 'related_post'
+    
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    
+    def __repr__(self):
+        return f'<RelatedPost {self.post_id} #{self.rank} -> {self.related_id}>'
+
+
+class ContactMessage(db.Model):
+    """A contact form submission, kept whether or not email delivery succeeds."""
+    
+    __tablename__ = 'contact_message'
+    
+    # pending: waiting for delivery; sent: emailed; failed: retries exhausted;
+    # stored: no mail server configured, read it in the admin panel.
+    STATUSES = ('pending', 'sent', 'failed', 'stored')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(254), nullable=False)
+    subject = db.Column(db.String(50), nullable=False, default='other')
+    message = db.Column(db.Text, nullable=False)
+    ip_address = db.Column(db.String(45))
+    created_date = db.Column(db.DateTime, default=utc_now, index=True)
+    status = db.Column(db.String(10), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    sent_date = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<ContactMessage {self.id} {self.email} {self.status}>'
+
+
+@event.listens_for(Post, 'before_insert')
+@event.listens_for(Post, 'before_update')
+def _render_post_content(mapper, connection, post):
+    """Render content once per save rather than once per request."""
+    post.refresh_rendered()
+
+
+def _as_utc(value):
+    """Treat naive datetimes (as returned by SQLite) as UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def init_lazy_load_guard(app):
+    """Report lazy loads that happen while a template renders.
+    
+    Listing queries are expected to eager-load everything their templates
+    touch: relationships, and the columns left out by Post.card_columns().
+    In debug mode (or with LAZY_LOAD_GUARD set) a lazy load during
+    rendering is logged, or raised when LAZY_LOAD_RAISE is set.
+    """
+    
+    def start_render(sender, template, context, **extra):
+        # Templates rendered from a string have no name.
+        g.rendering_template = template.name or '<string>'
+    
+    def end_render(sender, template, context, **extra):
+        g.pop('rendering_template', None)
+    
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(end_render, app, weak=False)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _check_lazy_load(orm_execute_state):
+    """Flag lazy loads issued from inside a template (see init_lazy_load_guard)."""
+    if not orm_execute_state.is_select or not has_app_context():
+        return
+    if orm_execute_state.lazy_loaded_from is None and not orm_execute_state.is_column_load:
+        return
+    template = g.get('rendering_template')
+    if template is None:
+        return
+    if not (current_app.debug or current_app.config.get('LAZY_LOAD_GUARD')):
+        return
+    
+    if orm_execute_state.is_column_load:
+        what = f'deferred {orm_execute_state.bind_mapper.class_.__name__} columns'
+    else:
+        what = f'{orm_execute_state.lazy_loaded_from.class_.__name__} relationship'
+    message = f'Lazy load of {what} while rendering {template}; eager-load it in the view query.'
+    if current_app.config.get('LAZY_LOAD_RAISE'):
+        raise RuntimeError(message)
+    current_app.logger.warning(message)
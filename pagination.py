@@ -0,0 +1,158 @@
+"""
+Keyset (seek) pagination helpers.
+
+Pages are addressed by the sort key of the row they continue from rather
+than by an OFFSET, so fetching a deep page costs the same as the first.
+Cursors are signed and URL-safe; clients treat them as opaque tokens.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, or_, tuple_
+
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor was tampered with or built for another listing."""
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def encode_cursor(scope, values, backwards=False):
+    """Opaque token for the page after (or before) the row with ``values``.
+
+    ``scope`` names the listing the cursor belongs to, so a cursor from one
+    listing cannot be replayed against another with a different sort key.
+    """
+    payload = [
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    return _serializer().dumps({'s': scope, 'k': payload, 'b': backwards})
+
+
+def decode_cursor(scope, token):
+    """Return ``(values, backwards)`` for a token made by encode_cursor()."""
+    try:
+        data = _serializer().loads(token)
+    except BadSignature as e:
+        raise InvalidCursor('Malformed pagination cursor.') from e
+    if not isinstance(data, dict) or data.get('s') != scope:
+        raise InvalidCursor('Pagination cursor does not belong to this listing.')
+    values = [
+        datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+        for value in data['k']
+    ]
+    return values, bool(data.get('b'))
+
+
+def keyset_condition(sort_key, values, backwards=False):
+    """SQL condition selecting rows strictly after ``values`` in ``sort_key`` order.
+
+    ``sort_key`` is a list of ``(column, descending)`` pairs; with
+    ``backwards`` the rows strictly before ``values`` are selected instead.
+    Consecutive columns sorted the same way are compared as one row value,
+    ``(a, b) > (x, y)``, which an index on ``(a, b)`` can seek to. Directions
+    may be mixed; each run then also bounds the query with a ``>=`` the
+    database can seek on before the strict comparison of the rest:
+
+        (a, b) >= (x, y) AND ((a, b) > (x, y) OR (c, d) < (z, w))
+    """
+    runs = []
+    for (column, descending), value in zip(sort_key, values):
+        if runs and runs[-1][0] == descending:
+            runs[-1][1].append(column)
+            runs[-1][2].append(value)
+        else:
+            runs.append((descending, [column], [value]))
+
+    def compare(run, strict):
+        descending, columns, run_values = run
+        left = columns[0] if len(columns) == 1 else tuple_(*columns)
+        right = run_values[0] if len(columns) == 1 else tuple_(*run_values)
+        if descending != backwards:
+            return left < right if strict else left <= right
+        return left > right if strict else left >= right
+
+    condition = compare(runs[-1], strict=True)
+    for run in reversed(runs[:-1]):
+        condition = and_(compare(run, strict=False), or_(compare(run, strict=True), condition))
+    return condition
+
+
+def keyset_order(sort_key, backwards=False):
+    """ORDER BY clauses for ``sort_key``, reversed when paging backwards."""
+    return [
+        column.desc() if descending != backwards else column.asc()
+        for column, descending in sort_key
+    ]
+
+
+def paginate(query, sort_key, key_of, per_page, scope, cursor=None):
+    """Run ``query`` for one keyset page.
+
+    ``key_of(row)`` returns the sort-key values of a result row. Returns a
+    KeysetPage whose cursors are None when there is no next/previous page.
+    Raises InvalidCursor for a bad ``cursor``.
+    """
+    backwards = False
+    if cursor:
+        values, backwards = decode_cursor(scope, cursor)
+        if len(values) != len(sort_key):
+            raise InvalidCursor('Pagination cursor does not match this listing.')
+        query = query.filter(keyset_condition(sort_key, values, backwards))
+
+    rows = query.order_by(*keyset_order(sort_key, backwards)).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    return _keyset_page(rows, has_more, backwards, key_of, scope, cursor)
+
+
+def paginate_sequence(rows, keys, seek_key, key_of, per_page, scope, cursor=None):
+    """In-memory counterpart of paginate() over ``rows`` already in listing order.
+
+    ``keys`` are ascending, comparable sort keys of ``rows`` and
+    ``seek_key(values)`` turns a cursor's values into the same form, so
+    cursors are interchangeable with paginate() ones of the same scope.
+    """
+    backwards = False
+    start, stop = 0, per_page + 1
+    if cursor:
+        values, backwards = decode_cursor(scope, cursor)
+        try:
+            if backwards:
+                stop = bisect_left(keys, seek_key(values))
+                start = max(0, stop - per_page - 1)
+            else:
+                start = bisect_right(keys, seek_key(values))
+                stop = start + per_page + 1
+        except (IndexError, TypeError, ValueError) as e:
+            raise InvalidCursor('Pagination cursor does not match this listing.') from e
+
+    rows = list(rows[start:stop])
+    has_more = len(rows) > per_page
+    if has_more:
+        rows = rows[1:] if backwards else rows[:per_page]
+    return _keyset_page(rows, has_more, backwards, key_of, scope, cursor)
+
+
+def _keyset_page(rows, has_more, backwards, key_of, scope, cursor):
+    if not rows:
+        return KeysetPage(rows, None, None)
+
+    # Coming from a cursor means there is a page on the side we came from.
+    has_next = has_more if not backwards else True
+    has_prev = has_more if backwards else bool(cursor)
+    next_cursor = encode_cursor(scope, key_of(rows[-1])) if has_next else None
+    prev_cursor = encode_cursor(scope, key_of(rows[0]), backwards=True) if has_prev else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
@@ -0,0 +1,44 @@
+"""
+Token-bucket rate limiting.
+
+Each key (a client IP) has a bucket holding up to ``burst`` tokens that
+refills at ``rate`` tokens per second; a request spends one token and is
+refused while the bucket is empty. Buckets live in process memory, so
+with several gunicorn workers a client can get up to ``workers x burst``
+requests through at once. That is enough to keep a flood from tying up
+workers, since a refusal never touches the database. The number of
+tracked keys is bounded, and the least recently seen are forgotten first.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Per-key token buckets: ``rate`` tokens per second, at most ``burst`` saved up."""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        if rate <= 0:
+            raise ValueError(f'TokenBucket rate must be positive, not {rate!r}')
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, now=None):
+        """Spend a token for ``key``; returns 0 if allowed, else seconds until one is due."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
@@ -0,0 +1,349 @@
+"""
+In-memory read model of the published content.
+
+The public site is small enough to keep in every worker. A Snapshot holds
+the published posts and their categories as immutable records with the
+indexes the public views need: posts by slug, the featured and recent
+lists, the blog listing in keyset order (overall and per category),
+related posts and the sitemap rows. It answers the same queries as Post
+(featured(), recent(), blog_page(), by_slug(), related_to(),
+content_version(), slug_version(), published_count(), sitemap_rows()), so
+a view asks for whichever should serve the request:
+
+    content = read_model.source()
+    recent_posts = content.recent(9)
+
+Each snapshot is stamped with the content version it was built at, a
+token kept in ``READ_MODEL_VERSION_FILE``. Every content change (admin
+saves, ``flask import-posts``, ``render-content``, ``related-rebuild``)
+replaces the token through read_model.invalidate(). Requests read the
+token, which costs a few microseconds and no SQL. When it no longer
+matches, a background thread builds a new snapshot from the primary
+database and swaps it in. Until then requests fall back to Post and
+SQL, so nothing stale is served or cached.
+
+Past ``READ_MODEL_MAX_POSTS`` published posts no snapshot is built and
+every request uses SQL. With several hosts, keep the version file on
+storage they all share.
+"""
+
+import os
+import tempfile
+import threading
+import uuid
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+
+from flask import abort, current_app, g
+
+from models import db, Category, Post, RelatedPost
+from pagination import paginate_sequence
+import rendering
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class CategoryRecord(namedtuple('CategoryRecord', ['id', 'name', 'slug', 'emoji', 'display_order', 'updated_date'])):
+    """Immutable copy of a Category row."""
+
+    __slots__ = ()
+
+
+class PostRecord(namedtuple('PostRecord', [
+    'id', 'title', 'slug', 'excerpt', 'image_url', 'image_variants', 'read_time', 'published_date', 'updated_date',
+    'is_featured', 'category_id', 'category', 'meta_description', 'meta_keywords', 'body', 'related_ids',
+])):
+    """Immutable copy of a published Post with its category and rendered body."""
+
+    __slots__ = ()
+
+    @property
+    def formatted_date(self):
+        """Return formatted publication date."""
+        return self.published_date.strftime('%B %d, %Y')
+
+    def rendered(self):
+        return self.body
+
+
+def _micros(value):
+    """Integer sort key of a datetime (naive values are UTC); None sorts first."""
+    if value is None:
+        return -2 ** 63
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+# The blog listing orders, as ascending keys built from the cursor values of
+# Post.blog_page(), so cursors work against either source.
+
+def _blog_key(post):
+    return [post.category.display_order or 0, post.category_id, post.published_date, post.id]
+
+
+def _blog_seek(values):
+    return (values[0], values[1], -_micros(values[2]), -values[3])
+
+
+def _category_key(post):
+    return [post.published_date, post.id]
+
+
+def _category_seek(values):
+    return (-_micros(values[0]), -values[1])
+
+
+def _body(content, rendered_content, toc, read_time, rendered_key):
+    # Same choice as Post.rendered(), made once per build instead of per request.
+    if rendered_key == rendering.content_key(content):
+        html, toc = rendered_content, toc or []
+    else:
+        html, toc, read_time = rendering.render_content(content)
+    return rendering.RenderedContent(html, tuple(tuple(entry) for entry in toc), read_time)
+
+
+def _version(parts):
+    timestamps = [part for part in parts if isinstance(part, datetime)]
+    last_modified = max(timestamps, key=_micros) if timestamps else None
+    return last_modified, ':'.join(str(part) for part in parts)
+
+
+class Snapshot:
+    """The published content at one version, indexed for the public views."""
+
+    def __init__(self, version, categories, posts, related, updated_dates, content_versions):
+        # posts: PostRecords in id order; related: {post_id: [(rank, related_id), ...]} in rank order.
+        self.version = version
+        self.categories = categories
+        self.posts_by_id = {post.id: post for post in posts}
+        self.posts_by_slug = {post.slug: post for post in posts}
+        self._content_versions = content_versions
+
+        newest_first = sorted(posts, key=lambda post: (-_micros(post.published_date), -post.id))
+        self.recent_posts = tuple(newest_first)
+        self.featured_posts = tuple(post for post in newest_first if post.is_featured)
+
+        by_category = defaultdict(list)
+        for post in newest_first:
+            by_category[post.category.slug].append(post)
+        self.by_category = {
+            slug: (tuple(rows), [_category_seek(_category_key(post)) for post in rows])
+            for slug, rows in by_category.items()
+        }
+        blog = sorted(posts, key=lambda post: _blog_seek(_blog_key(post)))
+        self.blog = (tuple(blog), [_blog_seek(_blog_key(post)) for post in blog])
+
+        self.sitemap = tuple((post.slug, post.published_date, post.updated_date) for post in posts)
+
+        # Same tokens as Post.slug_version(), so ETags survive a switch between sources.
+        self.slug_versions = {}
+        for post in posts:
+            neighbours = related.get(post.id, [])
+            neighbour_dates = [updated_dates.get(related_id) for _, related_id in neighbours]
+            neighbour_dates = [value for value in neighbour_dates if value is not None]
+            related_updated = max(neighbour_dates, key=_micros) if neighbour_dates else None
+            checksum = sum(related_id * (rank + 1) for rank, related_id in neighbours) if neighbours else None
+            last_modified, _ = _version([post.updated_date, post.category.updated_date, related_updated])
+            self.slug_versions[post.slug] = (
+                last_modified,
+                f'{post.id}:{post.updated_date}:{post.category.updated_date}:{related_updated}:{checksum}',
+            )
+
+    @classmethod
+    def load(cls, version, max_posts=None):
+        """Build a snapshot from the database, or None past ``max_posts`` published posts."""
+        if max_posts is not None and Post.published_count() > max_posts:
+            return None
+        categories = {
+            category.id: CategoryRecord(
+                category.id, category.name, category.slug, category.emoji,
+                category.display_order, category.updated_date,
+            )
+            for category in Category.query.order_by(Category.id)
+        }
+        related = defaultdict(list)
+        for post_id, rank, related_id in db.session.query(
+            RelatedPost.post_id, RelatedPost.rank, RelatedPost.related_id
+        ).order_by(RelatedPost.post_id, RelatedPost.rank):
+            related[post_id].append((rank, related_id))
+        updated_dates = dict(db.session.query(Post.id, Post.updated_date))
+
+        rows = db.session.query(
+            Post.id, Post.title, Post.slug, Post.excerpt, Post.image_url, Post.image_variants, Post.read_time,
+            Post.published_date, Post.updated_date, Post.is_featured, Post.category_id,
+            Post.meta_description, Post.meta_keywords,
+            Post.content, Post.rendered_content, Post.toc, Post.rendered_key,
+        ).filter(Post.is_published == True).order_by(Post.id).yield_per(500)
+        posts = []
+        for row in rows:
+            (post_id, title, slug, excerpt, image_url, image_variants, read_time, published_date, updated_date,
+             is_featured, category_id, meta_description, meta_keywords,
+             content, rendered_content, toc, rendered_key) = row
+            posts.append(PostRecord(
+                post_id, title, slug, excerpt, image_url, image_variants, read_time, published_date, updated_date,
+                is_featured, category_id, categories[category_id], meta_description, meta_keywords,
+                _body(content, rendered_content, toc, read_time, rendered_key),
+                tuple(related_id for _, related_id in related.get(post_id, ())),
+            ))
+
+        content_versions = {
+            True: Post.content_version(),
+            False: Post.content_version(include_categories=False),
+        }
+        return cls(version, categories, posts, related, updated_dates, content_versions)
+
+    # The Post query API, answered from memory.
+
+    def featured(self, limit):
+        return list(self.featured_posts[:limit])
+
+    def recent(self, limit):
+        return list(self.recent_posts[:limit])
+
+    def by_slug(self, slug):
+        post = self.posts_by_slug.get(slug)
+        if post is None:
+            abort(404)
+        return post
+
+    def related_to(self, post, limit):
+        related = [self.posts_by_id[post_id] for post_id in post.related_ids if post_id in self.posts_by_id]
+        if related:
+            return related[:limit]
+        rows, _ = self.by_category.get(post.category.slug, ((), ()))
+        return [other for other in rows if other.id != post.id][:limit]
+
+    def blog_page(self, category_slug=None, cursor=None, per_page=24):
+        if category_slug:
+            rows, keys = self.by_category.get(category_slug, ((), []))
+            page = paginate_sequence(rows, keys, _category_seek, _category_key, per_page,
+                                     f'blog:{category_slug}', cursor)
+        else:
+            rows, keys = self.blog
+            page = paginate_sequence(rows, keys, _blog_seek, _blog_key, per_page, 'blog', cursor)
+
+        posts_by_category = {}
+        for post in page.items:
+            posts_by_category.setdefault(post.category, []).append(post)
+        return posts_by_category, page.next_cursor, page.prev_cursor
+
+    def published_count(self):
+        return len(self.sitemap)
+
+    def sitemap_rows(self, offset=0, limit=None, batch_size=None):
+        return self.sitemap[offset:None if limit is None else offset + limit]
+
+    def content_version(self, include_categories=True):
+        return self._content_versions[bool(include_categories)]
+
+    def slug_version(self, slug):
+        return self.slug_versions.get(slug)
+
+
+class ReadModel:
+    """Flask extension holding this worker's current Snapshot."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.max_posts = None
+        self.version_file = None
+        # (version, snapshot) swapped as one value; the snapshot is None past
+        # max_posts and the version None until the first build.
+        self._state = (None, None)
+        self._building = False
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('READ_MODEL_ENABLED', True)
+        self.max_posts = app.config.get('READ_MODEL_MAX_POSTS', 2000)
+        self.version_file = app.config.get('READ_MODEL_VERSION_FILE')
+        self._state = (None, None)
+        app.extensions['read_model'] = self
+
+    def _after_fork(self):
+        # A build running in the parent does not exist in the child.
+        self._lock = threading.Lock()
+        self._building = False
+
+    def version(self):
+        """Current content version token ('' before the first invalidate())."""
+        if not self.version_file:
+            return ''
+        try:
+            with open(self.version_file, 'r') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def invalidate(self):
+        """Record a content change, so every worker rebuilds its snapshot."""
+        if not self.version_file:
+            return
+        directory = os.path.dirname(os.path.abspath(self.version_file))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.version_file)
+
+    def load(self):
+        """Build a snapshot at the current version and swap it in; needs an app context."""
+        version = self.version()
+        self._state = (version, Snapshot.load(version, self.max_posts))
+        return self._state[1]
+
+    def warm(self, app):
+        """Build the first snapshot now, e.g. before gunicorn forks its workers."""
+        if not self.enabled:
+            return
+        with app.app_context():
+            try:
+                self.load()
+            except Exception:
+                app.logger.exception('Could not build the read model; serving from the database')
+
+    def source(self):
+        """The fresh Snapshot for this request, or Post to query the database.
+
+        Chosen once per request, so every query in a view sees the same content.
+        """
+        if not self.enabled:
+            return Post
+        if 'read_model_source' not in g:
+            g.read_model_source = self._current() or Post
+        return g.read_model_source
+
+    def _current(self):
+        version = self.version()
+        built_version, snapshot = self._state
+        if built_version == version:
+            return snapshot
+        self._rebuild_in_background(current_app._get_current_object())
+        return None
+
+    def _rebuild_in_background(self, app):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild, args=(app,), name='read-model', daemon=True).start()
+
+    def _rebuild(self, app):
+        # Outside any request, so the build reads from the primary database
+        # even when the request that noticed the change used the replica.
+        try:
+            with app.app_context():
+                self.load()
+        except Exception:
+            app.logger.exception('Rebuilding the read model failed')
+        finally:
+            with self._lock:
+                self._building = False
+
+
+read_model = ReadModel()
@@ -0,0 +1,238 @@
+"""
+Precomputed related posts.
+
+Each published post is turned into an L2-normalised TF-IDF vector over its
+title, excerpt, content and keywords. Cosine similarities are computed in
+one pass per post through an inverted index (a sparse matrix product that
+only touches posts sharing a term), and the top ``k`` neighbours are stored
+in the ``related_post`` table so post() needs a single indexed lookup.
+
+Saving a post only recomputes the rows it can affect: its own neighbours
+and those of posts whose top-k it enters or leaves. That still means
+re-tokenizing every post, so admin saves and deletes hand it to the jobs
+queue (the update_related_posts and refill_related_posts tasks) instead
+of doing it in the request.
+"""
+
+import heapq
+import math
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app
+
+from caching import page_cache
+from jobs import jobs
+from models import db, Post, RelatedPost
+from readmodel import read_model
+from search import STOPWORDS, strip_html, tokenize
+
+
+# Field weights applied to term counts before TF-IDF weighting.
+FIELD_WEIGHTS = {'title': 3, 'keywords': 2, 'excerpt': 1, 'content': 1}
+
+# Terms present in more than this share of posts carry almost no signal
+# and make the similarity pass quadratic, so they are dropped.
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+
+def _term_counts(title, excerpt, content, keywords):
+    counts = Counter()
+    fields = {'title': title, 'excerpt': excerpt, 'content': strip_html(content), 'keywords': keywords}
+    for field, value in fields.items():
+        weight = FIELD_WEIGHTS[field]
+        for token in tokenize(value or ''):
+            if token not in STOPWORDS and len(token) > 1 and not token.isdigit():
+                counts[token] += weight
+    return counts
+
+
+class Corpus:
+    """TF-IDF vectors of every published post plus an inverted index over them."""
+
+    def __init__(self, documents):
+        # documents: {post_id: Counter of weighted term counts}
+        document_frequency = Counter()
+        for counts in documents.values():
+            document_frequency.update(counts.keys())
+
+        total = len(documents)
+        cutoff = max(2, MAX_DOCUMENT_FREQUENCY * total)
+        idf = {
+            term: math.log((1 + total) / (1 + df)) + 1
+            for term, df in document_frequency.items()
+            if df <= cutoff
+        }
+
+        self.vectors = {}
+        self.postings = defaultdict(list)
+        for post_id, counts in documents.items():
+            vector = {term: (1 + math.log(count)) * idf[term] for term, count in counts.items() if term in idf}
+            norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+            vector = {term: weight / norm for term, weight in vector.items()}
+            self.vectors[post_id] = vector
+            for term, weight in vector.items():
+                self.postings[term].append((post_id, weight))
+
+    @classmethod
+    def load(cls):
+        rows = db.session.query(
+            Post.id, Post.title, Post.excerpt, Post.content, Post.meta_keywords
+        ).filter(Post.is_published == True).yield_per(500)
+        return cls({post_id: _term_counts(*fields) for post_id, *fields in rows})
+
+    def similarities(self, post_id):
+        """Cosine similarity of ``post_id`` with every post sharing a term."""
+        scores = defaultdict(float)
+        for term, weight in self.vectors.get(post_id, {}).items():
+            for other_id, other_weight in self.postings[term]:
+                scores[other_id] += weight * other_weight
+        scores.pop(post_id, None)
+        return scores
+
+    def neighbours(self, post_id, k):
+        """Top ``k`` ``(other_id, score)`` pairs, most similar first."""
+        scores = self.similarities(post_id)
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _store(neighbours_by_post):
+    """Replace the stored neighbour lists of the given posts; the caller commits."""
+    if not neighbours_by_post:
+        return
+    post_ids = list(neighbours_by_post)
+    for start in range(0, len(post_ids), 500):
+        RelatedPost.query.filter(RelatedPost.post_id.in_(post_ids[start:start + 500])).delete(
+            synchronize_session=False
+        )
+    rows = [
+        {'post_id': post_id, 'rank': rank, 'related_id': related_id, 'score': score}
+        for post_id, neighbours in neighbours_by_post.items()
+        for rank, (related_id, score) in enumerate(neighbours)
+    ]
+    if rows:
+        db.session.execute(RelatedPost.__table__.insert(), rows)
+
+
+def rebuild(k):
+    """Recompute every published post's neighbours; returns (posts, seconds)."""
+    started = time.perf_counter()
+    corpus = Corpus.load()
+    RelatedPost.query.delete(synchronize_session=False)
+    batch = {}
+    for post_id in corpus.vectors:
+        batch[post_id] = corpus.neighbours(post_id, k)
+        if len(batch) >= 500:
+            _store(batch)
+            batch = {}
+    _store(batch)
+    db.session.commit()
+    return len(corpus.vectors), time.perf_counter() - started
+
+
+def _stored_lists(post_ids=None):
+    query = db.session.query(RelatedPost.post_id, RelatedPost.related_id, RelatedPost.score)
+    if post_ids is not None:
+        query = query.filter(RelatedPost.post_id.in_(post_ids))
+    lists = defaultdict(list)
+    for post_id, related_id, score in query.order_by(RelatedPost.post_id, RelatedPost.rank):
+        lists[post_id].append((related_id, score))
+    return lists
+
+
+def update_post(post_id, k):
+    """Refresh the rows affected by a change to ``post_id``; the caller commits.
+
+    The post's own list is recomputed. Every other list either gains the
+    post (when it now beats that list's weakest entry), keeps it with a
+    new score, or, when the post no longer matches or its score fell in a
+    full list, is recomputed so a post that is not listed can take its
+    place. Scores of
+    pairs not involving the post keep the IDF weights they were computed
+    with; ``flask related-rebuild`` refreshes those. Returns the ids of
+    posts whose related block changed.
+    """
+    corpus = Corpus.load()
+    stored = _stored_lists()
+    changed = {}
+
+    if post_id in corpus.vectors:
+        changed[post_id] = corpus.neighbours(post_id, k)
+        similarities = corpus.similarities(post_id)
+    else:
+        # Deleted or unpublished: it must leave every list it appears in.
+        similarities = {}
+        changed[post_id] = []
+
+    for other_id in corpus.vectors:
+        if other_id == post_id:
+            continue
+        current = stored.get(other_id, [])
+        without = [(related_id, score) for related_id, score in current if related_id != post_id]
+        was_listed = len(without) != len(current)
+        score = similarities.get(other_id, 0.0)
+
+        if was_listed and (score <= 0 or (len(current) >= k and score < dict(current)[post_id])):
+            # It left this list, or fell in a full one where a post that is
+            # not listed may now beat it; only a full pass knows.
+            changed[other_id] = corpus.neighbours(other_id, k)
+        elif score > 0 and (was_listed or len(without) < k or score > without[-1][1]):
+            merged = sorted(without + [(post_id, score)], key=lambda item: (-item[1], item[0]))[:k]
+            if merged != current:
+                changed[other_id] = merged
+
+    _store(changed)
+    return set(changed)
+
+
+def unlink_post(post_id):
+    """Drop ``post_id`` from every list before it is deleted; the caller commits.
+
+    Returns the ids of the posts that lost it, whose lists refill() can
+    then top up again.
+    """
+    affected = [
+        other_id for (other_id,) in
+        db.session.query(RelatedPost.post_id).filter(RelatedPost.related_id == post_id).distinct()
+    ]
+    RelatedPost.query.filter(
+        (RelatedPost.post_id == post_id) | (RelatedPost.related_id == post_id)
+    ).delete(synchronize_session=False)
+    return set(affected)
+
+
+def refill(post_ids, k):
+    """Recompute the lists of ``post_ids``; the caller commits. Returns the ids recomputed."""
+    corpus = Corpus.load()
+    neighbours = {post_id: corpus.neighbours(post_id, k) for post_id in post_ids if post_id in corpus.vectors}
+    _store(neighbours)
+    return set(neighbours)
+
+
+def related_cache_tags(post_ids):
+    """Tags of the post pages whose related-posts block was recomputed."""
+    if not post_ids:
+        return set()
+    slugs = db.session.query(Post.slug).filter(Post.id.in_(post_ids))
+    return {f'post:{slug}' for (slug,) in slugs}
+
+
+def _publish(post_ids):
+    page_cache.invalidate(*related_cache_tags(post_ids))
+    read_model.invalidate()
+
+
+@jobs.task('update_related_posts')
+def update_related_posts(post_id, attempt, final):
+    """Refresh the lists around a saved post; raising makes the queue retry it."""
+    affected = update_post(post_id, current_app.config['RELATED_POSTS_K'])
+    db.session.commit()
+    _publish(affected)
+
+
+@jobs.task('refill_related_posts')
+def refill_related_posts(post_ids, attempt, final):
+    """Top up the lists a deleted post was unlinked from; raising makes the queue retry it."""
+    affected = refill(post_ids, current_app.config['RELATED_POSTS_K'])
+    db.session.commit()
+    _publish(affected)
@@ -0,0 +1,211 @@
+"""
+Post content pipeline.
+
+Post bodies are stored exactly as CKEditor or the importer produced them.
+render_content() turns one into the HTML the post page serves:
+
+- images get ``loading="lazy"`` and ``decoding="async"``, plus
+  ``width``/``height`` and a ``srcset`` when the file is under /static
+  (resized copies are found next to it as ``<name>-<width>w.<ext>``);
+- h2/h3 headings get stable ``id``s and are collected into a table of
+  contents;
+- comments are dropped and whitespace is collapsed outside ``<pre>``;
+- the read time is computed from the word count.
+
+The result is stored on the post when it is saved (see
+Post.refresh_rendered()) together with a key of the source content and
+PIPELINE_VERSION, so post() serves it without reparsing.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import struct
+from collections import namedtuple
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+from slugify import slugify
+
+
+# Bump when the output of render_content() changes, so stored renders are
+# recognised as stale and redone by `flask render-content`.
+PIPELINE_VERSION = '1'
+
+WORDS_PER_MINUTE = 200
+
+TOC_LEVELS = ('h2', 'h3')
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Elements whose whitespace is significant or not text at all.
+PRESERVE_WHITESPACE = {'pre', 'textarea', 'code', 'script', 'style'}
+
+# Whitespace between two of these (or at their edges) is never rendered.
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt',
+    'figcaption', 'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'header', 'hr', 'li', 'nav', 'ol', 'p', 'pre', 'section', 'table',
+    'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+}
+
+WHITESPACE_RE = re.compile(r'\s+')
+DERIVATIVE_RE = re.compile(r'-(\d+)w$')
+
+RenderedContent = namedtuple('RenderedContent', ['html', 'toc', 'read_time'])
+
+
+def content_key(content):
+    """Key identifying a render of ``content`` by the current pipeline."""
+    return hashlib.sha1(f'{PIPELINE_VERSION}\0{content or ""}'.encode('utf-8')).hexdigest()
+
+
+def read_time_for(word_count):
+    return f'{max(1, round(word_count / WORDS_PER_MINUTE))} min read'
+
+
+def render_content(content):
+    """Run the pipeline over a stored post body; returns RenderedContent."""
+    soup = BeautifulSoup(content or '', 'html.parser')
+
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+    for img in soup.find_all('img'):
+        _process_image(img)
+
+    toc = _anchor_headings(soup)
+    word_count = len(soup.get_text(' ').split())
+    _collapse_whitespace(soup)
+
+    return RenderedContent(soup.decode(formatter='minimal').strip(), toc, read_time_for(word_count))
+
+
+def _process_image(img):
+    img.attrs.setdefault('loading', 'lazy')
+    img.attrs.setdefault('decoding', 'async')
+
+    path = _static_path(img.get('src', ''))
+    if path is None:
+        return
+    if not (img.get('width') and img.get('height')):
+        size = image_size(path)
+        if size:
+            img['width'], img['height'] = str(size[0]), str(size[1])
+    if not img.get('srcset'):
+        srcset = _srcset(img['src'], path)
+        if srcset:
+            img['srcset'] = srcset
+            img.attrs.setdefault('sizes', '(max-width: 800px) 100vw, 800px')
+
+
+def _static_path(src):
+    """Filesystem path of a /static/ image URL, or None."""
+    if not src.startswith('/static/'):
+        return None
+    path = os.path.normpath(os.path.join(STATIC_ROOT, src[len('/static/'):].split('?')[0]))
+    if not path.startswith(STATIC_ROOT + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _srcset(src, path):
+    """``srcset`` listing the resized copies of ``path`` found beside it."""
+    stem, ext = os.path.splitext(path)
+    candidates = []
+    for derivative in glob.glob(glob.escape(stem) + '-*w' + ext):
+        match = DERIVATIVE_RE.search(os.path.splitext(derivative)[0])
+        if match:
+            candidates.append((int(match.group(1)), os.path.basename(derivative)))
+    if not candidates:
+        return None
+    base_url = src.split('?')[0].rsplit('/', 1)[0]
+    size = image_size(path)
+    if size:
+        candidates.append((size[0], os.path.basename(path)))
+    return ', '.join(f'{base_url}/{name} {width}w' for width, name in sorted(set(candidates)))
+
+
+def image_size(path):
+    """``(width, height)`` read from a PNG, GIF, JPEG or WebP header, or None."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(32)
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                return _webp_size(head)
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                return _jpeg_size(f)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None
+
+
+def _jpeg_size(f):
+    # Walk the marker segments up to the first start-of-frame.
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _anchor_headings(soup):
+    """Give h2/h3 headings unique ids; returns ``[[level, id, text], ...]``."""
+    used = {tag['id'] for tag in soup.find_all(id=True)}
+    toc = []
+    for heading in soup.find_all(TOC_LEVELS):
+        text = ' '.join(heading.get_text(' ').split())
+        if not text:
+            continue
+        anchor = heading.get('id')
+        if not anchor:
+            base = slugify(text)[:60] or 'section'
+            anchor, n = base, 2
+            while anchor in used:
+                anchor, n = f'{base}-{n}', n + 1
+            heading['id'] = anchor
+            used.add(anchor)
+        toc.append([int(heading.name[1]), anchor, text])
+    return toc
+
+
+def _is_block(node):
+    return node is None or getattr(node, 'name', None) in BLOCK_TAGS
+
+
+def _collapse_whitespace(soup):
+    for text in list(soup.find_all(string=True)):
+        if not isinstance(text, NavigableString) or isinstance(text, Comment):
+            continue
+        if any(parent.name in PRESERVE_WHITESPACE for parent in text.parents):
+            continue
+        collapsed = WHITESPACE_RE.sub(' ', str(text))
+        if collapsed == ' ' and _is_block(text.previous_sibling) and _is_block(text.next_sibling) \
+                and (text.parent is soup or text.parent.name in BLOCK_TAGS):
+            text.extract()
+        elif collapsed != str(text):
+            text.replace_with(NavigableString(collapsed))
@@ -0,0 +1,459 @@
+"""
+Full-text search over posts.
+
+Posts are indexed on title, excerpt, content (HTML stripped), keywords and
+category name, with per-field weights. The backend follows the database:
+
+- SQLite: an FTS5 virtual table ranked with ``bm25()``.
+- PostgreSQL: a ``tsvector`` table with a GIN index ranked with
+  ``ts_rank_cd`` (Postgres has no built-in BM25; field weights map to
+  tsvector weights A-D).
+- Anything else (or SQLite built without FTS5): an in-process inverted
+  index scored with BM25F, rebuilt when any post (drafts included) or
+  category changes.
+
+With FTS5 and the in-process index every word of a query must match
+(there is no OR), so operator words and stopwords are dropped from
+queries, see query_terms(); Postgres parses queries with
+``websearch_to_tsquery()``, which handles both itself.
+
+The index is kept up to date from the admin model hooks; ``flask
+search-reindex`` rebuilds it from scratch.
+"""
+
+import html
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import Integer, column, false, func, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from models import db, Category, Post
+
+
+# Relative importance of each indexed field.
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'keywords': 6.0,
+    'excerpt': 4.0,
+    'category': 3.0,
+    'content': 1.0,
+}
+
+TAG_RE = re.compile(r'<[^>]+>')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+STOPWORDS = frozenset('''
+    a about after all also an and any are as at be been before but by can do
+    for from get has have how if in into is it its more most must new no not
+    of on or our out so than that the their them then there these they this
+    to up was we what when where which who will with you your
+'''.split())
+
+# FTS5 query operators; typed into the search box they are just words.
+OPERATOR_WORDS = frozenset({'and', 'or', 'not', 'near'})
+
+
+def strip_html(value):
+    """Visible text of an HTML fragment."""
+    return html.unescape(TAG_RE.sub(' ', value or ''))
+
+
+def tokenize(value):
+    return WORD_RE.findall(value.lower())
+
+
+def query_terms(query):
+    """Words of a search query, every one of which must match.
+
+    Operator words and stopwords would otherwise be required terms (so
+    "visa or permit" would need a post containing "or"); a query made
+    only of such words keeps the non-operator ones.
+    """
+    terms = [term for term in tokenize(query) if term not in OPERATOR_WORDS]
+    return [term for term in terms if term not in STOPWORDS] or terms
+
+
+def _index_version():
+    """Version of everything the index holds: every post, drafts included, and category names."""
+    posts = db.session.query(func.max(Post.updated_date), func.count(Post.id)).one()
+    categories = db.session.query(func.max(Category.updated_date), func.count(Category.id)).one()
+    return ':'.join(str(part) for part in (*posts, *categories))
+
+
+def _document_rows(post_ids=None, category_id=None):
+    """Yield indexable field dicts, selecting only the columns needed."""
+    query = db.session.query(
+        Post.id, Post.is_published, Post.title, Post.excerpt, Post.content,
+        Post.meta_keywords, Category.name
+    ).join(Category, Post.category_id == Category.id)
+    if post_ids is not None:
+        query = query.filter(Post.id.in_(post_ids))
+    if category_id is not None:
+        query = query.filter(Post.category_id == category_id)
+    for post_id, is_published, title, excerpt, content, keywords, category in query.yield_per(500):
+        yield {
+            'id': post_id,
+            'is_published': bool(is_published),
+            'title': title or '',
+            'excerpt': excerpt or '',
+            'content': strip_html(content),
+            'keywords': keywords or '',
+            'category': category or '',
+        }
+
+
+class SQLiteFTSBackend:
+    """SQLite FTS5 table ``post_search`` keyed by post id (rowid)."""
+
+    name = 'sqlite-fts5'
+    table = 'post_search'
+
+    # bm25() takes one weight per indexed column, in declaration order.
+    COLUMNS = ['title', 'excerpt', 'content', 'keywords', 'category']
+
+    def create_schema(self):
+        db.session.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5('
+            'title, excerpt, content, keywords, category, is_published UNINDEXED, '
+            "tokenize='porter unicode61')"
+        ))
+
+    def upsert(self, documents):
+        for doc in documents:
+            db.session.execute(text('DELETE FROM post_search WHERE rowid = :id'), {'id': doc['id']})
+            db.session.execute(text(
+                'INSERT INTO post_search (rowid, title, excerpt, content, keywords, category, is_published) '
+                'VALUES (:id, :title, :excerpt, :content, :keywords, :category, :is_published)'
+            ), {**doc, 'is_published': int(doc['is_published'])})
+
+    def remove(self, post_ids):
+        for post_id in post_ids:
+            db.session.execute(text('DELETE FROM post_search WHERE rowid = :id'), {'id': post_id})
+
+    def clear(self):
+        db.session.execute(text('DELETE FROM post_search'))
+
+    @staticmethod
+    def _match(query):
+        return ' '.join(f'"{term}"' for term in query_terms(query))
+
+    def search(self, query, limit, published_only):
+        match = self._match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(FIELD_WEIGHTS[column]) for column in self.COLUMNS)
+        published = 'AND is_published = 1' if published_only else ''
+        rows = db.session.execute(text(
+            f'SELECT rowid, bm25(post_search, {weights}) AS rank FROM post_search '
+            f'WHERE post_search MATCH :match {published} ORDER BY rank LIMIT :limit'
+        ), {'match': match, 'limit': limit})
+        # bm25() is lower-is-better; flip it so scores grow with relevance.
+        return [(post_id, -rank) for post_id, rank in rows]
+
+    def match_condition(self, query, published_only):
+        published = ' AND is_published = 1' if published_only else ''
+        matches = text(f'SELECT rowid FROM post_search WHERE post_search MATCH :search_match{published}')
+        return Post.id.in_(matches.bindparams(search_match=self._match(query)).columns(column('rowid', Integer)))
+
+
+class PostgresBackend:
+    """``post_search`` table holding a weighted tsvector per post, GIN indexed."""
+
+    name = 'postgres-tsvector'
+    table = 'post_search'
+
+    DOCUMENT = (
+        "setweight(to_tsvector('english', :title), 'A') || "
+        "setweight(to_tsvector('english', :keywords || ' ' || :category), 'B') || "
+        "setweight(to_tsvector('english', :excerpt), 'C') || "
+        "setweight(to_tsvector('english', :content), 'D')"
+    )
+
+    def create_schema(self):
+        db.session.execute(text(
+            'CREATE TABLE IF NOT EXISTS post_search ('
+            'post_id INTEGER PRIMARY KEY REFERENCES post (id) ON DELETE CASCADE, '
+            'is_published BOOLEAN NOT NULL, '
+            'document TSVECTOR NOT NULL)'
+        ))
+        db.session.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_post_search_document ON post_search USING GIN (document)'
+        ))
+
+    def upsert(self, documents):
+        for doc in documents:
+            db.session.execute(text(
+                f'INSERT INTO post_search (post_id, is_published, document) '
+                f'VALUES (:id, :is_published, {self.DOCUMENT}) '
+                f'ON CONFLICT (post_id) DO UPDATE SET '
+                f'is_published = EXCLUDED.is_published, document = EXCLUDED.document'
+            ), doc)
+
+    def remove(self, post_ids):
+        for post_id in post_ids:
+            db.session.execute(text('DELETE FROM post_search WHERE post_id = :id'), {'id': post_id})
+
+    def clear(self):
+        db.session.execute(text('DELETE FROM post_search'))
+
+    def search(self, query, limit, published_only):
+        if not tokenize(query):
+            return []
+        published = 'AND is_published' if published_only else ''
+        rows = db.session.execute(text(
+            'SELECT post_id, ts_rank_cd(document, q, 32) AS rank '
+            "FROM post_search, websearch_to_tsquery('english', :query) q "
+            f'WHERE document @@ q {published} ORDER BY rank DESC LIMIT :limit'
+        ), {'query': query, 'limit': limit})
+        return [(post_id, rank) for post_id, rank in rows]
+
+    def match_condition(self, query, published_only):
+        published = ' AND is_published' if published_only else ''
+        matches = text(
+            "SELECT post_id FROM post_search WHERE document @@ websearch_to_tsquery('english', :search_query)"
+            f'{published}'
+        )
+        return Post.id.in_(matches.bindparams(search_query=query).columns(column('post_id', Integer)))
+
+
+class MemoryBackend:
+    """Pure-Python inverted index scored with BM25F.
+
+    Each worker holds its own copy, built on first use and rebuilt when
+    another process changed a post (published or not) or a category.
+    """
+
+    name = 'memory-bm25'
+    table = None
+
+    K1 = 1.2
+    B = 0.75
+
+    # Seconds between index version checks (each is a COUNT over posts).
+    CHECK_INTERVAL = 2.0
+
+    # Marker for "index updated in place since the last version check".
+    APPLIED = object()
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._checked_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.postings = defaultdict(dict)   # term -> {post_id: weighted tf}
+        self.lengths = {}                   # post_id -> weighted length
+        self.terms = {}                     # post_id -> set of terms
+        self.published = {}                 # post_id -> bool
+        self.total_length = 0.0
+
+    def create_schema(self):
+        pass
+
+    def _add(self, doc):
+        frequencies = defaultdict(float)
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(doc[field])
+            length += weight * len(tokens)
+            for token in tokens:
+                frequencies[token] += weight
+        for term, frequency in frequencies.items():
+            self.postings[term][doc['id']] = frequency
+        self.lengths[doc['id']] = length
+        self.total_length += length
+        self.terms[doc['id']] = set(frequencies)
+        self.published[doc['id']] = doc['is_published']
+
+    def _drop(self, post_id):
+        for term in self.terms.pop(post_id, ()):
+            postings = self.postings[term]
+            postings.pop(post_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(post_id, 0.0)
+        self.published.pop(post_id, None)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        version = _index_version()
+        if self._version is self.APPLIED:
+            # This worker already applied its own edit incrementally.
+            self._version = version
+        elif version != self._version:
+            self._reset()
+            for doc in _document_rows():
+                self._add(doc)
+            self._version = version
+
+    def upsert(self, documents):
+        with self._lock:
+            for doc in documents:
+                self._drop(doc['id'])
+                self._add(doc)
+            if self._version is not None:
+                self._version = self.APPLIED
+
+    def remove(self, post_ids):
+        with self._lock:
+            for post_id in post_ids:
+                self._drop(post_id)
+            if self._version is not None:
+                self._version = self.APPLIED
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._version = None
+
+    def _candidates(self, terms, published_only):
+        """Ids of the posts containing every term, with the terms rarest first."""
+        if any(term not in self.postings for term in terms):
+            return set(), []
+        # Every term must match; iterate from the rarest posting list.
+        ordered = sorted(terms, key=lambda term: len(self.postings[term]))
+        candidates = set(self.postings[ordered[0]])
+        for term in ordered[1:]:
+            candidates &= self.postings[term].keys()
+        if published_only:
+            candidates = {post_id for post_id in candidates if self.published[post_id]}
+        return candidates, ordered
+
+    def search(self, query, limit, published_only):
+        terms = set(query_terms(query))
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            candidates, ordered = self._candidates(terms, published_only)
+
+            total = len(self.lengths)
+            average_length = (self.total_length / total) if total else 1.0
+            scores = {}
+            for term in ordered:
+                postings = self.postings[term]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for post_id in candidates:
+                    frequency = postings[post_id]
+                    norm = self.K1 * (1 - self.B + self.B * self.lengths[post_id] / average_length)
+                    scores[post_id] = scores.get(post_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def match_condition(self, query, published_only):
+        with self._lock:
+            self._ensure_fresh()
+            candidates, _ = self._candidates(set(query_terms(query)), published_only)
+        return Post.id.in_(sorted(candidates))
+
+
+class SearchIndex:
+    """Flask extension wrapping the search backend chosen for the database."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        choice = app.config.get('SEARCH_BACKEND', 'auto')
+        if choice == 'auto':
+            dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+            choice = {'sqlite': 'sqlite', 'postgresql': 'postgres'}.get(dialect, 'memory')
+        if choice == 'sqlite' and not self._sqlite_has_fts5():
+            choice = 'memory'
+        backends = {'sqlite': SQLiteFTSBackend, 'postgres': PostgresBackend, 'memory': MemoryBackend}
+        if choice not in backends:
+            raise ValueError(f'Unknown SEARCH_BACKEND: {choice!r}')
+        self.backend = backends[choice]()
+        app.extensions['search_index'] = self
+
+    @staticmethod
+    def _sqlite_has_fts5():
+        import sqlite3
+
+        connection = sqlite3.connect(':memory:')
+        try:
+            connection.execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            connection.close()
+        return True
+
+    def create_schema(self):
+        self.backend.create_schema()
+        db.session.commit()
+
+    def index_post(self, post):
+        """(Re)index one post; the caller commits."""
+        self.backend.upsert(_document_rows(post_ids=[post.id]))
+
+    def index_posts(self, post_ids, batch_size=500):
+        """(Re)index many posts by id; the caller commits."""
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), batch_size):
+            self.backend.upsert(_document_rows(post_ids=post_ids[start:start + batch_size]))
+    
+    def index_category(self, category):
+        """Reindex every post in ``category`` (its name is indexed); the caller commits."""
+        self.backend.upsert(_document_rows(category_id=category.id))
+
+    def remove_post(self, post):
+        """Drop one post from the index; the caller commits."""
+        self.backend.remove([post.id])
+
+    def rebuild(self, batch_size=500):
+        """Recreate the whole index from the posts table; returns the post count."""
+        self.create_schema()
+        self.backend.clear()
+        count = 0
+        batch = []
+        for doc in _document_rows():
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self.backend.upsert(batch)
+                count += len(batch)
+                batch = []
+        self.backend.upsert(batch)
+        count += len(batch)
+        db.session.commit()
+        return count
+
+    def search(self, query, limit=20, published_only=True):
+        """``[(post_id, score), ...]`` best match first.
+
+        Every word in ``query`` must match. Returns an empty list for a
+        query without words or when the index table has not been created.
+        """
+        try:
+            return self.backend.search(query, limit, published_only)
+        except OperationalError:
+            db.session.rollback()
+            return []
+
+    def match_condition(self, query, published_only=True):
+        """Condition on ``Post.id`` selecting every post matching ``query``.
+
+        Unlike search() the matches are neither ranked nor limited, so the
+        caller's own query can sort and page through all of them. Matches
+        nothing for a query without words or when the index table has not
+        been created.
+        """
+        if not query_terms(query):
+            return false()
+        table = self.backend.table
+        if table is not None and not inspect(db.session.connection()).has_table(table):
+            return false()
+        return self.backend.match_condition(query, published_only)
+
+
+search_index = SearchIndex()
@@ -4,12 +4,9 @@ Imports content from the original static HTML files.
 """
 
 import os
-import re
-from datetime import datetime, timezone
-from bs4 import BeautifulSoup
-from slugify import slugify
 
 from app import create_app
+from importer import import_posts
 from models import db, Category, Post
 
 
@@ -106,65 +103,16 @@ POST_CATEGORY_MAP = {
 }
 
 
-def extract_post_content(html_path):
-    """Extract post data from an HTML file."""
-    with open(html_path, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f.read(), 'html.parser')
-    
-    # Extract title
-    title_tag = soup.find('h1', class_='article__title')
-    title = title_tag.get_text(strip=True) if title_tag else ''
-    
-    # Extract meta description
-    meta_desc = soup.find('meta', attrs={'name': 'description'})
-    excerpt = meta_desc.get('content', '') if meta_desc else ''
-    
-    # Extract meta keywords
-    meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-    keywords = meta_keywords.get('content', '') if meta_keywords else ''
-    
-    # Extract featured image
-    featured_img = soup.find('img', class_='article__featured-image')
-    image_url = featured_img.get('src', '') if featured_img else ''
-    
-    # Extract article content
-    content_div = soup.find('div', class_='article__content')
-    content = ''
-    if content_div:
-        # Get inner HTML
-        content = ''.join(str(child) for child in content_div.children)
-    
-    # Extract read time from meta
-    meta_items = soup.find_all('span', class_='article__meta-item')
-    read_time = '10 min read'
-    for item in meta_items:
-        text = item.get_text(strip=True)
-        if 'min read' in text:
-            read_time = text
-            break
-    
-    # Get filename without extension for slug
-    filename = os.path.basename(html_path)
-    slug = filename.replace('.html', '')
-    
-    return {
-        'title': title,
-        'slug': slug,
-        'excerpt': excerpt,
-        'content': content,
-        'image_url': image_url,
-        'read_time': read_time,
-        'meta_description': excerpt,
-        'meta_keywords': keywords,
-    }
+# New posts in these categories are featured (up to six per import).
+FEATURED_CATEGORIES = ['uk', 'canada', 'germany']
 
 
 def seed_categories():
     """Create all categories."""
     print("Seeding categories...")
+    existing_slugs = {slug for (slug,) in db.session.query(Category.slug)}
     for cat_data in CATEGORIES:
-        existing = Category.query.filter_by(slug=cat_data['slug']).first()
-        if not existing:
+        if cat_data['slug'] not in existing_slugs:
             category = Category(**cat_data)
             db.session.add(category)
             print(f"  Created category: {cat_data['name']}")
@@ -174,64 +122,15 @@ def seed_categories():
     print(f"Created {len(CATEGORIES)} categories.\n")
 
 
-def seed_posts(posts_dir):
-    """Import posts from HTML files."""
+def seed_posts(posts_dir, workers=None):
+    """Import posts from HTML files; unchanged files are skipped."""
     print("Seeding posts...")
     
     if not os.path.exists(posts_dir):
         print(f"Posts directory not found: {posts_dir}")
         return
     
-    html_files = [f for f in os.listdir(posts_dir) if f.endswith('.html')]
-    
-    created_count = 0
-    for html_file in html_files:
-        html_path = os.path.join(posts_dir, html_file)
-        
-        try:
-            post_data = extract_post_content(html_path)
-            
-            # Skip if post already exists
-            existing = Post.query.filter_by(slug=post_data['slug']).first()
-            if existing:
-                print(f"  Post exists: {post_data['slug']}")
-                continue
-            
-            # Determine category
-            category_slug = POST_CATEGORY_MAP.get(post_data['slug'], 'planning')
-            category = Category.query.filter_by(slug=category_slug).first()
-            
-            if not category:
-                # Default to first category if not found
-                category = Category.query.first()
-            
-            # Determine if featured (first 6 posts in UK, Canada, Germany)
-            is_featured = category_slug in ['uk', 'canada', 'germany'] and created_count < 6
-            
-            post = Post(
-                title=post_data['title'],
-                slug=post_data['slug'],
-                excerpt=post_data['excerpt'][:500] if post_data['excerpt'] else 'Guide for Nigerians relocating abroad.',
-                content=post_data['content'] or '<p>Content coming soon.</p>',
-                image_url=post_data['image_url'],
-                read_time=post_data['read_time'],
-                category_id=category.id,
-                is_featured=is_featured,
-                is_published=True,
-                meta_description=post_data['meta_description'][:300] if post_data['meta_description'] else '',
-                meta_keywords=post_data['meta_keywords'][:300] if post_data['meta_keywords'] else '',
-                published_date=datetime.now(timezone.utc)
-            )
-            
-            db.session.add(post)
-            created_count += 1
-            print(f"  Created post: {post_data['title'][:50]}...")
-            
-        except Exception as e:
-            print(f"  Error processing {html_file}: {e}")
-    
-    db.session.commit()
-    print(f"\nCreated {created_count} posts.")
+    import_posts(posts_dir, POST_CATEGORY_MAP, 'planning', FEATURED_CATEGORIES, workers=workers)
 
 
 def main():
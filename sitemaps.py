@@ -0,0 +1,134 @@
+"""
+Streaming sitemap generation.
+
+Sitemaps are built from slug/date tuples fetched in batches and yielded as
+XML chunks, so memory stays flat however many posts are published. Past
+``max_urls`` entries the site switches to a sitemap index pointing at
+``/sitemap-<n>.xml`` shards (the protocol allows 50,000 URLs per file).
+"""
+
+import gzip
+import math
+import os
+from datetime import timezone
+from xml.sax.saxutils import escape
+
+from models import Post
+
+
+# (path, changefreq, priority) of the pages that are not posts.
+STATIC_PAGES = [
+    ('/', 'daily', '1.0'),
+    ('/blog', 'daily', '0.9'),
+    ('/about', 'monthly', '0.7'),
+    ('/contact', 'monthly', '0.7'),
+]
+
+# URLs rendered per yielded chunk.
+CHUNK_SIZE = 500
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def _lastmod(value):
+    """W3C datetime for <lastmod>; naive values are stored as UTC."""
+    if value is None:
+        return ''
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def _url(loc, changefreq, priority, lastmod=''):
+    lastmod_tag = f'\n        <lastmod>{lastmod}</lastmod>' if lastmod else ''
+    return f'''    <url>
+        <loc>{escape(loc)}</loc>{lastmod_tag}
+        <changefreq>{changefreq}</changefreq>
+        <priority>{priority}</priority>
+    </url>
+'''
+
+
+def shard_count(max_urls, source=Post):
+    """Number of urlset files needed; 1 means no index is required.
+
+    ``source`` is Post or a read model snapshot (see readmodel.py).
+    """
+    total = len(STATIC_PAGES) + source.published_count()
+    return max(1, math.ceil(total / max_urls))
+
+
+def generate_urlset(site_url, shard=1, max_urls=50000, source=Post):
+    """Yield the XML of one urlset, shard numbers starting at 1.
+
+    The static pages come first in shard 1; posts follow in id order so
+    new posts only ever change the last shard.
+    """
+    start = (shard - 1) * max_urls
+    stop = start + max_urls
+
+    yield XML_HEADER + '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+    static = STATIC_PAGES[start:stop]
+    if static:
+        yield ''.join(_url(site_url + path, changefreq, priority) for path, changefreq, priority in static)
+
+    offset = max(0, start - len(STATIC_PAGES))
+    limit = stop - max(start, len(STATIC_PAGES))
+    chunk = []
+    for slug, published_date, updated_date in source.sitemap_rows(offset, limit):
+        chunk.append(_url(
+            f'{site_url}/post/{slug}', 'weekly', '0.8',
+            _lastmod(updated_date or published_date)
+        ))
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+    yield '</urlset>'
+
+
+def generate_index(site_url, shards, lastmod=None):
+    """Yield the XML of a sitemap index pointing at ``shards`` urlsets."""
+    yield XML_HEADER + '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    lastmod_tag = f'\n        <lastmod>{_lastmod(lastmod)}</lastmod>' if lastmod else ''
+    for shard in range(1, shards + 1):
+        yield f'''    <sitemap>
+        <loc>{escape(site_url)}/sitemap-{shard}.xml</loc>{lastmod_tag}
+    </sitemap>
+'''
+    yield '</sitemapindex>'
+
+
+def write_sitemaps(site_url, directory, max_urls=50000, compress=False):
+    """Write sitemap.xml (and shards) to ``directory``, optionally gzipped.
+
+    Returns the list of files written. Gzipped copies are written next to
+    the plain files so nginx ``gzip_static`` can serve them directly.
+    """
+    os.makedirs(directory, exist_ok=True)
+    shards = shard_count(max_urls)
+    if shards == 1:
+        outputs = {'sitemap.xml': generate_urlset(site_url, 1, max_urls)}
+    else:
+        last_modified, _ = Post.content_version(include_categories=False)
+        outputs = {'sitemap.xml': generate_index(site_url, shards, last_modified)}
+        for shard in range(1, shards + 1):
+            outputs[f'sitemap-{shard}.xml'] = generate_urlset(site_url, shard, max_urls)
+
+    written = []
+    for name, chunks in outputs.items():
+        path = os.path.join(directory, name)
+        if compress:
+            with open(path, 'w', encoding='utf-8') as plain, gzip.open(path + '.gz', 'wt', encoding='utf-8', compresslevel=9) as packed:
+                for chunk in chunks:
+                    plain.write(chunk)
+                    packed.write(chunk)
+            written += [path, path + '.gz']
+        else:
+            with open(path, 'w', encoding='utf-8') as plain:
+                plain.writelines(chunks)
+            written.append(path)
+    return written
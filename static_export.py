@@ -0,0 +1,303 @@
+"""
+Static snapshot export of the public site.
+
+Every read-only page is rendered through the real application (via the
+test client, so templates, caching headers and URL building behave exactly
+as in production) and written as a directory tree that Nginx or a CDN can
+serve without reaching gunicorn. Each file gets precompressed ``.gz`` and,
+when the ``brotli`` package is installed, ``.br`` siblings.
+
+Listings are exported page by page: the keyset pages behind ``/blog``'s
+``?cursor=`` links are written to ``blog/page/<n>/`` (and
+``blog/category/<slug>/page/<n>/``), and the previous/next links in the
+exported HTML are rewritten to point at those files.
+
+Incremental exports keep a manifest of what was rendered and only redo
+pages whose content version changed since the last run.
+"""
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import url_for
+from markupsafe import escape
+from sqlalchemy.orm import aliased
+
+from assets import write_compressed
+from caching import template_build_id
+from config import Config
+from models import db, Category, Post, RelatedPost
+from readmodel import read_model
+import sitemaps
+
+
+MANIFEST_NAME = '.export-manifest.json'
+
+# Pages whose content does not come from the database.
+FIXED_PAGES = ['/about', '/privacy', '/terms', '/robots.txt', '/ads.txt']
+
+
+class ExportConfig(Config):
+    """Config for render workers; pages are rendered once, so skip the page cache."""
+
+    PAGE_CACHE_BACKEND = None
+
+
+def output_path(url):
+    """Relative file path a URL is written to.
+
+    ``/post/<slug>`` becomes ``post/<slug>/index.html`` and
+    ``/blog?category=<slug>`` becomes ``blog/category/<slug>/index.html``;
+    URLs with a file extension are written as-is.
+    """
+    path, _, query = url.partition('?')
+    if query.startswith('category='):
+        path = f'{path}/category/{query.split("=", 1)[1]}'
+    path = path.strip('/')
+    if os.path.splitext(path)[1]:
+        return path
+    return os.path.join(path, 'index.html') if path else 'index.html'
+
+
+def listing_url(category=None, number=1):
+    """URL that page ``number`` of the blog listing, or of a category's, is exported as."""
+    base = f'/blog/category/{category}/' if category else '/blog'
+    return base if number == 1 else f'{base.rstrip("/")}/page/{number}/'
+
+
+def _remove(directory, relative_path):
+    path = os.path.join(directory, relative_path)
+    for suffix in ('', '.gz', '.br'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+# Render workers. Each process builds its own app (and engine) once.
+
+_worker_client = None
+
+
+def _init_worker(config_class):
+    global _worker_client
+    from app import create_app
+
+    _worker_client = create_app(config_class).test_client()
+
+
+def _render(job):
+    url, path, directory, links = job
+    response = _worker_client.get(url)
+    if response.status_code != 200:
+        return url, response.status_code, 0
+    data = response.get_data()
+    for href, target in links.items():
+        data = data.replace(href.encode(), target.encode())
+    return url, 200, write_compressed(directory, path, data)
+
+
+def _copy_static(app, directory):
+    """Mirror the static folder into ``<directory>/static`` with precompressed copies."""
+    copied = 0
+    target_root = os.path.join(directory, 'static')
+    for root, _, names in os.walk(app.static_folder):
+        for name in names:
+            if name.endswith(('.gz', '.br')):
+                # Precompressed asset builds; recreated next to their source.
+                continue
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, app.static_folder)
+            target = os.path.join(target_root, relative)
+            try:
+                unchanged = os.path.getmtime(target) >= os.path.getmtime(source)
+            except OSError:
+                unchanged = False
+            if unchanged:
+                continue
+            with open(source, 'rb') as f:
+                write_compressed(target_root, relative, f.read())
+            shutil.copystat(source, target)
+            copied += 1
+    return copied
+
+
+def _snapshot(app):
+    """Current content versions, used to decide what an incremental export redoes."""
+    with app.app_context():
+        rows = db.session.query(
+            Post.slug, Post.published_date, Post.updated_date, Category.slug
+        ).join(Post.category).filter(Post.is_published == True)
+        posts = {
+            slug: [(updated_date or published_date).isoformat(), category_slug]
+            for slug, published_date, updated_date, category_slug in rows
+        }
+        published_categories = {category_slug for _, category_slug in posts.values()}
+        # A post page also shows its related posts, so each entry carries
+        # the slugs and versions of its stored neighbours.
+        neighbour = aliased(Post)
+        related_rows = db.session.query(Post.slug, neighbour.slug).join(
+            RelatedPost, RelatedPost.post_id == Post.id
+        ).join(neighbour, RelatedPost.related_id == neighbour.id).filter(
+            Post.is_published == True, neighbour.is_published == True
+        ).order_by(Post.slug, RelatedPost.rank)
+        for slug, related_slug in related_rows:
+            posts[slug].append(f'{related_slug}@{posts[related_slug][0]}')
+        categories = {
+            slug: updated_date.isoformat() if updated_date else ''
+            for slug, updated_date in db.session.query(Category.slug, Category.updated_date)
+            if slug in published_categories
+        }
+        shards = sitemaps.shard_count(app.config['SITEMAP_MAX_URLS'])
+        with app.test_request_context():
+            build_id = template_build_id()
+    return {
+        'build_id': build_id,
+        'posts': posts,
+        'categories': categories,
+        'sitemap_shards': shards if shards > 1 else 0,
+    }
+
+
+def _listing_pages(app, categories):
+    """Render jobs for every keyset page of ``/blog`` and of each category listing.
+
+    Returns ``{category: [(url, path, links), ...]}``, with ``''`` for the
+    unfiltered listing. ``url`` is the cursor URL the page is rendered
+    from and ``links`` maps the (HTML-escaped) cursor URLs of its previous
+    and next links to the exported pages they lead to.
+    """
+    per_page = app.config['BLOG_PAGE_SIZE']
+    listings = {}
+    with app.test_request_context():
+        content = read_model.source()
+        for category in ['', *categories]:
+            pages = []
+            cursor, number = None, 1
+            while True:
+                _, next_cursor, prev_cursor = content.blog_page(category or None, cursor, per_page)
+                links = {}
+                for link, target in ((prev_cursor, number - 1), (next_cursor, number + 1)):
+                    if link:
+                        href = url_for('blog', category=category or None, cursor=link)
+                        links[str(escape(href))] = listing_url(category, target)
+                url = url_for('blog', category=category or None, cursor=cursor)
+                pages.append((url, output_path(listing_url(category, number)), links))
+                if not next_cursor:
+                    break
+                cursor, number = next_cursor, number + 1
+            listings[category] = pages
+    return listings
+
+
+def _pages_to_render(previous, current):
+    """URLs whose output may differ between two snapshots.
+
+    A post page shows its own content plus its related posts (or, before
+    those are computed, the newest from its category), so it is redone
+    when it or a related post changed or when anything in its category
+    changed; listings are redone when any category is dirty.
+    """
+    if previous.get('build_id') != current['build_id']:
+        return (
+            FIXED_PAGES + ['/', '/blog', '/sitemap.xml']
+            + [f'/blog?category={slug}' for slug in current['categories']]
+            + [f'/sitemap-{n}.xml' for n in range(1, current['sitemap_shards'] + 1)]
+            + [f'/post/{slug}' for slug in current['posts']]
+        )
+
+    old_posts, new_posts = previous.get('posts', {}), current['posts']
+    old_categories = previous.get('categories', {})
+    dirty = set()
+    for slug in old_posts.keys() | new_posts.keys():
+        old, new = old_posts.get(slug), new_posts.get(slug)
+        if (old or [])[:2] != (new or [])[:2]:
+            dirty.update(entry[1] for entry in (old, new) if entry)
+    for slug, version in current['categories'].items():
+        if old_categories.get(slug) != version:
+            dirty.add(slug)
+
+    urls = [
+        f'/post/{slug}' for slug, entry in new_posts.items()
+        if entry[1] in dirty or old_posts.get(slug) != entry
+    ]
+    if dirty:
+        urls += ['/', '/blog', '/sitemap.xml']
+        urls += [f'/blog?category={slug}' for slug in current['categories'] if slug in dirty]
+        urls += [f'/sitemap-{n}.xml' for n in range(1, current['sitemap_shards'] + 1)]
+    return urls
+
+
+def export_site(app, directory, workers=None, incremental=False, log=print):
+    """Render the public site into ``directory``; returns a summary dict."""
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+
+    previous = {}
+    if incremental and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    current = _snapshot(app)
+    listings = _listing_pages(app, current['categories'])
+    current['listing_pages'] = {category: len(pages) for category, pages in listings.items()}
+
+    urls = _pages_to_render(previous, current)
+    # A listing's first page stands for all of its pages.
+    pages_by_url = {listing[0][0]: listing for listing in listings.values()}
+    pages = [page for url in urls for page in pages_by_url.get(url, [(url, output_path(url), {})])]
+
+    # Drop pages for posts and categories that are no longer published.
+    stale = [f'/post/{slug}' for slug in previous.get('posts', {}) if slug not in current['posts']]
+    stale += [
+        f'/blog?category={slug}' for slug in previous.get('categories', [])
+        if slug not in current['categories']
+    ]
+    stale += [
+        f'/sitemap-{n}.xml'
+        for n in range(current['sitemap_shards'] + 1, previous.get('sitemap_shards', 0) + 1)
+    ]
+    stale += [
+        listing_url(category, number)
+        for category, count in previous.get('listing_pages', {}).items()
+        for number in range(max(current['listing_pages'].get(category, 0), 1) + 1, count + 1)
+    ]
+    for url in stale:
+        _remove(directory, output_path(url))
+
+    log(f'Rendering {len(pages)} pages with {workers or os.cpu_count()} workers...')
+    failed = []
+    total_bytes = 0
+    if pages:
+        jobs = [(url, path, directory, links) for url, path, links in pages]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ExportConfig,)) as pool:
+            for url, status, written in pool.map(_render, jobs, chunksize=8):
+                if status != 200:
+                    failed.append((url, status))
+                    log(f'  {url}: HTTP {status}')
+                total_bytes += written
+
+    copied = _copy_static(app, directory)
+
+    if not failed:
+        with open(manifest_path, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'rendered': len(pages) - len(failed),
+        'failed': len(failed),
+        'removed': len(stale),
+        'static_files': copied,
+        'bytes': total_bytes,
+        'seconds': elapsed,
+    }
+    log(
+        f'Rendered {summary["rendered"]} pages ({summary["failed"]} failed, '
+        f'{summary["removed"]} removed), copied {copied} static files, '
+        f'{total_bytes / 1024:.0f} KiB in {elapsed:.1f}s.'
+    )
+    return summary
@@ -0,0 +1,63 @@
+import itertools
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import datagen
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+@pytest.fixture(scope='session')
+def database_factory(tmp_path_factory):
+    """``factory(count)``: path of a generated database of ``count`` posts, made once per session."""
+    paths = {}
+
+    def factory(count):
+        if count not in paths:
+            path = str(tmp_path_factory.mktemp('db') / f'posts-{count}.db')
+            paths[count] = datagen.generate(path, count, log=_quiet)
+        return paths[count]
+
+    return factory
+
+
+@pytest.fixture
+def database_copy(database_factory, tmp_path):
+    """``copy(count)``: path of a private copy of the ``count``-post database, for tests that write to it."""
+
+    copies = itertools.count()
+
+    def copy(count):
+        path = str(tmp_path / f'posts-{count}-{next(copies)}.db')
+        source, target = sqlite3.connect(database_factory(count)), sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        target.close()
+        return path
+
+    return copy
+
+
+@pytest.fixture
+def app_factory(database_factory):
+    """``factory(count, **settings)``: app over a generated database, page cache and read model off."""
+
+    def factory(count, **settings):
+        settings = {
+            'PAGE_CACHE_BACKEND': None,
+            'READ_MODEL_ENABLED': False,
+            'JINJA_BYTECODE_CACHE_DIR': None,
+            **settings,
+        }
+        return datagen.build_app(database_factory(count), **settings)
+
+    return factory
@@ -0,0 +1,57 @@
+import re
+from datetime import datetime
+
+import datagen
+from models import db, Post
+from search import MemoryBackend, search_index
+
+
+ROW_ID_RE = re.compile(r'name="rowid"[^>]* value="(\d+)"')
+
+
+def listed_ids(client, search, page=0):
+    response = client.get('/admin/post/', query_string={'search': search, 'page': page})
+    assert response.status_code == 200
+    return {int(post_id) for post_id in ROW_ID_RE.findall(response.get_data(as_text=True))}
+
+
+def all_listed_ids(client, search):
+    ids, page = set(), 0
+    while True:
+        found = listed_ids(client, search, page)
+        if not found:
+            return ids
+        ids |= found
+        page += 1
+
+
+def test_search_matches_slugs(app_factory):
+    app = app_factory(200)
+    with app.app_context():
+        expected = {post_id for (post_id,) in db.session.query(Post.id).filter(Post.slug.like('bench-post-17%'))}
+
+    assert listed_ids(app.test_client(), 'bench-post-17') == expected
+
+
+def test_search_pages_through_every_match(app_factory):
+    app = app_factory(1200)
+    with app.app_context():
+        expected = {post_id for post_id, _ in search_index.search('guide', 2000, published_only=False)}
+
+    assert len(expected) > 1000
+    assert all_listed_ids(app.test_client(), 'guide') == expected
+
+
+def test_memory_search_sees_draft_edits(database_copy, monkeypatch):
+    app = datagen.build_app(database_copy(60), PAGE_CACHE_BACKEND=None, SEARCH_BACKEND='memory')
+    monkeypatch.setattr(MemoryBackend, 'CHECK_INTERVAL', 0)
+    with app.app_context():
+        assert search_index.search('zanzibar', published_only=False) == []
+        draft = Post.query.filter_by(is_published=False).first()
+        # Saved by another process, so this worker's index only learns of it from the database.
+        db.session.execute(Post.__table__.update().where(Post.id == draft.id).values(
+            title='Zanzibar Guide', updated_date=datetime(2030, 1, 1)
+        ))
+        db.session.commit()
+
+        assert [post_id for post_id, _ in search_index.search('zanzibar', published_only=False)] == [draft.id]
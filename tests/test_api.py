@@ -0,0 +1,106 @@
+import pytest
+
+from models import Post
+
+
+@pytest.fixture
+def app(app_factory):
+    return app_factory(60)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def published_slugs(app):
+    """Published slugs, newest first, as the API lists them."""
+    with app.app_context():
+        return [slug for (slug,) in Post.query.with_entities(Post.slug).filter_by(is_published=True)
+                .order_by(Post.published_date.desc(), Post.id.desc())]
+
+
+@pytest.mark.parametrize('limit', ['abc', '2.5', '', '0', '101', '-1'])
+def test_bad_limit_is_400(client, limit):
+    response = client.get('/api/v1/posts', query_string={'limit': limit})
+
+    assert response.status_code == 400
+    assert 'limit' in response.json['error']
+
+
+def test_default_limit_is_the_page_size(app, client):
+    assert len(client.get('/api/v1/posts').json['posts']) == app.config['API_PAGE_SIZE']
+
+
+def test_fields_pick_the_keys_in_order(client):
+    response = client.get('/api/v1/posts', query_string={'fields': 'title,slug,category_name', 'limit': 3})
+
+    assert response.status_code == 200
+    assert [list(post) for post in response.json['posts']] == [['title', 'slug', 'category_name']] * 3
+
+
+@pytest.mark.parametrize('url', ['/api/v1/posts', '/api/v1/posts/bench-post-3', '/api/v1/categories'])
+def test_unknown_fields_are_400(client, url):
+    response = client.get(url, query_string={'fields': 'title,password'})
+
+    assert response.status_code == 400
+    assert 'password' in response.json['error']
+
+
+def test_slugs_keep_the_requested_order_and_report_missing(client):
+    draft = 'bench-post-49'
+    response = client.get('/api/v1/posts', query_string={
+        'slugs': 'bench-post-7,no-such-post,bench-post-2,bench-post-7,' + draft, 'fields': 'slug',
+    })
+
+    assert response.status_code == 200
+    assert response.json == {
+        'posts': [{'slug': 'bench-post-7'}, {'slug': 'bench-post-2'}],
+        'missing': ['no-such-post', draft],
+    }
+
+
+def test_cursor_pages_walk_every_post_and_back(app, client):
+    expected = published_slugs(app)
+    pages, cursor = [], None
+    while True:
+        query = {'fields': 'slug', 'limit': 7, **({'cursor': cursor} if cursor else {})}
+        body = client.get('/api/v1/posts', query_string=query).json
+        pages.append([post['slug'] for post in body['posts']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+        last = body
+
+    assert [slug for page in pages for slug in page] == expected
+    previous = client.get('/api/v1/posts', query_string={'fields': 'slug', 'limit': 7,
+                                                         'cursor': last['prev_cursor']}).json
+    assert [post['slug'] for post in previous['posts']] == pages[-3]
+
+
+def test_tampered_cursor_is_400(client):
+    cursor = client.get('/api/v1/posts', query_string={'limit': 5}).json['next_cursor']
+
+    response = client.get('/api/v1/posts', query_string={'cursor': cursor[:-2] + 'xx'})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/posts', '/api/v1/posts?category=uk', '/api/v1/posts/bench-post-3', '/api/v1/categories',
+])
+def test_matching_etag_gets_304(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+
+    again = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_unknown_post_is_404(client):
+    response = client.get('/api/v1/posts/no-such-post')
+
+    assert response.status_code == 404
+    assert response.json == {'error': 'Post not found.'}
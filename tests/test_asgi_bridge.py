@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from models import db
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+from asgi_bridge import ASGIBridge, build_environ
+
+
+def call(bridge, path, method='GET', query=b'', headers=(), body=b''):
+    """Run one request through ``bridge``; returns ``(status, headers, body)``."""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query, 'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in headers],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 5000), 'scheme': 'http', 'http_version': '1.1',
+    }
+    received = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return received.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(bridge(scope, receive, send))
+    start = sent[0]
+    assert start['type'] == 'http.response.start'
+    assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+    return start['status'], dict(start['headers']), b''.join(message.get('body', b'') for message in sent[1:])
+
+
+@pytest.fixture
+def app(app_factory):
+    return app_factory(20)
+
+
+@pytest.fixture
+def bridge(app):
+    bridge = ASGIBridge(app)
+    yield bridge
+    bridge.executor.shutdown()
+    asyncio.run(bridge.engine.dispose())
+
+
+@pytest.fixture
+def statements(app, bridge):
+    """SQL run per engine: ``{'sync': [...], 'async': [...]}``."""
+    recorded = {'sync': [], 'async': []}
+    with app.app_context():
+        engines = {'sync': db.engine, 'async': bridge.engine.sync_engine}
+    listeners = []
+    for name, engine in engines.items():
+        def record(conn, cursor, statement, *args, name=name):
+            recorded[name].append(statement)
+        event.listen(engine, 'before_cursor_execute', record)
+        listeners.append((engine, record))
+    yield recorded
+    for engine, record in listeners:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/', b''), ('/blog', b'category=uk'), ('/post/bench-post-3', b''), ('/sitemap.xml', b''), ('/api/v1/posts', b'limit=5'),
+])
+def test_public_reads_match_wsgi_and_use_the_async_engine(app, bridge, statements, path, query):
+    headers = [('Accept-Encoding', 'gzip')]
+
+    status, response_headers, body = call(bridge, path, query=query, headers=headers)
+
+    assert bridge.is_async(build_environ({'method': 'GET', 'path': path}, b''))
+    expected = app.test_client().get(path, query_string=query.decode(), headers=headers)
+    assert status == expected.status_code == 200
+    assert body == expected.get_data()
+    assert response_headers[b'etag'].decode() == expected.headers['ETag']
+    assert statements['async']
+
+
+def test_async_route_runs_no_sql_on_the_sync_engine(bridge, statements):
+    call(bridge, '/post/bench-post-3')
+
+    assert statements['async']
+    assert statements['sync'] == []
+
+
+def test_conditional_get_through_the_bridge(bridge):
+    _, headers, _ = call(bridge, '/post/bench-post-3')
+
+    status, _, body = call(bridge, '/post/bench-post-3', headers=[('If-None-Match', headers[b'etag'].decode())])
+
+    assert (status, body) == (304, b'')
+
+
+def test_other_requests_run_on_threads(app, bridge, statements):
+    assert not bridge.is_async(build_environ({'method': 'GET', 'path': '/contact'}, b''))
+    assert not bridge.is_async(build_environ({'method': 'POST', 'path': '/'}, b''))
+
+    status, _, body = call(bridge, '/about')
+
+    assert status == 200
+    assert body == app.test_client().get('/about').get_data()
+
+
+def test_unknown_path_is_404(bridge):
+    assert call(bridge, '/no-such-page')[0] == 404
+
+
+def test_build_environ_headers_and_root_path():
+    environ = build_environ({
+        'method': 'GET', 'path': '/site/blog', 'root_path': '/site', 'query_string': b'a=1',
+        'headers': [(b'accept', b'text/html'), (b'accept', b'*/*'), (b'content-type', b'text/plain')],
+    }, b'')
+
+    assert (environ['SCRIPT_NAME'], environ['PATH_INFO'], environ['QUERY_STRING']) == ('/site', '/blog', 'a=1')
+    assert environ['HTTP_ACCEPT'] == 'text/html,*/*'
+    assert environ['CONTENT_TYPE'] == 'text/plain'
+
+
+def test_lifespan(bridge):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(bridge({'type': 'lifespan'}, receive, send))
+
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
@@ -0,0 +1,97 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+import assets as assets_module
+from assets import Assets, build_assets, minify_css
+
+
+CSS = '''/* Layout */
+.card  >  .title {
+    content: "a  ;  b";
+    margin : 0 ;
+}
+''' + '.filler { color: red; }\n' * 40
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    folder = tmp_path / 'static'
+    (folder / 'css').mkdir(parents=True)
+    (folder / 'css' / 'styles.css').write_text(CSS)
+    (folder / 'robots.txt').write_text('User-agent: *\n')
+    return folder
+
+
+def make_app(static_folder):
+    app = Flask(__name__, static_folder=str(static_folder))
+    Assets(app)
+    return app
+
+
+def test_minify_css_keeps_strings():
+    assert minify_css('.a  >  .b { content: "x  ;  y" ; margin: 0 ; }') == '.a>.b{content:"x  ;  y";margin:0}'
+
+
+def test_build_fingerprints_and_precompresses(static_folder):
+    manifest = build_assets(str(static_folder), log=lambda *a: None)
+
+    hashed = manifest['css/styles.css']
+    assert hashed.startswith('css/styles.') and hashed.endswith('.css') and hashed != 'css/styles.css'
+    assert 'robots.txt' not in manifest
+    dist = static_folder / 'dist'
+    body = (dist / hashed).read_bytes()
+    assert body == minify_css(CSS).encode()
+    assert gzip.decompress((dist / f'{hashed}.gz').read_bytes()) == body
+    if assets_module.brotli is not None:
+        assert assets_module.brotli.decompress((dist / f'{hashed}.br').read_bytes()) == body
+    assert json.loads((dist / 'manifest.json').read_text()) == manifest
+
+
+def test_rebuild_keeps_earlier_builds(static_folder):
+    first = build_assets(str(static_folder), log=lambda *a: None)['css/styles.css']
+    (static_folder / 'css' / 'styles.css').write_text(CSS + '.new { color: blue; }\n')
+
+    second = build_assets(str(static_folder), log=lambda *a: None)['css/styles.css']
+
+    assert second != first
+    assert (static_folder / 'dist' / first).exists()
+
+
+def test_asset_url_falls_back_without_a_build(static_folder):
+    app = make_app(static_folder)
+
+    with app.test_request_context():
+        assert app.jinja_env.globals['asset_url']('css/styles.css') == '/static/css/styles.css'
+
+
+def test_hashed_asset_is_immutable_and_precompressed(static_folder):
+    build_assets(str(static_folder), log=lambda *a: None)
+    app = make_app(static_folder)
+    with app.test_request_context():
+        url = app.jinja_env.globals['asset_url']('css/styles.css')
+    assert url.startswith('/static/dist/css/styles.')
+    client = app.test_client()
+
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    packed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert plain.status_code == packed.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(packed.data) == plain.data
+    assert packed.headers['Content-Type'].startswith('text/css')
+    for response in (plain, packed):
+        cache_control = response.cache_control
+        assert cache_control.max_age == assets_module.IMMUTABLE_MAX_AGE
+        assert cache_control.public and cache_control.immutable
+        assert 'Accept-Encoding' in response.vary
+
+
+@pytest.mark.parametrize('path', ['manifest.json', 'css/missing.css', '../robots.txt'])
+def test_unknown_or_private_dist_paths_are_404(static_folder, path):
+    build_assets(str(static_folder), log=lambda *a: None)
+
+    assert make_app(static_folder).test_client().get(f'/static/dist/{path}').status_code == 404
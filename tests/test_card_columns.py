@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import event
+
+from models import db
+
+
+BODY_COLUMNS = ('post.content', 'post.rendered_content', 'post.toc')
+
+
+def selected_columns(app, url):
+    """Status of ``url`` and the SQL statements its request ran."""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(url)
+        response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return response.status_code, statements
+
+
+@pytest.mark.parametrize('url', [
+    '/', '/blog', '/blog?category=uk', '/search?q=guide', '/post/bench-post-3', '/admin/post/',
+])
+def test_listings_leave_post_bodies_unloaded(app_factory, url):
+    status, statements = selected_columns(app_factory(60), url)
+
+    assert status == 200
+    bodies = [statement for statement in statements if any(column in statement for column in BODY_COLUMNS)]
+    if url.startswith('/post/'):
+        # Only the post itself; its related cards stay light.
+        assert len(bodies) == 1
+    else:
+        assert bodies == []
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+import datagen
+from models import db, Post
+
+
+URLS = ['/', '/blog', '/blog?category=uk', '/post/bench-post-3', '/sitemap.xml']
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_matching_etag_gets_304(app_factory, url):
+    client = app_factory(20).test_client()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == response.headers['ETag']
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_unchanged_since_last_modified_gets_304(app_factory, url):
+    client = app_factory(20).test_client()
+    response = client.get(url)
+
+    again = client.get(url, headers={'If-Modified-Since': response.headers['Last-Modified']})
+
+    assert again.status_code == 304
+
+
+def test_editing_a_post_changes_its_etag(database_copy):
+    app = datagen.build_app(database_copy(20), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False)
+    client = app.test_client()
+    etag = client.get('/post/bench-post-3').headers['ETag']
+    with app.app_context():
+        db.session.execute(update(Post).where(Post.slug == 'bench-post-3').values(updated_date=datetime(2030, 1, 1)))
+        db.session.commit()
+
+    response = client.get('/post/bench-post-3', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_missing_post_is_404_without_validators(app_factory):
+    response = app_factory(20).test_client().get('/post/no-such-post')
+
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
@@ -0,0 +1,193 @@
+import email
+import socketserver
+import threading
+import time
+
+import pytest
+
+import datagen
+from contact import contact_pipeline
+from jobs import jobs
+from models import db, ContactMessage
+from ratelimit import TokenBucket
+
+
+FORM = {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'question', 'message': 'Is the ferry running?'}
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of SMTP for smtplib.send_message(); refuses mail while ``server.failing``."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost stand-in')
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            verb = line[:4].upper()
+            if not line or verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL' and self.server.failing:
+                self.reply('451 try again later')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                lines = []
+                while (data := self.rfile.readline()) not in (b'.\r\n', b''):
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.messages.append(email.message_from_bytes(b''.join(lines)))
+                self.reply('250 queued')
+            else:
+                self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages, server.failing = [], False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def build(database_copy, smtp_server, tmp_path):
+    def build(**settings):
+        settings = {
+            'PAGE_CACHE_BACKEND': None,
+            'READ_MODEL_ENABLED': False,
+            'JINJA_BYTECODE_CACHE_DIR': None,
+            'MAIL_SERVER': '127.0.0.1',
+            'MAIL_PORT': smtp_server.server_address[1],
+            'MAIL_USE_TLS': False,
+            'JOBS_BACKEND': 'sqlite',
+            'JOBS_DB_PATH': str(tmp_path / 'jobs.db'),
+            'JOBS_MAX_ATTEMPTS': 3,
+            **settings,
+        }
+        return datagen.build_app(database_copy(20), **settings)
+    return build
+
+
+def messages(app):
+    with app.app_context():
+        return db.session.query(ContactMessage.status, ContactMessage.attempts, ContactMessage.last_error).all()
+
+
+def test_submission_is_queued_then_delivered(build, smtp_server):
+    app = build()
+
+    response = app.test_client().post('/contact', data=FORM)
+
+    assert response.status_code == 302
+    assert [status for status, _, _ in messages(app)] == ['pending']
+    assert smtp_server.messages == []
+
+    jobs.backend.work(app, once=True, log=lambda *a: None)
+
+    assert messages(app) == [('sent', 1, None)]
+    sent, = smtp_server.messages
+    assert sent['To'] == app.config['CONTACT_EMAIL']
+    assert sent['Reply-To'] == 'Ada <ada@example.com>'
+    assert 'Question about a guide' in sent['Subject']
+    assert 'Is the ferry running?' in sent.get_payload()
+
+
+def test_rate_limited_submission_gets_429(build):
+    app = build(CONTACT_RATE_LIMIT_BURST=2)
+    client = app.test_client()
+
+    statuses = [client.post('/contact', data=FORM).status_code for _ in range(3)]
+
+    assert statuses == [302, 302, 429]
+    refused = client.post('/contact', data=FORM)
+    assert int(refused.headers['Retry-After']) > 0
+    assert len(messages(app)) == 2
+
+
+def test_zero_rate_limit_turns_it_off(build):
+    app = build(CONTACT_RATE_LIMIT_PER_HOUR=0, CONTACT_RATE_LIMIT_BURST=1)
+    client = app.test_client()
+
+    assert contact_pipeline.limiter is None
+    assert {client.post('/contact', data=FORM).status_code for _ in range(5)} == {302}
+    with pytest.raises(ValueError):
+        TokenBucket(0, 1)
+
+
+def test_failed_delivery_is_retried_after_a_backoff(build, smtp_server):
+    app = build(JOBS_BACKOFF_SECONDS=30)
+    app.test_client().post('/contact', data=FORM)
+    smtp_server.failing = True
+
+    started = time.time()
+    jobs.backend.work(app, once=True, log=lambda *a: None)
+
+    (status, attempts, error), = messages(app)
+    assert (status, attempts) == ('pending', 1)
+    assert '451' in error
+    assert jobs.backend.counts() == {'queued': 1}
+    with jobs.backend._connect() as conn:
+        run_at, = conn.execute('SELECT run_at FROM job').fetchone()
+    assert run_at >= started + 30
+
+
+def test_delivery_recovers_on_a_later_attempt(build, smtp_server):
+    app = build(JOBS_BACKOFF_SECONDS=0)
+    app.test_client().post('/contact', data=FORM)
+    smtp_server.failing = True
+
+    def recover(line):
+        # Logged after each attempt: the server accepts mail from the second on.
+        smtp_server.failing = False
+
+    jobs.backend.work(app, once=True, log=recover)
+
+    assert messages(app) == [('sent', 2, None)]
+    assert len(smtp_server.messages) == 1
+    assert jobs.backend.counts() == {}
+
+
+def test_message_is_failed_and_job_dead_after_the_last_attempt(build, smtp_server):
+    app = build(JOBS_BACKOFF_SECONDS=0)
+    app.test_client().post('/contact', data=FORM)
+    smtp_server.failing = True
+
+    jobs.backend.work(app, once=True, log=lambda *a: None)
+
+    (status, attempts, error), = messages(app)
+    assert (status, attempts) == ('failed', 3)
+    assert '451' in error
+    assert jobs.backend.counts() == {'dead': 1}
+
+
+def test_thread_backend_retry_does_not_hold_a_thread(build, monkeypatch):
+    app = build(JOBS_BACKEND='thread', JOBS_THREADS=1, JOBS_BACKOFF_SECONDS=0.3)
+    events = []
+    done = threading.Event()
+
+    def flaky(attempt, final):
+        events.append(('flaky', attempt))
+        if attempt == 1:
+            raise RuntimeError('not yet')
+        done.set()
+
+    def quick(attempt, final):
+        events.append(('quick', attempt))
+
+    monkeypatch.setitem(jobs.tasks, 'flaky', flaky)
+    monkeypatch.setitem(jobs.tasks, 'quick', quick)
+
+    with app.app_context():
+        jobs.enqueue('flaky')
+        time.sleep(0.05)
+        jobs.enqueue('quick')
+
+    assert done.wait(5)
+    assert events == [('flaky', 1), ('quick', 1), ('flaky', 2)]
@@ -0,0 +1,107 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from sqlalchemy import text
+
+import datagen
+from database import engine_options, engine_profile, sqlite_pragmas
+from models import db, Post
+
+
+def settings_app(**config):
+    return SimpleNamespace(config={'SQLALCHEMY_DATABASE_URI': 'sqlite:///posts.db', **config})
+
+
+@pytest.mark.parametrize('uri, profile, expected', [
+    ('sqlite:///posts.db', 'auto', 'sqlite'),
+    ('postgresql://u@db/posts', 'auto', 'postgres'),
+    ('mysql://u@db/posts', 'auto', None),
+    ('sqlite:///posts.db', 'postgres', 'postgres'),
+    ('postgresql://u@db/posts', 'none', None),
+])
+def test_engine_profile(uri, profile, expected):
+    assert engine_profile(settings_app(SQLALCHEMY_DATABASE_URI=uri, DATABASE_PROFILE=profile)) == expected
+
+
+def test_unknown_engine_profile_is_rejected():
+    with pytest.raises(ValueError):
+        engine_profile(settings_app(DATABASE_PROFILE='oracle'))
+
+
+def test_postgres_engine_options():
+    options = engine_options('postgres', {'DB_POOL_SIZE': 4, 'DB_STATEMENT_TIMEOUT_MS': 2500})
+
+    assert options['pool_size'] == 4
+    assert options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': '-c statement_timeout=2500'}
+    assert engine_options('sqlite', {}) == {}
+
+
+def test_in_memory_sqlite_skips_wal():
+    assert not any('journal_mode' in pragma for pragma in sqlite_pragmas({}, 'sqlite://'))
+    assert 'PRAGMA journal_mode = WAL' in sqlite_pragmas({}, 'sqlite:///posts.db')
+
+
+def test_sqlite_connections_get_the_profile_pragmas(app_factory):
+    app = app_factory(20, SQLITE_CACHE_SIZE_KB=4096)
+
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1
+        assert db.session.execute(text('PRAGMA cache_size')).scalar() == -4096
+
+
+@pytest.fixture
+def replicated(database_copy):
+    """App whose replica differs from its primary in the title of bench-post-3."""
+    primary, replica = database_copy(20), database_copy(20)
+    connection = sqlite3.connect(replica)
+    connection.execute("UPDATE post SET title = 'Replica Title' WHERE slug = 'bench-post-3'")
+    connection.commit()
+    connection.close()
+    app = datagen.build_app(primary, PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False,
+                            JINJA_BYTECODE_CACHE_DIR=None, DATABASE_REPLICA_URL='sqlite:///' + replica)
+    return app, replica
+
+
+def title_in(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT title FROM post WHERE slug = 'bench-post-3'").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_read_replica_views_read_from_the_replica(replicated):
+    app, _ = replicated
+
+    response = app.test_client().get('/post/bench-post-3')
+
+    assert response.status_code == 200
+    assert b'Replica Title' in response.data
+
+
+def test_only_marked_requests_read_from_the_replica(replicated):
+    app, _ = replicated
+
+    with app.test_request_context('/'):
+        assert db.session.query(Post.title).filter_by(slug='bench-post-3').scalar() != 'Replica Title'
+        db.session.remove()
+        g.read_replica = True
+        assert db.session.query(Post.title).filter_by(slug='bench-post-3').scalar() == 'Replica Title'
+
+
+def test_writes_in_a_replica_request_go_to_the_primary(replicated):
+    app, replica = replicated
+
+    with app.test_request_context('/'):
+        g.read_replica = True
+        post = Post.query.filter_by(slug='bench-post-3').one()
+        post.title = 'Edited Title'
+        db.session.commit()
+        primary = db.engines[None].url.database
+
+    assert title_in(primary) == 'Edited Title'
+    assert title_in(replica) == 'Replica Title'
@@ -0,0 +1,74 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from flask import render_template_string
+
+import datagen
+from models import Post
+
+
+@pytest.fixture
+def app(database_copy):
+    path = database_copy(20)
+    app = datagen.build_app(path, PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False, JINJA_BYTECODE_CACHE_DIR=None)
+    app.database_path = path
+    with app.app_context():
+        app.newest = Post.recent(1)[0].id
+    return app
+
+
+def set_columns(app, post_id, **values):
+    """Write ``values`` behind the ORM's back, so updated_date only changes when given."""
+    connection = sqlite3.connect(app.database_path)
+    assignments = ', '.join(f'{name} = ?' for name in values)
+    connection.execute(f'UPDATE post SET {assignments} WHERE id = ?', (*values.values(), post_id))
+    connection.commit()
+    connection.close()
+
+
+def test_cache_block_renders_once_per_key(app):
+    calls = []
+    template = "{% cache 'test', key %}{{ count() }}{% endcache %}"
+
+    def count():
+        calls.append(1)
+        return len(calls)
+
+    with app.test_request_context():
+        rendered = [render_template_string(template, key=key, count=count) for key in (1, 1, 2, (3, [4]), (3, [4]))]
+
+    assert rendered == ['1', '1', '2', '3', '3']
+
+
+def test_disabled_cache_renders_every_time(database_copy):
+    app = datagen.build_app(database_copy(20), FRAGMENT_CACHE_MAX_ENTRIES=0, PAGE_CACHE_BACKEND=None,
+                            READ_MODEL_ENABLED=False, JINJA_BYTECODE_CACHE_DIR=None)
+    calls = []
+
+    with app.test_request_context():
+        for _ in range(2):
+            render_template_string("{% cache 'test', 1 %}{{ count() }}{% endcache %}", count=lambda: calls.append(1))
+
+    assert len(calls) == 2
+
+
+def test_card_is_reused_until_its_key_changes(app):
+    client = app.test_client()
+    client.get('/')
+
+    set_columns(app, app.newest, title='Retitled Without A Save')
+    assert b'Retitled Without A Save' not in client.get('/').data
+
+    set_columns(app, app.newest, updated_date=datetime(2030, 1, 1).isoformat(' '))
+    assert b'Retitled Without A Save' in client.get('/').data
+
+
+def test_card_misses_when_read_time_changes(app):
+    client = app.test_client()
+    client.get('/')
+
+    set_columns(app, app.newest, read_time='97 min read')
+
+    assert b'97 min read' in client.get('/').data
+
@@ -0,0 +1,77 @@
+import pytest
+
+import datagen
+import importer
+from models import db, Post
+
+
+ARTICLE = '''<html><head><meta name="description" content="{title} in brief"></head>
+<body><h1 class="article__title">{title}</h1>
+<div class="article__content"><p>{title} in full.</p></div></body></html>'''
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+@pytest.fixture
+def app(database_copy):
+    return datagen.build_app(database_copy(20), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False,
+                             JINJA_BYTECODE_CACHE_DIR=None)
+
+
+def write_article(directory, slug, title):
+    (directory / f'{slug}.html').write_text(ARTICLE.format(title=title))
+
+
+def run_import(app, directory, **kwargs):
+    with app.app_context():
+        return importer.import_posts(str(directory), {}, 'uk', workers=1, log=_quiet, **kwargs)
+
+
+def post_row(app, slug):
+    with app.app_context():
+        return db.session.query(Post.title, Post.content, Post.source_hash, Post.updated_date) \
+            .filter_by(slug=slug).one()
+
+
+def test_post_without_a_hash_is_not_overwritten(app, tmp_path):
+    before = post_row(app, 'bench-post-3')
+    assert before.source_hash is None
+    write_article(tmp_path, 'bench-post-3', 'Imported Title')
+
+    summary = run_import(app, tmp_path)
+
+    after = post_row(app, 'bench-post-3')
+    assert (summary['adopted'], summary['updated']) == (1, 0)
+    assert (after.title, after.content, after.updated_date) == (before.title, before.content, before.updated_date)
+    assert after.source_hash is not None
+
+    assert run_import(app, tmp_path)['unchanged'] == 1
+
+
+def test_changed_file_overwrites_a_hashed_post(app, tmp_path):
+    write_article(tmp_path, 'bench-post-3', 'Imported Title')
+    run_import(app, tmp_path)
+    write_article(tmp_path, 'bench-post-3', 'Revised Title')
+
+    summary = run_import(app, tmp_path)
+
+    assert summary['updated'] == 1
+    assert post_row(app, 'bench-post-3').title == 'Revised Title'
+
+
+def test_force_overwrites_a_post_without_a_hash(app, tmp_path):
+    write_article(tmp_path, 'bench-post-3', 'Imported Title')
+
+    summary = run_import(app, tmp_path, force=True)
+
+    assert summary['updated'] == 1
+    assert post_row(app, 'bench-post-3').title == 'Imported Title'
+
+
+def test_new_file_creates_a_post(app, tmp_path):
+    write_article(tmp_path, 'brand-new-guide', 'Brand New Guide')
+
+    assert run_import(app, tmp_path)['created'] == 1
+    assert post_row(app, 'brand-new-guide').title == 'Brand New Guide'
@@ -0,0 +1,32 @@
+import pytest
+from flask import render_template_string
+from sqlalchemy import text, update
+
+from models import db, Post
+
+
+GUARDED = {'LAZY_LOAD_GUARD': True, 'LAZY_LOAD_RAISE': True}
+
+
+@pytest.mark.parametrize('url', ['/', '/blog', '/blog?category=uk', '/post/bench-post-3', '/search?q=visa'])
+def test_public_views_eager_load_what_they_render(app_factory, url):
+    app = app_factory(20, **GUARDED)
+
+    assert app.test_client().get(url).status_code == 200
+
+
+def test_lazy_load_while_rendering_raises(app_factory):
+    app = app_factory(20, **GUARDED)
+    with app.test_request_context():
+        post = Post.query.first()
+
+        with pytest.raises(RuntimeError, match='Post relationship while rendering'):
+            render_template_string('{{ post.category.name }}', post=post)
+
+
+def test_statements_without_load_options_pass_the_guard(app_factory):
+    app = app_factory(20, **GUARDED)
+    with app.test_request_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.execute(update(Post).where(Post.id == -1).values(title='x'))
+        db.session.rollback()
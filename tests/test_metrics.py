@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from metrics import metrics
+
+
+@pytest.fixture
+def metrics_dir(monkeypatch, tmp_path):
+    # share() sets up the module-level extension; undo it after each test.
+    monkeypatch.setattr(metrics, 'directory', None)
+    return tmp_path / 'metrics'
+
+
+def test_metrics_needs_an_allowed_address_or_the_token(app_factory):
+    client = app_factory(20, METRICS_ALLOWED_IPS=['10.0.0.0/8'], METRICS_TOKEN='secret').test_client()
+
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 200
+
+
+def test_only_shared_servers_write_counter_files(app_factory, metrics_dir):
+    app = app_factory(20, METRICS_DIR=str(metrics_dir))
+    client = app.test_client()
+
+    client.get('/')
+    assert not metrics_dir.exists()
+
+    metrics.share(app)
+    client.get('/')
+    assert [path.name.split('-')[1] for path in metrics_dir.iterdir()] == [str(os.getpid())]
+
+
+def test_share_drops_files_of_exited_processes(app_factory, metrics_dir):
+    app = app_factory(20, METRICS_DIR=str(metrics_dir))
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    metrics_dir.mkdir()
+    for pid in (exited.pid, os.getpid()):
+        (metrics_dir / f'metrics-{pid}-1.json').write_text('[]')
+
+    metrics.share(app)
+
+    assert [path.name for path in metrics_dir.iterdir()] == [f'metrics-{os.getpid()}-1.json']
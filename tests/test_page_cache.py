@@ -0,0 +1,72 @@
+"""Invalidations must reach the pages every worker holds, not only their own."""
+
+from contextlib import contextmanager
+
+import pytest
+
+from caching import page_cache
+from models import db, Post
+
+
+class Worker:
+    """An app with the page cache backend it was initialised with.
+
+    page_cache is a module singleton, so the backend is swapped in around
+    each use to stand in for a separate gunicorn worker process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.backend = page_cache.backend
+
+    @contextmanager
+    def active(self):
+        previous, page_cache.backend = page_cache.backend, self.backend
+        try:
+            yield self.app
+        finally:
+            page_cache.backend = previous
+
+    def get(self, url):
+        with self.active() as app:
+            return app.test_client().get(url)
+
+
+@pytest.fixture(params=['lru', 'filesystem'])
+def workers(request, app_factory, tmp_path):
+    settings = {'PAGE_CACHE_BACKEND': request.param, 'PAGE_CACHE_DIR': str(tmp_path / 'page_cache')}
+    return Worker(app_factory(20, **settings)), Worker(app_factory(20, **settings))
+
+
+def set_title(app, slug, title):
+    with app.app_context():
+        post = Post.query.filter_by(slug=slug).one()
+        previous, post.title = post.title, title
+        db.session.commit()
+        page_cache.invalidate(f'post:{slug}')
+    return previous
+
+
+def test_invalidation_reaches_other_worker(workers):
+    editor, other = workers
+    assert other.get('/post/bench-post-3').headers['X-Cache'] == 'MISS'
+    assert other.get('/post/bench-post-3').headers['X-Cache'] == 'HIT'
+
+    with editor.active() as app:
+        title = set_title(app, 'bench-post-3', 'Edited Title')
+    try:
+        response = other.get('/post/bench-post-3')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert b'Edited Title' in response.data
+    finally:
+        with editor.active() as app:
+            set_title(app, 'bench-post-3', title)
+
+
+def test_clear_reaches_other_worker(workers):
+    editor, other = workers
+    other.get('/blog')
+    assert other.get('/blog').headers['X-Cache'] == 'HIT'
+    with editor.active():
+        page_cache.clear()
+    assert other.get('/blog').headers['X-Cache'] == 'MISS'
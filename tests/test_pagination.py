@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+import datagen
+from models import db, Category, Post
+from pagination import InvalidCursor, encode_cursor
+from readmodel import Snapshot, read_model
+
+
+PER_PAGE = 7
+
+
+@pytest.fixture
+def app(database_copy):
+    """60 posts, half of them published at one shared instant so the id breaks the ties."""
+    app = datagen.build_app(database_copy(60), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=True)
+    with app.app_context():
+        db.session.execute(update(Post).where(Post.id % 2 == 0).values(published_date=datetime(2024, 6, 1)))
+        db.session.commit()
+    return app
+
+
+def expected_ids(category=None):
+    """Published post ids in listing order, sorted in Python."""
+    query = db.session.query(Post.id, Post.published_date, Category.display_order, Category.id).join(
+        Post.category
+    ).filter(Post.is_published == True)
+    if category:
+        query = query.filter(Category.slug == category)
+        key = lambda row: (-row[1].timestamp(), -row[0])
+    else:
+        key = lambda row: (row[2] or 0, row[3], -row[1].timestamp(), -row[0])
+    return [row[0] for row in sorted(query, key=key)]
+
+
+def page_ids(posts_by_category):
+    return [post.id for posts in posts_by_category.values() for post in posts]
+
+
+def walk(source, category):
+    """``[(ids, next_cursor, prev_cursor)]`` of every page, following the next cursors."""
+    pages, cursor = [], None
+    while True:
+        posts_by_category, next_cursor, prev_cursor = source.blog_page(category, cursor, PER_PAGE)
+        pages.append((page_ids(posts_by_category), next_cursor, prev_cursor))
+        if next_cursor is None:
+            return pages
+        cursor = next_cursor
+
+
+@pytest.mark.parametrize('category', [None, 'uk'])
+def test_walk_forward_and_back_across_ties(app, category):
+    with app.test_request_context():
+        pages = walk(Post, category)
+        assert [post_id for ids, _, _ in pages for post_id in ids] == expected_ids(category)
+        assert pages[0][2] is None
+        assert all(len(ids) == PER_PAGE for ids, _, _ in pages[:-1])
+
+        backwards, cursor = [], pages[-1][2]
+        while cursor is not None:
+            posts_by_category, next_cursor, cursor = Post.blog_page(category, cursor, PER_PAGE)
+            backwards.append(page_ids(posts_by_category))
+            assert next_cursor is not None
+        assert backwards == [ids for ids, _, _ in reversed(pages[:-1])]
+
+
+@pytest.mark.parametrize('category', [None, 'uk'])
+def test_read_model_pages_match_sql(app, category):
+    read_model.warm(app)
+    with app.test_request_context():
+        snapshot = read_model.source()
+        assert isinstance(snapshot, Snapshot)
+
+        assert walk(snapshot, category) == walk(Post, category)
+
+
+def test_tampered_cursor_is_rejected(app):
+    client = app.test_client()
+    with app.test_request_context():
+        _, next_cursor, _ = Post.blog_page(None, None, PER_PAGE)
+    tampered = next_cursor[:-2] + ('AA' if not next_cursor.endswith('AA') else 'BB')
+
+    with app.test_request_context(), pytest.raises(InvalidCursor):
+        Post.blog_page(None, tampered, PER_PAGE)
+    assert client.get('/blog', query_string={'cursor': tampered}).status_code == 400
+
+
+def test_cursor_from_another_listing_is_rejected(app):
+    client = app.test_client()
+    with app.test_request_context():
+        _, uk_cursor, _ = Post.blog_page('uk', None, 2)
+        forged = encode_cursor('blog:canada', [datetime(2024, 6, 1)])
+
+    assert client.get('/blog', query_string={'category': 'uk', 'cursor': uk_cursor}).status_code == 200
+    assert client.get('/blog', query_string={'category': 'canada', 'cursor': uk_cursor}).status_code == 400
+    assert client.get('/blog', query_string={'cursor': uk_cursor}).status_code == 400
+    # Right scope, wrong number of key values.
+    assert client.get('/blog', query_string={'category': 'canada', 'cursor': forged}).status_code == 400
@@ -0,0 +1,77 @@
+"""Query counts of the public views must not grow with the number of posts or categories."""
+
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+import datagen
+from models import db
+
+
+# Upper bound on statements per page, validators included.
+MAX_QUERIES = 4
+
+
+def count_queries(app, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, url
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', ['/', '/blog', '/blog?category=uk', '/post/bench-post-3'])
+def test_query_count_is_constant(app_factory, url):
+    small = count_queries(app_factory(20), url)
+    large = count_queries(app_factory(200), url)
+    assert small == large
+    assert large <= MAX_QUERIES
+
+
+def add_categories(path, count):
+    """Give the database ``count`` more categories, each holding copies of two posts."""
+    connection = sqlite3.connect(path)
+    with connection:
+        category_columns = [row[1] for row in connection.execute('PRAGMA table_info(category)') if row[1] != 'id']
+        post_columns = [row[1] for row in connection.execute('PRAGMA table_info(post)') if row[1] != 'id']
+        for n in range(count):
+            copied = [
+                {'name': f"'Extra {n}'", 'slug': f"'extra-{n}'", 'display_order': str(100 + n)}.get(column, column)
+                for column in category_columns
+            ]
+            category_id = connection.execute(
+                f'INSERT INTO category ({", ".join(category_columns)}) '
+                f'SELECT {", ".join(copied)} FROM category ORDER BY id LIMIT 1'
+            ).lastrowid
+            copied = [
+                {'slug': f"slug || '-extra-{n}'", 'category_id': str(category_id)}.get(column, column)
+                for column in post_columns
+            ]
+            connection.execute(
+                f'INSERT INTO post ({", ".join(post_columns)}) '
+                f'SELECT {", ".join(copied)} FROM post WHERE is_published = 1 ORDER BY id LIMIT 2'
+            )
+    connection.close()
+
+
+@pytest.mark.parametrize('url', ['/', '/blog', '/blog?category=extra-0'])
+def test_query_count_ignores_category_count(database_copy, url):
+    counts = []
+    for extra in (1, 30):
+        path = database_copy(20)
+        add_categories(path, extra)
+        app = datagen.build_app(path, PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False,
+                                JINJA_BYTECODE_CACHE_DIR=None, BLOG_PAGE_SIZE=200)
+        counts.append(count_queries(app, url))
+    assert counts[0] == counts[1]
+    assert counts[1] <= MAX_QUERIES
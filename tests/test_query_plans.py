@@ -0,0 +1,75 @@
+"""The public listing queries must be answered from the composite Post indexes."""
+
+from sqlalchemy import event
+
+from models import db, Post
+
+
+def query_plans(app, query):
+    """EXPLAIN QUERY PLAN details of every statement ``query()`` runs."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.test_request_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            query()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        connection = db.session.connection()
+        return [
+            [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            for statement, parameters in statements
+        ]
+
+
+def assert_uses_index(plans, index):
+    assert plans
+    for plan in plans:
+        details = ' | '.join(plan)
+        assert f'USING INDEX {index}' in details or f'USING COVERING INDEX {index}' in details, details
+        assert 'SCAN post' not in details, details
+
+
+def test_published_listing_uses_index(app_factory):
+    assert_uses_index(query_plans(app_factory(200), lambda: Post.recent(9)), 'ix_post_published_date')
+
+
+def test_featured_listing_uses_index(app_factory):
+    assert_uses_index(query_plans(app_factory(200), lambda: Post.featured(6)), 'ix_post_featured_date')
+
+
+def test_category_listing_uses_index(app_factory):
+    assert_uses_index(query_plans(app_factory(200), lambda: Post.blog_page('uk')), 'ix_post_category_date')
+
+
+def blog_pages(depth):
+    """Post.blog_page() for the first page, then ``depth`` pages further on."""
+    def run():
+        cursor = None
+        for _ in range(depth + 1):
+            _, cursor, _ = Post.blog_page(cursor=cursor, per_page=10)
+    return run
+
+
+def test_blog_listing_is_not_sorted(app_factory):
+    plans = query_plans(app_factory(200), blog_pages(depth=5))
+    assert len(plans) == 6
+    for plan in plans:
+        details = ' | '.join(plan)
+        assert 'TEMP B-TREE' not in details, details
+        assert 'ix_category_listing_order' in details, details
+        assert 'ix_post_category_date' in details, details
+
+
+def test_category_pages_seek_to_cursor(app_factory):
+    def run():
+        _, cursor, _ = Post.blog_page('uk', per_page=3)
+        Post.blog_page('uk', cursor, per_page=3)
+
+    plans = query_plans(app_factory(200), run)
+    details = ' | '.join(plans[-1])
+    assert 'TEMP B-TREE' not in details, details
+    assert 'ix_post_category_date (category_id=? AND is_published=? AND published_date<?)' in details, details
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+from sqlalchemy import event
+from werkzeug.exceptions import NotFound
+
+import datagen
+from models import db, Post
+from readmodel import Snapshot, read_model
+
+
+DRAFT = f'bench-post-{datagen.DRAFT_EVERY - 1}'
+
+
+@pytest.fixture
+def app(database_copy, tmp_path):
+    app = datagen.build_app(database_copy(60), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=True,
+                            JINJA_BYTECODE_CACHE_DIR=None, READ_MODEL_VERSION_FILE=str(tmp_path / 'version'))
+    read_model.warm(app)
+    return app
+
+
+def ids(posts):
+    return [post.id for post in posts]
+
+
+def blog_ids(source, category_slug=None):
+    posts_by_category, next_cursor, _ = source.blog_page(category_slug, per_page=10)
+    return [ids(posts) for posts in posts_by_category.values()], next_cursor
+
+
+def test_snapshot_answers_like_sql(app):
+    with app.test_request_context('/'):
+        snapshot = read_model.source()
+        assert isinstance(snapshot, Snapshot)
+
+        assert ids(snapshot.featured(6)) == ids(Post.featured(6))
+        assert ids(snapshot.recent(9)) == ids(Post.recent(9))
+        assert blog_ids(snapshot) == blog_ids(Post)
+        assert blog_ids(snapshot, 'uk') == blog_ids(Post, 'uk')
+        assert snapshot.published_count() == Post.published_count()
+        assert snapshot.content_version() == Post.content_version()
+        assert snapshot.slug_version('bench-post-3') == Post.slug_version('bench-post-3')
+        post = snapshot.by_slug('bench-post-3')
+        assert ids(snapshot.related_to(post, 3)) == ids(Post.related_to(Post.by_slug('bench-post-3'), 3))
+        html, toc, read_time = post.rendered()
+        assert (html, [list(entry) for entry in toc], read_time) == Post.by_slug('bench-post-3').rendered()
+
+
+def test_drafts_are_not_in_the_snapshot(app):
+    with app.test_request_context('/'):
+        with pytest.raises(NotFound):
+            read_model.source().by_slug(DRAFT)
+
+
+@pytest.mark.parametrize('url', ['/', '/blog', '/blog?category=uk', '/post/bench-post-3', '/sitemap.xml'])
+def test_pages_match_sql_and_run_no_queries(app, app_factory, url):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        from_snapshot = app.test_client().get(url)
+        # Sitemaps stream, so their queries run while the body is read.
+        body = from_snapshot.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    from_sql = app_factory(60).test_client().get(url)
+    assert from_snapshot.status_code == from_sql.status_code == 200
+    assert body == from_sql.get_data()
+    assert from_snapshot.headers['ETag'] == from_sql.headers['ETag']
+    assert statements == []
+
+
+def test_invalidate_falls_back_to_sql_then_rebuilds(app):
+    with app.app_context():
+        post = Post.query.filter_by(slug='bench-post-3').one()
+        post.title = 'Freshly Edited'
+        db.session.commit()
+        read_model.invalidate()
+
+    with app.test_request_context('/'):
+        assert read_model.source() is Post
+
+    deadline = time.monotonic() + 5
+    while True:
+        with app.test_request_context('/'):
+            source = read_model.source()
+        if isinstance(source, Snapshot) or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+
+    assert isinstance(source, Snapshot)
+    assert source.by_slug('bench-post-3').title == 'Freshly Edited'
+
+
+def test_sites_past_max_posts_use_sql(database_copy):
+    app = datagen.build_app(database_copy(60), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=True,
+                            JINJA_BYTECODE_CACHE_DIR=None, READ_MODEL_MAX_POSTS=10)
+    read_model.warm(app)
+
+    with app.test_request_context('/'):
+        assert read_model.source() is Post
+    assert app.test_client().get('/post/bench-post-3').status_code == 200
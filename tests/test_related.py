@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import update
+
+import datagen
+import related
+from jobs import jobs
+from models import db, Post, RelatedPost
+
+
+# The synthetic posts share one small vocabulary, so these get a few words of their own.
+TRIO = [1, 2, 3]
+
+
+def build_app(database_copy, titles, **settings):
+    """App over a 60-post copy with ``{post_id: title}`` applied and related posts rebuilt."""
+    app = datagen.build_app(
+        database_copy(60), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False, JINJA_BYTECODE_CACHE_DIR=None,
+        **settings
+    )
+    with app.app_context():
+        for post_id, title in titles.items():
+            set_title(post_id, title)
+        related.rebuild(app.config['RELATED_POSTS_K'])
+    return app
+
+
+def set_title(post_id, title):
+    db.session.execute(update(Post).where(Post.id == post_id).values(title=title))
+    db.session.commit()
+
+
+@pytest.fixture
+def app(database_copy, monkeypatch):
+    app = build_app(database_copy, {post_id: 'Zanzibar Ferry Permit' for post_id in TRIO})
+    app.queued = []
+    monkeypatch.setattr(jobs, 'enqueue', lambda name, **kwargs: app.queued.append((name, kwargs)))
+    return app
+
+
+def neighbours(app, post_id):
+    with app.app_context():
+        return {related_id for (related_id,) in db.session.query(RelatedPost.related_id).filter_by(post_id=post_id)}
+
+
+def test_save_queues_the_related_update(app):
+    with app.app_context():
+        post = db.session.get(Post, 4)
+        data = {
+            'title': 'Zanzibar Ferry Permit', 'slug': post.slug, 'category_id': post.category_id,
+            'excerpt': post.excerpt, 'content': post.content, 'image_url': post.image_url,
+            'published_date': post.published_date.strftime('%Y-%m-%d %H:%M:%S'), 'is_published': 'y',
+            'meta_description': post.meta_description, 'meta_keywords': post.meta_keywords,
+        }
+
+    response = app.test_client().post('/admin/post/edit/?id=4', data=data)
+
+    assert response.status_code == 302
+    assert ('update_related_posts', {'post_id': 4}) in app.queued
+    assert 4 not in neighbours(app, 1)
+    with app.app_context():
+        related.update_related_posts(post_id=4, attempt=1, final=True)
+    assert neighbours(app, 1) == {2, 3, 4}
+
+
+def test_delete_unlinks_the_post_and_queues_the_refill(app):
+    assert neighbours(app, 1) == {2, 3}
+
+    response = app.test_client().post('/admin/post/delete/', data={'id': 3})
+
+    assert response.status_code == 302
+    assert neighbours(app, 1) == {2}
+    assert app.queued == [('refill_related_posts', {'post_ids': [1, 2]})]
+    with app.app_context():
+        related.refill_related_posts(post_ids=[1, 2], attempt=1, final=True)
+    assert neighbours(app, 2) == {1}
+
+
+def test_neighbour_that_falls_in_a_full_list_is_replaced(database_copy):
+    # Post 4 shares only "zanzibar" with post 1, so it is left out of 1's two slots.
+    app = build_app(database_copy, {1: 'Zanzibar Ferry Permit', 2: 'Zanzibar Ferry Permit',
+                                    3: 'Zanzibar Ferry Permit', 4: 'Zanzibar'}, RELATED_POSTS_K=2)
+    assert neighbours(app, 1) == {2, 3}
+
+    with app.app_context():
+        # Still similar to post 1, but now less so than post 4.
+        set_title(2, 'Zanzibar Lagoon Quay')
+        related.update_post(2, 2)
+        db.session.commit()
+
+    assert neighbours(app, 1) == {3, 4}
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import update
+
+import datagen
+import rendering
+from models import db, Post
+
+
+CONTENT = '<h2>Getting There</h2>\n\n<p>Take   the <img src="/ferry.jpg"> ferry.</p><h2>Getting There</h2>'
+
+
+@pytest.fixture
+def app(database_copy):
+    return datagen.build_app(database_copy(20), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False,
+                             JINJA_BYTECODE_CACHE_DIR=None)
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """List that grows by one entry per call of the content pipeline."""
+    calls = []
+    original = rendering.render_content
+
+    def counting(content):
+        calls.append(content)
+        return original(content)
+
+    monkeypatch.setattr(rendering, 'render_content', counting)
+    return calls
+
+
+def test_render_content_output():
+    html, toc, read_time = rendering.render_content(CONTENT)
+
+    assert toc == [[2, 'getting-there', 'Getting There'], [2, 'getting-there-2', 'Getting There']]
+    assert '<h2 id="getting-there-2">' in html
+    assert 'loading="lazy"' in html and 'decoding="async"' in html
+    assert 'Take the' in html
+    assert read_time == '1 min read'
+
+
+def test_saving_a_post_stores_its_render(app, renders):
+    with app.app_context():
+        post = db.session.get(Post, 4)
+        post.content = CONTENT
+        db.session.commit()
+
+        assert len(renders) == 1
+        assert post.rendered_key == rendering.content_key(CONTENT)
+        assert post.toc[0] == [2, 'getting-there', 'Getting There']
+
+        post.title = 'Retitled Guide'
+        db.session.commit()
+        assert len(renders) == 1
+
+        slug = post.slug
+
+    response = app.test_client().get(f'/post/{slug}')
+
+    assert b'<h2 id="getting-there">' in response.data
+    assert len(renders) == 1
+
+
+def test_stale_render_is_served_fresh_without_a_write(app, renders):
+    with app.app_context():
+        db.session.execute(update(Post).where(Post.id == 4).values(content=CONTENT))
+        db.session.commit()
+        slug, stale_key = db.session.query(Post.slug, Post.rendered_key).filter_by(id=4).one()
+
+    response = app.test_client().get(f'/post/{slug}')
+
+    assert b'<h2 id="getting-there">' in response.data
+    assert len(renders) == 1
+    with app.app_context():
+        assert db.session.get(Post, 4).rendered_key == stale_key
+
+
+def test_backfill_renders_only_stale_posts_and_keeps_updated_date(app, renders):
+    with app.app_context():
+        db.session.execute(update(Post).where(Post.id.in_([4, 5])).values(content=CONTENT))
+        db.session.commit()
+        before = dict(db.session.query(Post.id, Post.updated_date))
+
+        assert Post.backfill_renders() == 2
+        assert len(renders) == 2
+        assert Post.backfill_renders() == 0
+
+        db.session.expire_all()
+        assert dict(db.session.query(Post.id, Post.updated_date)) == before
+        assert db.session.get(Post, 5).rendered_key == rendering.content_key(CONTENT)
@@ -0,0 +1,32 @@
+import re
+
+import pytest
+
+from search import query_terms, search_index
+
+
+def test_query_terms_drop_operators_and_stopwords():
+    assert query_terms('Visa OR the permit') == ['visa', 'permit']
+    assert query_terms('NOT near') == []
+    assert query_terms('the') == ['the']
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+@pytest.mark.parametrize('query', ['visa OR', 'visa AND', 'the visa', 'NEAR visa'])
+def test_operator_words_do_not_empty_the_results(app_factory, backend, query):
+    app = app_factory(20, SEARCH_BACKEND=backend)
+    with app.app_context():
+        expected = search_index.search('visa')
+        assert expected
+
+        assert search_index.search(query) == expected
+
+
+def test_search_page_ignores_operator_words(app_factory):
+    client = app_factory(20).test_client()
+
+    def results(query):
+        return re.findall(r'href="(/post/[^"]+)"', client.get('/search', query_string={'q': query}).get_data(as_text=True))
+
+    assert results('visa')
+    assert results('visa OR') == results('visa')
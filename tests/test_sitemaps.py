@@ -0,0 +1,67 @@
+import gzip
+import re
+
+import pytest
+
+import sitemaps
+from models import Post
+
+
+LOC_RE = re.compile(r'<loc>([^<]+)</loc>')
+
+
+def locs(response):
+    assert response.status_code == 200
+    return LOC_RE.findall(response.get_data(as_text=True))
+
+
+def published_count(app):
+    with app.app_context():
+        return Post.query.filter_by(is_published=True).count()
+
+
+def test_small_site_gets_one_urlset(app_factory):
+    app = app_factory(20)
+    body = app.test_client().get('/sitemap.xml').get_data(as_text=True)
+
+    assert '<urlset' in body
+    assert len(LOC_RE.findall(body)) == len(sitemaps.STATIC_PAGES) + published_count(app)
+
+
+def test_post_lastmod_is_its_update_time(app_factory):
+    app = app_factory(20)
+    with app.app_context():
+        post = Post.query.filter_by(slug='bench-post-3').one()
+        expected = post.updated_date.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    body = app.test_client().get('/sitemap.xml').get_data(as_text=True)
+
+    entry = body[body.index('/post/bench-post-3<'):]
+    assert entry[:entry.index('</url>')].count(f'<lastmod>{expected}</lastmod>') == 1
+
+
+@pytest.mark.parametrize('read_model', [False, True])
+def test_large_site_switches_to_an_index_of_shards(app_factory, read_model):
+    app = app_factory(20, SITEMAP_MAX_URLS=10, READ_MODEL_ENABLED=read_model)
+    client = app.test_client()
+    total = len(sitemaps.STATIC_PAGES) + published_count(app)
+    shards = -(-total // 10)
+
+    index = client.get('/sitemap.xml').get_data(as_text=True)
+    assert '<sitemapindex' in index
+    assert LOC_RE.findall(index) == [f'{app.config["SITE_URL"]}/sitemap-{n}.xml' for n in range(1, shards + 1)]
+    assert index.count('<lastmod>') == shards
+
+    urls = [url for n in range(1, shards + 1) for url in locs(client.get(f'/sitemap-{n}.xml'))]
+    assert len(urls) == len(set(urls)) == total
+    assert client.get(f'/sitemap-{shards + 1}.xml').status_code == 404
+
+
+def test_write_sitemaps_with_gzip_copies(app_factory, tmp_path):
+    app = app_factory(20)
+    with app.app_context():
+        written = sitemaps.write_sitemaps('https://example.com', str(tmp_path), max_urls=10, compress=True)
+
+    assert str(tmp_path / 'sitemap.xml.gz') in written
+    for path in written[::2]:
+        with open(path, 'rb') as plain, gzip.open(path + '.gz') as packed:
+            assert plain.read() == packed.read()
@@ -0,0 +1,75 @@
+import pytest
+
+import datagen
+import static_export
+from models import db, Post, RelatedPost
+
+
+@pytest.fixture
+def export(database_copy, monkeypatch, tmp_path):
+    """``export(incremental=False)``: export a copy of the 60-post database, returning the summary.
+
+    The synthetic posts share one small vocabulary, so the copy gets its
+    related rows written directly.
+    """
+    app = datagen.build_app(
+        database_copy(60), PAGE_CACHE_BACKEND=None, READ_MODEL_ENABLED=False, JINJA_BYTECODE_CACHE_DIR=None, BLOG_PAGE_SIZE=3
+    )
+    with app.app_context():
+        ids = [post_id for (post_id,) in db.session.query(Post.id).filter(Post.is_published == True)]
+        db.session.execute(RelatedPost.__table__.insert(), [
+            {'post_id': post_id, 'rank': rank, 'related_id': ids[(i + rank + 1) % len(ids)], 'score': 0.5}
+            for i, post_id in enumerate(ids) for rank in range(3)
+        ])
+        db.session.commit()
+    # Render workers build their own app from ExportConfig.
+    for name, value in app.config.items():
+        if name.isupper():
+            monkeypatch.setattr(static_export.ExportConfig, name, value, raising=False)
+
+    def run(incremental=False):
+        return static_export.export_site(
+            app, str(tmp_path / 'site'), workers=1, incremental=incremental, log=lambda *args: None
+        )
+
+    run.app = app
+    run.directory = tmp_path / 'site'
+    return run
+
+
+def test_export_with_related_posts(export):
+    summary = export()
+
+    assert summary['failed'] == 0
+    assert (export.directory / 'post' / 'bench-post-3' / 'index.html').exists()
+    assert (export.directory / 'blog' / 'category' / 'uk' / 'index.html').exists()
+
+
+def test_incremental_export_skips_unchanged_pages(export):
+    export()
+
+    assert export(incremental=True)['rendered'] == 0
+
+
+def test_every_listing_page_is_exported(export):
+    export()
+
+    listings = list(export.directory.glob('blog/**/index.html'))
+    assert list(export.directory.glob('blog/category/*/page/2/index.html'))
+    for path in listings:
+        assert 'cursor=' not in path.read_text()
+    second_page = (export.directory / 'blog' / 'page' / '2' / 'index.html').read_text()
+    assert 'href="/blog"' in second_page
+    assert 'href="/blog/page/3/"' in second_page
+
+
+def test_incremental_export_removes_pages_past_the_end(export):
+    export()
+    last_page = max(int(path.name) for path in (export.directory / 'blog' / 'page').iterdir())
+    with export.app.app_context():
+        Post.query.filter(Post.id % 2 == 0).update({'is_published': False})
+        db.session.commit()
+
+    assert export(incremental=True)['removed']
+    assert not (export.directory / 'blog' / 'page' / str(last_page)).joinpath('index.html').exists()
+    assert (export.directory / 'blog' / 'page' / '2' / 'index.html').exists()
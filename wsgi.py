@@ -4,8 +4,13 @@ Usage: gunicorn wsgi:app -b 0.0.0.0:8000
 """
 
 from app import create_app
+from metrics import metrics
+from readmodel import read_model
 
 app = create_app()
+metrics.share(app)
+# Built here so that with `gunicorn --preload` workers fork with it ready.
+read_model.warm(app)
 
 if __name__ == '__main__':
     app.run()